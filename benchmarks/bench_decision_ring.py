@@ -0,0 +1,105 @@
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from decision_ring import DecisionPublisher, DecisionReader
+
+RING = "aegis_bench_ring"
+
+def decision(i):
+    return {"ts": 1700000000000 + i, "action": "HALT", "reason": "QUARANTINE: DUPLICATE", "duration_ms": i, "_internal_state": "HALTED", "_trigger_detail": ""}
+
+def _pick(samples, q):
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))] / 1000.0, 2)
+
+def _row(case, samples, **extra):
+    samples.sort()
+    return {"case": case, "n": len(samples), "p50_us": _pick(samples, 0.5), "p99_us": _pick(samples, 0.99), "max_us": _pick(samples, 1.0), **extra}
+
+def publish_cost(n):
+    pub = DecisionPublisher(RING, 1 << 16)
+    results = [decision(i) for i in range(n)]
+    start = time.perf_counter()
+    for result in results: pub.publish(result)
+    elapsed = time.perf_counter() - start
+    pub.close()
+    return {"case": "publish", "n": n, "ns_per_decision": round(elapsed * 1e9 / n)}
+
+def in_process(n):
+    # publish() then poll() on the same thread: the cost of the hand-over itself, without any scheduling
+    pub = DecisionPublisher(RING, 1 << 16)
+    reader = DecisionReader(RING)
+    clock, samples = time.perf_counter_ns, []
+    for i in range(n):
+        t0 = clock()
+        pub.publish(decision(i))
+        reader.poll()
+        samples.append(clock() - t0)
+    reader.close(); pub.close()
+    return _row("in_process", samples)
+
+def _ring_reader(ready, out):
+    reader = DecisionReader(RING)
+    ready.set()
+    samples = []
+    while True:
+        got = reader.wait(timeout=5)
+        now = time.time_ns()
+        samples += [now - d.publish_ns for d in got]
+        if reader.closed and not got: break
+    out.put((samples, reader.lost))
+
+def _tail_reader(path, ready, out, n):
+    samples = []
+    with open(path) as f:
+        ready.set()
+        while len(samples) < n:
+            line = f.readline()
+            if not line:
+                os.sched_yield(); continue
+            samples.append(time.time_ns() - json.loads(line)["publish_ns"])
+    out.put((samples, 0))
+
+def cross_process(n, gap_us, tail=False):
+    # A reader in another process, the writer sleeping gap_us between decisions (an engine idle between frames).
+    # tail=True is the baseline: one JSON line per decision appended and flushed to a file the reader tails and parses.
+    ctx = mp.get_context("spawn")
+    ready, out = ctx.Event(), ctx.Queue()
+    if tail:
+        tmp = tempfile.mkdtemp(prefix="bench_ring_")
+        path = os.path.join(tmp, "decisions.jsonl")
+        f = open(path, 'w')
+        proc = ctx.Process(target=_tail_reader, args=(path, ready, out, n))
+    else:
+        pub = DecisionPublisher(RING, 1 << 16)
+        proc = ctx.Process(target=_ring_reader, args=(ready, out))
+    proc.start(); ready.wait(30)
+    for i in range(n):
+        if tail:
+            f.write(json.dumps({**decision(i), "publish_ns": time.time_ns()}) + "\n"); f.flush()
+        else: pub.publish(decision(i))
+        time.sleep(gap_us / 1e6)
+    if tail: f.close()
+    else: pub.close()
+    samples, lost = out.get()
+    proc.join()
+    if tail: shutil.rmtree(tmp, ignore_errors=True)
+    return _row("jsonl_tail" if tail else "shared_memory", samples, gap_us=gap_us, lost=lost)
+
+if __name__ == "__main__":
+    # python benchmarks/bench_decision_ring.py [decisions] [gap_us]
+    # On a single CPU the cross-process cases include the reader's wake-up; with a spare core they don't.
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    gap_us = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(json.dumps({"case": "cpus", "n": os.cpu_count()}))
+    print(json.dumps(publish_cost(n * 10)))
+    print(json.dumps(in_process(n)))
+    print(json.dumps(cross_process(n, gap_us)))
+    print(json.dumps(cross_process(n, gap_us, tail=True)))
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import DataSanitizer, ID_FILTERS
+
+SIZES = (1000000, 5000000, 20000000)
+
+def rss_bytes():
+    with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def run_case(backend, n):
+    # aggTrade-like stream: increasing ids arriving as floats, ~1% replays of a recent id, 1ms apart
+    # construct_ms / empty_rss_mb: cost of a filter before any id arrives (paid by every engine built);
+    # worst_1k_ms: slowest stretch of 1000 ids, where table growth shows up
+    base_rss = rss_bytes()
+    start = time.perf_counter()
+    sanitizer = DataSanitizer(ID_FILTERS[backend](max_ids=n))
+    construct_ms = (time.perf_counter() - start) * 1000
+    empty_rss = rss_bytes() - base_rss
+    dups, worst = 0, 0.0
+    start = time.perf_counter()
+    for lo in range(0, n, 1000):
+        chunk = time.perf_counter()
+        for i in range(lo, min(n, lo + 1000)):
+            raw = float(i - 7 if i % 100 == 99 else i)
+            key = sanitizer.normalize_id(raw)
+            dups += sanitizer.is_duplicate(key, i * 1000)
+        worst = max(worst, time.perf_counter() - chunk)
+    elapsed = time.perf_counter() - start
+    return {"backend": backend, "ids": n, "duplicates": dups, "ids_per_sec": round(n / elapsed), "rss_mb": round((rss_bytes() - base_rss) / 2**20, 1),
+            "construct_ms": round(construct_ms, 2), "empty_rss_mb": round(empty_rss / 2**20, 1), "worst_1k_ms": round(worst * 1000, 1)}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--case"]:
+        print(json.dumps(run_case(sys.argv[2], int(sys.argv[3]))))
+        sys.exit(0)
+    # One process per case so that memory numbers are not polluted by earlier runs
+    sizes = [int(v) for v in sys.argv[1:]] or SIZES
+    for n in sizes:
+        for backend in ID_FILTERS:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", backend, str(n)], capture_output=True, text=True)
+            print(out.stdout.strip() or json.dumps({"backend": backend, "ids": n, "error": out.stderr.strip().splitlines()[-1:]}))
@@ -0,0 +1,76 @@
+import gc
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import DecisionEngine, Config
+from historical import CsvStreamer, source_files
+from realtime import message_events
+from ws_standin import synthetic_messages
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+
+def _pick(samples, q):
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))] / 1000.0, 3)
+
+def retained(data_dir, n):
+    # Heap blocks and bytes that stay alive per event when n events are held in a list
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    events = list(itertools.islice(iter(CsvStreamer(source_files(data_dir))), n))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    n = len(events)
+    return {"case": "retained", "events": n, "blocks_per_event": round((sys.getallocatedblocks() - blocks) / n, 2), "bytes_per_event": round(size / n, 1)}
+
+def historical_events(data_dir):
+    # CsvStreamer -> process_event, timing ingest (building the next event) and the engine call separately
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive())
+    clock = time.perf_counter_ns
+    it = iter(CsvStreamer(source_files(data_dir)))
+    ingest, decide = [], []
+    start = time.perf_counter()
+    while True:
+        t0 = clock()
+        try: event = next(it)
+        except StopIteration: break
+        t1 = clock()
+        engine.process_event(event)
+        ingest.append(t1 - t0); decide.append(clock() - t1)
+    elapsed = time.perf_counter() - start
+    ingest.sort(); decide.sort()
+    return {"case": "historical_events", "events": len(decide), "events_per_sec": round(len(decide) / elapsed),
+            "ingest_p50_us": _pick(ingest, 0.5), "ingest_p99_us": _pick(ingest, 0.99), "process_p50_us": _pick(decide, 0.5), "process_p99_us": _pick(decide, 0.99)}
+
+def realtime_messages(n):
+    # Raw frame -> json.loads -> message_events -> process_event, per frame
+    frames = []
+    for stream, data in synthetic_messages(["btcusdt"], n):
+        data = dict(data, E=1700000000000, T=1700000000000)
+        frames.append(json.dumps({"stream": stream, "data": data}))
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive())
+    clock = time.perf_counter_ns
+    samples = []
+    for frame in frames:
+        t0 = clock()
+        for event in message_events(json.loads(frame), engine, 1700000000000): engine.process_event(event)
+        samples.append(clock() - t0)
+    samples.sort()
+    return {"case": "realtime_messages", "frames": n, "frames_per_sec": round(n * 1e9 / sum(samples)), "p50_us": _pick(samples, 0.5), "p99_us": _pick(samples, 0.99)}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_event.py <data_dir> [retained_events] [frames]
+    data_dir = sys.argv[1]
+    n_retained = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    n_frames = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+    print(json.dumps(retained(data_dir, n_retained)))
+    print(json.dumps(historical_events(data_dir)))
+    print(json.dumps(realtime_messages(n_frames)))
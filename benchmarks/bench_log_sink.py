@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from log_sink import LogSink
+
+def write_syscalls():
+    with open("/proc/self/io") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("syscw"))
+
+def decision_lines(n):
+    return [json.dumps({"ts": 1700000000000 + i, "action": "HALT", "reason": "QUARANTINE: DUPLICATE", "duration_ms": i % 5000}) + "\n" for i in range(n)]
+
+def per_line_flush(path, lines):
+    # What run_realtime did: one write + flush per blocked decision
+    with open(path, 'a') as f:
+        for line in lines:
+            f.write(line); f.flush()
+
+def sink(path, lines, **kwargs):
+    with LogSink(path, **kwargs) as f:
+        for line in lines: f.write(line)
+
+CASES = {
+    "per_line_flush": per_line_flush,
+    "log_sink": sink,
+    "log_sink_rotate_gzip": lambda path, lines: sink(path, lines, rotate_bytes=4 << 20, compress=True),
+}
+
+def run(name, n):
+    lines = decision_lines(n)
+    out_dir = tempfile.mkdtemp(prefix="bench_sink_")
+    try:
+        before = write_syscalls()
+        start = time.perf_counter()
+        CASES[name](os.path.join(out_dir, "decisions.jsonl"), lines)
+        elapsed = time.perf_counter() - start
+        syscalls = write_syscalls() - before
+        files = len(os.listdir(out_dir))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {"case": name, "lines": n, "lines_per_sec": round(n / elapsed), "write_syscalls": syscalls, "files": files}
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    for name in CASES: print(json.dumps(run(name, n)))
@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+sys.path.append(CURRENT_DIR)
+
+from engine import DecisionEngine
+from metrics import FeedMetrics
+from realtime import RealtimeHandler, realtime_config
+from reorder import ReorderBuffer
+from bench_replay import frames
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+
+class NullSink:
+    def write(self, line): pass
+
+def run(frames, case, port=9119, scrape_every_s=0.1):
+    # RealtimeHandler.on_message over the frames: no metrics, counters only, or counters served and scraped
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config())
+    metrics = FeedMetrics(engine) if case != "off" else None
+    handler = RealtimeHandler(engine, NullSink(), NullSink(), reorder=ReorderBuffer.attach(engine), metrics=metrics, verbose=False)
+    done, scrapes = threading.Event(), []
+    if case == "scraped":
+        metrics.serve("127.0.0.1", port)
+        def scrape():
+            while not done.wait(scrape_every_s):
+                t0 = time.perf_counter()
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read()
+                scrapes.append(time.perf_counter() - t0)
+        threading.Thread(target=scrape, daemon=True).start()
+    start = time.perf_counter()
+    for recv, frame in frames: handler.on_message(frame, recv)
+    elapsed = time.perf_counter() - start
+    done.set()
+    if metrics is not None: metrics.close()
+    row = {"case": case, "frames": len(frames), "us_per_frame": round(elapsed * 1e6 / len(frames), 2)}
+    if scrapes: row.update({"scrapes": len(scrapes), "scrape_ms": round(sum(scrapes) * 1000 / len(scrapes), 2)})
+    return row
+
+if __name__ == "__main__":
+    # python benchmarks/bench_metrics.py [frames]
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = frames(n)
+    for case in ("off", "counters", "scraped"): print(json.dumps(run(data, case)))
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import AdaptiveRegimeModel, Config, RollingStats
+
+TOLERANCE = 1e-9              # max relative error against numpy
+RESYNCS = 8                   # each stream runs through this many RollingStats resyncs
+
+def distance_stream(n, seed=0):
+    # Mahalanobis-like distances: lognormal around a level that jumps now and then, with rare large shocks
+    rng = np.random.default_rng(seed)
+    level = np.repeat(rng.uniform(0.5, 50.0, n // 5000 + 1), 5000)[:n]
+    values = level * rng.lognormal(0.0, 0.5, n)
+    shocks = rng.random(n) < 0.001
+    values[shocks] *= rng.uniform(10.0, 1000.0, shocks.sum())
+    return values.tolist()
+
+def check_rolling(window, every=97, seed=0):
+    # RollingStats against np.mean/np.std of the same deque, every `every` pushes and on both sides of each resync
+    n = RESYNCS * RollingStats.RESYNC_WINDOWS * window + window
+    stats, ref = RollingStats(window), deque(maxlen=window)
+    period = RollingStats.RESYNC_WINDOWS * window
+    worst_mean = worst_std = 0.0
+    for i, x in enumerate(distance_stream(n, seed)):
+        stats.append(x)
+        ref.append(x)
+        if i % every and (i + 2) % period > 3: continue
+        hist = np.array(ref)
+        mean, std = hist.mean(), hist.std()
+        worst_mean = max(worst_mean, abs(stats.mean - mean) / abs(mean))
+        worst_std = max(worst_std, abs(stats.std() - std) / max(std, abs(mean) * 1e-12))
+    return {"case": "rolling_stats", "window": window, "pushes": n, "resyncs": n // period, "max_rel_err_mean": worst_mean,
+            "max_rel_err_std": worst_std, "ok": bool(worst_mean < TOLERANCE and worst_std < TOLERANCE)}
+
+def random_model(rng):
+    # Random mu and symmetric positive definite inv_cov, as Config.model_params accepts them
+    a = rng.normal(0, 1, (2, 2))
+    inv_cov = a @ a.T + np.eye(2) * rng.uniform(0.01, 1.0)
+    return rng.normal(-5, 2, 2), inv_cov
+
+def check_mahalanobis(n_models=200, n_points=500, seed=0):
+    # AdaptiveRegimeModel.mahalanobis against sqrt(delta.T @ inv_cov @ delta) on log(vol), log(spread)
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for _ in range(n_models):
+        mu, inv_cov = random_model(rng)
+        model = AdaptiveRegimeModel(Config.derive(MU=mu, INV_COV=inv_cov))
+        for vol, spread in zip(rng.lognormal(-7, 2, n_points).tolist(), rng.lognormal(-3, 2, n_points).tolist()):
+            delta = np.array([np.log(vol), np.log(spread)]) - mu
+            expected = np.sqrt(max(0, delta.T @ inv_cov @ delta))
+            worst = max(worst, abs(model.mahalanobis(vol, spread) - expected) / max(expected, 1e-12))
+    return {"case": "mahalanobis", "models": n_models, "points": n_models * n_points, "max_rel_err": worst, "ok": bool(worst < TOLERANCE)}
+
+def timed(window, n=200000):
+    # Per-push cost of the running statistics against the numpy reductions they replace
+    values = distance_stream(n)
+    stats, ref = RollingStats(window), deque(maxlen=window)
+    start = time.perf_counter()
+    for x in values:
+        stats.append(x)
+        stats.mean, stats.std()
+    rolling = time.perf_counter() - start
+    start = time.perf_counter()
+    for x in values:
+        ref.append(x)
+        np.mean(ref), np.std(ref)
+    numpy_time = time.perf_counter() - start
+    return {"case": "timing", "window": window, "pushes": n, "rolling_ns": round(rolling / n * 1e9), "numpy_ns": round(numpy_time / n * 1e9)}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_model_stats.py
+    # Exits non-zero when the O(1) statistics or the closed-form distance drift from numpy by more than TOLERANCE
+    rows = [check_rolling(window) for window in (20, 100, 1000)] + [check_mahalanobis()]
+    rows += [timed(window) for window in (100, 1000)]
+    for row in rows: print(json.dumps(row))
+    failed = [f"{row['case']}({row.get('window', '')})" for row in rows if not row.get("ok", True)]
+    if failed: sys.exit(f"model statistics differ from numpy: {', '.join(failed)}")
@@ -0,0 +1,68 @@
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from multi_symbol import ShardRouter
+
+def synthetic_frames(symbols, n, seed=0):
+    # Local stand-in for the Binance combined stream: aggTrade and bookTicker frames round-robin over symbols
+    rng = random.Random(seed)
+    mids = {sym: 100.0 + 10 * i for i, sym in enumerate(symbols)}
+    ts = int(time.time() * 1000)
+    frames = []
+    for i in range(n):
+        sym = symbols[i % len(symbols)]
+        mids[sym] *= 1 + rng.gauss(0, 2e-4)
+        ts += 1
+        if i % 2:
+            data = {"e": "aggTrade", "E": ts, "a": i, "p": f"{mids[sym]:.2f}", "q": "0.010", "T": ts}
+            frames.append(json.dumps({"stream": f"{sym}@aggTrade", "data": data}, separators=(",", ":")))
+        else:
+            half = mids[sym] * 1e-4
+            data = {"e": "bookTicker", "E": ts, "b": f"{mids[sym] - half:.2f}", "a": f"{mids[sym] + half:.2f}", "B": "1", "A": "1"}
+            frames.append(json.dumps({"stream": f"{sym}@bookTicker", "data": data}, separators=(",", ":")))
+    return frames
+
+def run(n_symbols, n_shards, n_frames):
+    # shard_rss_mb: peak RSS of the largest shard process, mostly its per-symbol engines
+    symbols = [f"sym{i:03d}usdt" for i in range(n_symbols)]
+    frames = synthetic_frames(symbols, n_frames)
+    out_dir = tempfile.mkdtemp(prefix="bench_multi_")
+    try:
+        router = ShardRouter(symbols, n_shards, output_dir=out_dir).start()
+        start = time.perf_counter()
+        now_ms = int(time.time() * 1000)
+        for frame in frames: router.route(frame, now_ms)
+        router.close()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {"symbols": n_symbols, "shards": n_shards, "frames": n_frames, "frames_per_sec": round(n_frames / elapsed),
+            "shard_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)}
+
+def run_case(n_symbols, n_shards, n_frames):
+    # One process per case so that the children's peak RSS is this case's
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", str(n_symbols), str(n_shards), str(n_frames)], capture_output=True, text=True)
+    return out.stdout.strip() or json.dumps({"symbols": n_symbols, "shards": n_shards, "error": out.stderr.strip().splitlines()[-1:]})
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--case"]:
+        print(json.dumps(run(*[int(v) for v in sys.argv[2:5]])))
+        sys.exit(0)
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    cpus = os.cpu_count() or 1
+    shard_counts = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1))) or [1]
+    for n_shards in shard_counts:
+        print(run_case(50, n_shards, n_frames))
+    # Symbols per shard: memory and throughput of one shard process as it takes more engines
+    for n_symbols in (10, 100, 300):
+        print(run_case(n_symbols, 1, n_frames))
@@ -0,0 +1,44 @@
+import json
+import os
+import random
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from order_book import OrderBook
+
+def diff_messages(n_messages, levels_per_message=10, seed=0):
+    # Futures @depth@100ms payloads around a drifting mid: string [price, qty] pairs, ~30% deletes, chained U/u/pu
+    rng = random.Random(seed)
+    mid, last, messages = 30000.0, 1000, []
+    for _ in range(n_messages):
+        mid += rng.gauss(0, 0.5)
+        bids, asks = [], []
+        for _ in range(levels_per_message):
+            off = round(rng.expovariate(0.2), 1) + 0.1
+            qty = "0" if rng.random() < 0.3 else f"{rng.random() * 5:.3f}"
+            if rng.random() < 0.5: bids.append([f"{mid - off:.1f}", qty])
+            else: asks.append([f"{mid + off:.1f}", qty])
+        first, final = last + 1, last + rng.randint(1, 20)
+        messages.append({"U": first, "u": final, "pu": last, "b": bids, "a": asks})
+        last = final
+    return messages
+
+def bench_diffs(n_messages):
+    messages = diff_messages(n_messages)
+    book = OrderBook()
+    book.apply_snapshot([["29999.9", "1"]], [["30000.1", "1"]], 1000)
+    updates = sum(len(m["b"]) + len(m["a"]) for m in messages)
+    start = time.perf_counter()
+    for m in messages:
+        if book.apply_diff(m["b"], m["a"], m["U"], m["u"], m["pu"]): book.features()
+    elapsed = time.perf_counter() - start
+    return {"case": "diff_messages", "messages": n_messages, "updates": updates, "updates_per_sec": round(updates / elapsed),
+            "messages_per_sec": round(n_messages / elapsed), "levels": [book.bids.n, book.asks.n], "stats": book.stats}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_order_book.py [diff_messages]
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(json.dumps(bench_diffs(n_messages)))
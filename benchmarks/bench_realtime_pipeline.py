@@ -0,0 +1,68 @@
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+import websockets
+from engine import DecisionEngine
+from realtime import message_events, realtime_config, CONFIG_PATH
+from realtime_async import AsyncPipeline, _percentiles
+from ws_standin import run_standin
+
+PORT = 8799
+
+async def inline(url, engine, out_dir, slow_ms):
+    # The run_realtime shape: parse, decide and flush every blocked decision inside the read loop
+    latency = []
+    processed = 0
+    with open(os.path.join(out_dir, 'decisions.jsonl'), 'a') as f_dec:
+        async with websockets.connect(url, max_queue=None) as ws:
+            async for message in ws:
+                now_ms = int(time.time() * 1000)
+                for event in message_events(json.loads(message), engine, now_ms):
+                    result = engine.process_event(event)
+                    processed += 1
+                    latency.append(time.time() * 1000 - result['ts'])
+                    if result['action'] != "ALLOWED":
+                        f_dec.write(json.dumps({k: v for k, v in result.items() if not k.startswith('_')}) + "\n")
+                        f_dec.flush()
+                        if slow_ms: time.sleep(slow_ms / 1000.0)
+    return {"processed": processed, "decide_latency_ms": _percentiles(latency)}
+
+def run(runner, n_frames, rate, slow_ms, policy="block"):
+    ready = mp.Event()
+    server = mp.Process(target=run_standin, args=(n_frames, rate, PORT), kwargs={"ready": ready}, daemon=True)
+    server.start(); ready.wait(10)
+    out_dir = tempfile.mkdtemp(prefix="bench_rt_")
+    url = f"ws://127.0.0.1:{PORT}/stream"
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config())
+    start = time.perf_counter()
+    try:
+        if runner == "inline":
+            result = asyncio.run(inline(url, engine, out_dir, slow_ms))
+        else:
+            pipeline = AsyncPipeline(engine, out_dir, ingest_policy=policy, verbose=False)
+            if slow_ms:
+                write_batch = pipeline._write_batch
+                pipeline._write_batch = lambda items: (time.sleep(slow_ms / 1000.0), write_batch(items))
+            asyncio.run(pipeline.run(url, reconnect=False))
+            summary = pipeline.summary()
+            result = {"processed": summary["total_events"], **summary["pipeline"]}
+    finally:
+        server.terminate(); server.join()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {"runner": runner, "frames": n_frames, "rate": rate, "slow_write_ms": slow_ms, "elapsed_sec": round(time.perf_counter() - start, 2), **result}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_realtime_pipeline.py [frames] [frames_per_sec] [slow_write_ms]
+    args = [int(v) for v in sys.argv[1:4]]
+    n_frames, rate, slow_ms = (args + [50000, 5000, 2][len(args):])[:3]
+    for runner in ("inline", "pipeline"):
+        print(json.dumps(run(runner, n_frames, rate, slow_ms)))
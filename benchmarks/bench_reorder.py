@@ -0,0 +1,52 @@
+import json
+import os
+import random
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import MarketEvent, TRADE
+from reorder import ReorderBuffer
+
+def arrivals(n, rate=2000, seed=0):
+    # (event_time, arrival) in ms, in arrival order: exchange times at `rate` events/s plus a network delay
+    # that is mostly a few ms with a lognormal tail (occasional 50-200 ms stragglers)
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        t = int(i * 1000 / rate)
+        out.append((t, t + int(rng.expovariate(1 / 3.0) + (rng.lognormvariate(3.0, 1.0) if rng.random() < 0.05 else 0))))
+    out.sort(key=lambda x: x[1])
+    return out
+
+def behind_newest(frames):
+    # Events that arrive after a later event_time, i.e. what process_event would see out of order
+    newest, count = None, 0
+    for t, _ in frames:
+        if newest is not None and t < newest: count += 1
+        else: newest = t
+    return count
+
+def run(budget, frames):
+    buf = ReorderBuffer(budget)
+    events = [MarketEvent(t, arrival, TRADE, 1.0) for t, arrival in frames]
+    out = []
+    start = time.perf_counter()
+    for event in events: out.extend(buf.feed((event,), event.local_time))
+    out.extend(buf.flush(frames[-1][1]))
+    elapsed = time.perf_counter() - start
+    ts = [e.event_time for e in out]
+    report = buf.report()
+    return {"case": "reorder", "latency_ms": budget, "events": report["events"], "late_ratio": round(report["late"] / report["events"], 5),
+            "reordered": report["reordered"], "added_p50_ms": report["added_latency_ms"].get("p50"), "added_p99_ms": report["added_latency_ms"].get("p99"),
+            "in_order": all(a <= b for a, b in zip(ts, ts[1:])), "us_per_event": round(elapsed * 1e6 / len(events), 3)}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_reorder.py [events] [budget_ms ...]
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    budgets = [int(v) for v in sys.argv[2:]] or [5, 10, 20, 50, 100, 200]
+    frames = arrivals(n)
+    print(json.dumps({"case": "unordered", "events": n, "behind_newest_ratio": round(behind_newest(frames) / n, 5)}))
+    for budget in budgets: print(json.dumps(run(budget, frames)))
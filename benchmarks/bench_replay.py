@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import DecisionEngine
+from feed_log import FeedRecorder, model_record, MODEL
+from log_sink import LogSink
+from realtime import RealtimeHandler, realtime_config, replay_feed
+from reorder import ReorderBuffer
+from ws_standin import synthetic_messages
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+
+def frames(n, rate=2000):
+    # (receive ms, raw frame) at `rate` frames/s, exchange time a couple of ms behind receive
+    out = []
+    for i, (stream, data) in enumerate(synthetic_messages(["btcusdt"], n)):
+        recv = 1700000000000 + i * 1000 // rate
+        out.append((recv, json.dumps({"stream": stream, "data": dict(data, E=recv - 2, T=recv - 2)})))
+    return out
+
+def live(frames, out_dir, record):
+    # RealtimeHandler.on_message over the frames, with or without a FeedRecorder behind it
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config())
+    recorder = FeedRecorder.from_config(os.path.join(out_dir, "feed.bin"), engine.config) if record else None
+    if recorder is not None: recorder.write(MODEL, frames[0][0], model_record(engine.config))
+    f_dec = LogSink.from_config(os.path.join(out_dir, "decisions.jsonl"), engine.config, realtime=False)
+    f_trans = LogSink.from_config(os.path.join(out_dir, "state_transitions.jsonl"), engine.config, realtime=False)
+    handler = RealtimeHandler(engine, f_dec, f_trans, reorder=ReorderBuffer.attach(engine), recorder=recorder, verbose=False)
+    start = time.perf_counter()
+    for recv, frame in frames: handler.on_message(frame, recv)
+    handler.close(frames[-1][0])
+    elapsed = time.perf_counter() - start
+    stats = recorder.close() if recorder is not None else {}
+    f_dec.close(); f_trans.close()
+    row = {"case": "record" if record else "live", "frames": len(frames), "us_per_frame": round(elapsed * 1e6 / len(frames), 2)}
+    if record: row.update({"bytes_per_frame": round(stats["bytes"] / len(frames), 1), "compression": round(stats["raw_bytes"] / stats["bytes"], 1)})
+    return row
+
+if __name__ == "__main__":
+    # python benchmarks/bench_replay.py [frames]
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = frames(n)
+    out_dir = tempfile.mkdtemp(prefix="bench_replay_")
+    try:
+        print(json.dumps(live(data, out_dir, False)))
+        print(json.dumps(live(data, out_dir, True)))
+        shutil.copy(os.path.join(out_dir, "decisions.jsonl"), os.path.join(out_dir, "recorded.jsonl"))
+        summary = replay_feed(os.path.join(out_dir, "feed.bin"), os.path.join(out_dir, "replay"))
+        with open(os.path.join(out_dir, "recorded.jsonl"), 'rb') as a, open(os.path.join(out_dir, "replay", "decisions.jsonl"), 'rb') as b: identical = a.read() == b.read()
+        print(json.dumps({"case": "replay", "frames": summary["frames"], "frames_per_sec": summary["frames_per_sec"], "events_per_sec": summary["events_per_sec"], "identical": identical}))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
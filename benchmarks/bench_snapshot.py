@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import DecisionEngine, Config
+from snapshot import Checkpointer, load_snapshot, save_snapshot
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+SIZES = (1000000, 5000000)
+NEW_IDS = 10000                # ids between two checkpoints
+
+def filled_engine(n, sequential=False, seed=0):
+    # Engine whose compact id filter holds n int ids, with the ring wrapped past its end: random ones, or mostly
+    # consecutive ones from a large base like exchange trade ids
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive(DEDUP_MAX_IDS=n))
+    rng = np.random.default_rng(seed)
+    if sequential: ids = 4000000000 + np.cumsum(rng.integers(1, 3, n)).astype(np.int64)
+    else: ids = rng.choice(1 << 62, n, replace=False).astype(np.int64)
+    engine.sanitizer.restore({"ids": ids, "times": None, "other": []})
+    for key in range(1000): engine.sanitizer.is_duplicate(-1 - key, 0)
+    return engine, ids
+
+def run_case(n, sequential=False, added=NEW_IDS):
+    # first_capture_ms: the full capture Checkpointer.maybe takes on the engine thread the first time; capture_ms: a
+    # later one, after `added` more ids, which copies only those. write_ms/load_ms/restore_ms: the .npz on the writer
+    # thread, reading it back and engine.restore on a fresh engine
+    engine, ids = filled_engine(n, sequential)
+    out_dir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    path = os.path.join(out_dir, "engine_snapshot.npz")
+    try:
+        checkpointer = Checkpointer(engine, path, interval_ms=0)
+        start = time.perf_counter()
+        checkpointer.maybe(1)
+        first = time.perf_counter() - start
+        for key in range(added): engine.sanitizer.is_duplicate(-5000 - key, 0)
+        start = time.perf_counter()
+        checkpointer.maybe(2)
+        capture = time.perf_counter() - start
+        checkpointer.close()
+        state = engine.snapshot()
+        start = time.perf_counter()
+        save_snapshot(state, path)
+        write = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = load_snapshot(path)
+        load = time.perf_counter() - start
+        restored = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive(DEDUP_MAX_IDS=n))
+        start = time.perf_counter()
+        restored.restore(loaded)
+        restore = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 2**20
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    sample = ids[-1000:].tolist() + [-5000 - key for key in range(added - 1000, added)]
+    same = len(restored.sanitizer.id_filter) == len(engine.sanitizer.id_filter) and all(restored.sanitizer.is_duplicate(key, 0) for key in sample)
+    return {"ids": n, "sequential": sequential, "added": added, "first_capture_ms": round(first * 1000, 1), "capture_ms": round(capture * 1000, 2), "write_ms": round(write * 1000, 1),
+            "load_ms": round(load * 1000, 1), "restore_ms": round(restore * 1000, 1), "file_mb": round(size_mb, 1), "round_trip": same}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_snapshot.py [ids ...]
+    sizes = [int(v) for v in sys.argv[1:]] or SIZES
+    for n in sizes:
+        for sequential in (False, True): print(json.dumps(run_case(n, sequential)))
@@ -0,0 +1,168 @@
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+sys.path.append(CURRENT_DIR)
+
+from synthetic import generate
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+
+def _latency(samples_ns):
+    if not samples_ns: return None, None
+    values = sorted(samples_ns)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] / 1000.0, 3)
+    return pick(0.5), pick(0.99)
+
+def _timed_loop(func, items):
+    # Per-call latency plus wall time of the whole loop
+    clock = time.perf_counter_ns
+    samples = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = clock()
+        func(item)
+        samples.append(clock() - t0)
+    return time.perf_counter() - start, samples
+
+def _events(data_dir):
+    from historical import CsvStreamer, source_files
+    return list(CsvStreamer(source_files(data_dir)))
+
+def _fresh(events):
+    from engine import MarketEvent
+    return [MarketEvent(e.event_time, e.local_time, e.etype, e.price, e.side, e.key) for e in events]
+
+def _engine():
+    from engine import DecisionEngine, Config
+    return DecisionEngine(config_path=CONFIG_PATH, config=Config.derive())
+
+def case_sanitizer_check(data_dir):
+    from engine import DataSanitizer, Config
+    events = _fresh(_events(data_dir))
+    sanitizer = DataSanitizer(config=Config.derive())
+    elapsed, samples = _timed_loop(sanitizer.check, events)
+    return len(events), elapsed, samples
+
+def case_detect_shock(data_dir):
+    # Model fed with the trade/book prices; elapsed covers detect_shock calls only
+    from engine import AdaptiveRegimeModel, Config, TRADE, ORDERBOOK, BID, ASK
+    config = Config.derive()
+    config.load(CONFIG_PATH)
+    model = AdaptiveRegimeModel(config)
+    clock = time.perf_counter_ns
+    samples = []
+    for e in _events(data_dir):
+        price = e.price
+        if not price > 0: continue
+        if e.etype == TRADE: model.update_market_data(price=price)
+        elif e.etype == ORDERBOOK and e.side == BID: model.update_market_data(bid=price)
+        elif e.etype == ORDERBOOK and e.side == ASK: model.update_market_data(ask=price)
+        t0 = clock()
+        model.detect_shock()
+        samples.append(clock() - t0)
+    return len(samples), sum(samples) / 1e9, samples
+
+def case_process_event(data_dir):
+    events = _fresh(_events(data_dir))
+    elapsed, samples = _timed_loop(_engine().process_event, events)
+    return len(events), elapsed, samples
+
+def case_process_batch(data_dir):
+    # Latency here is per batch divided by its rows (the batch path has no per-event boundary)
+    from historical import CsvStreamer, source_files
+    batches = list(CsvStreamer(source_files(data_dir)).iter_batches())
+    engine = _engine()
+    clock = time.perf_counter_ns
+    samples, n = [], 0
+    start = time.perf_counter()
+    for b in batches:
+        t0 = clock()
+        engine.process_batch(b)
+        rows = len(b['ts'])
+        samples.extend([(clock() - t0) // rows] * rows)
+        n += rows
+    return n, time.perf_counter() - start, samples
+
+def case_csv_streamer(data_dir):
+    from historical import CsvStreamer, source_files
+    it = iter(CsvStreamer(source_files(data_dir)))
+    clock = time.perf_counter_ns
+    samples = []
+    start = time.perf_counter()
+    while True:
+        t0 = clock()
+        try: next(it)
+        except StopIteration: break
+        samples.append(clock() - t0)
+    return len(samples), time.perf_counter() - start, samples
+
+def case_run_historical(data_dir):
+    import historical
+    out_dir = tempfile.mkdtemp(prefix="bench_hist_")
+    historical.DATA_DIR, historical.OUTPUT_DIR = data_dir, out_dir
+    try:
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): historical.run_historical()   # banner stays out of the JSON stream
+        elapsed = time.perf_counter() - start
+        with open(os.path.join(out_dir, 'summary.json')) as f: n = json.load(f)["total_events"]
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return n, elapsed, []
+
+CASES = {
+    "sanitizer_check": case_sanitizer_check,
+    "detect_shock": case_detect_shock,
+    "process_event": case_process_event,
+    "process_batch": case_process_batch,
+    "csv_streamer": case_csv_streamer,
+    "run_historical": case_run_historical,
+}
+
+def run_case(name, data_dir):
+    n, elapsed, samples = CASES[name](data_dir)
+    p50, p99 = _latency(samples)
+    return {"case": name, "events": n, "elapsed_sec": round(elapsed, 3), "events_per_sec": round(n / elapsed) if elapsed else None,
+            "p50_us": p50, "p99_us": p99, "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)}
+
+def compare(base_path, new_path):
+    # events/sec ratio and p99 ratio per case between two saved runs (JSON lines)
+    load = lambda path: {r["case"]: r for r in map(json.loads, open(path)) if "case" in r}
+    base, new = load(base_path), load(new_path)
+    for name in CASES:
+        if name not in base or name not in new: continue
+        b, n = base[name], new[name]
+        row = {"case": name, "events_per_sec_ratio": round(n["events_per_sec"] / b["events_per_sec"], 3) if b.get("events_per_sec") and n.get("events_per_sec") else None,
+               "p99_ratio": round(n["p99_us"] / b["p99_us"], 3) if b.get("p99_us") and n.get("p99_us") else None,
+               "peak_rss_ratio": round(n["peak_rss_mb"] / b["peak_rss_mb"], 3)}
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    # python benchmarks/bench_suite.py [--trades N] [--seed S] [case ...] > run.jsonl
+    # python benchmarks/bench_suite.py --compare base.jsonl new.jsonl
+    args = sys.argv[1:]
+    if args[:1] == ["--compare"]:
+        compare(args[1], args[2]); sys.exit(0)
+    if args[:1] == ["--run"]:
+        print(json.dumps(run_case(args[1], args[2]))); sys.exit(0)
+    opt = lambda name, default: int(args[args.index(name) + 1]) if name in args else default
+    n_trades, seed = opt("--trades", 200000), opt("--seed", 0)
+    names = [a for a in args if a in CASES] or list(CASES)
+    data_dir = tempfile.mkdtemp(prefix="bench_data_")
+    try:
+        params = generate(data_dir, n_trades, seed)
+        print(json.dumps({"dataset": params, "python": sys.version.split()[0]}))
+        # One process per case so that peak RSS belongs to that case alone
+        for name in names:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", name, data_dir], capture_output=True, text=True)
+            print(out.stdout.strip() or json.dumps({"case": name, "error": out.stderr.strip().splitlines()[-1:]}), flush=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
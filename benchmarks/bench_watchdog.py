@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(CURRENT_DIR), "src"))
+
+from engine import DecisionEngine, Config, MarketEvent, SystemState, TICKER
+from realtime import RealtimeHandler, realtime_config
+from realtime_async import AsyncPipeline
+from reorder import ReorderBuffer
+from ws_standin import synthetic_messages
+
+CONFIG_PATH = os.path.join(os.path.dirname(CURRENT_DIR), "output", "model_config.json")
+SLACK_MS = 10                 # detection has to land within STALE_TICKER_MS + SLACK_MS of the last ticker
+
+RESUME_LAG_MS = 80            # exchange lag of the frames after the silence (2 ms before it)
+
+class LineSink:
+    def __init__(self): self.lines = []
+    def write(self, line): self.lines.append(line)
+
+def frame(stream, data, now_ms, lag_ms=2):
+    return json.dumps({"stream": stream, "data": dict(data, E=now_ms - lag_ms, T=now_ms - lag_ms)})
+
+def watch(engine):
+    # Receive-clock ms at which check_stale HALTed the engine (appended by the wrapper), and when the last ticker before it came
+    fired, check = [], engine.check_stale
+    def check_stale(now):
+        result = check(now)
+        if result is not None: fired.append((now, engine.time_manager.last_ticker))
+        return result
+    engine.check_stale = check_stale
+    return fired
+
+def consistent(lines):
+    # Decision/transition lines in the order they were written: ts never goes back, no negative halt duration
+    rows = [json.loads(line) for line in lines]
+    ts = [r["ts"] for r in rows]
+    return all(a <= b for a, b in zip(ts, ts[1:])) and all(r.get("duration_ms", 0) >= 0 for r in rows)
+
+def _delay(fired):
+    return fired[0][0] - fired[0][1] if fired else None
+
+def _wait_halted(engine, stale_ms):
+    deadline = time.monotonic() + 2 * stale_ms / 1000.0 + 1
+    while engine.state != SystemState.HALTED and time.monotonic() < deadline: time.sleep(0.01)
+
+def _feed(messages, put, gap_ms, lag_ms=2):
+    for stream, data in messages:
+        now_ms = int(time.time() * 1000)
+        put(now_ms, frame(stream, data, now_ms, lag_ms))
+        time.sleep(gap_ms / 1000.0)
+
+def sync_trial(stale_ms, n_frames, gap_ms):
+    # RealtimeHandler fed at wall-clock pace, then silence: the timer thread alone has to HALT the engine.
+    # The feed then resumes with a larger exchange lag, which must not put a decision before the HALT.
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config(STALE_TICKER_MS=stale_ms))
+    fired, out = watch(engine), LineSink()
+    handler = RealtimeHandler(engine, out, out, reorder=ReorderBuffer.attach(engine), verbose=False)
+    stop = handler.start_timer()
+    messages = synthetic_messages(["btcusdt"], n_frames + 20)
+    put = lambda now_ms, message: handler.on_message(message, now_ms)
+    _feed(messages[:n_frames], put, gap_ms)
+    _wait_halted(engine, stale_ms)
+    _feed(messages[n_frames:], put, gap_ms, RESUME_LAG_MS)
+    time.sleep(2 * engine.config.REORDER_LATENCY_MS / 1000.0)
+    stop.set()
+    return _delay(fired), consistent(out.lines)
+
+def async_trial(stale_ms, n_frames, gap_ms):
+    # AsyncPipeline's decide/write stages with frames put straight on the ingest queue, then silence
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config(STALE_TICKER_MS=stale_ms))
+    out_dir = tempfile.mkdtemp(prefix="bench_watchdog_")
+    pipeline = AsyncPipeline(engine, out_dir, verbose=False)
+
+    fired = watch(engine)
+    messages = synthetic_messages(["btcusdt"], n_frames + 20)
+
+    async def feed(messages, lag_ms=2):
+        for stream, data in messages:
+            now_ms = int(time.time() * 1000)
+            await pipeline.ingest_q.put((now_ms, frame(stream, data, now_ms, lag_ms)))
+            await asyncio.sleep(gap_ms / 1000.0)
+
+    async def produce():
+        await feed(messages[:n_frames])
+        deadline = time.monotonic() + 2 * stale_ms / 1000.0 + 1
+        while engine.state != SystemState.HALTED and time.monotonic() < deadline: await asyncio.sleep(0.05)
+        await feed(messages[n_frames:], RESUME_LAG_MS)
+        await pipeline.ingest_q.put(None, force=True)
+
+    async def run():
+        try: await asyncio.gather(produce(), pipeline.decide(), pipeline.write())
+        finally: pipeline.close()
+    try:
+        asyncio.run(run())
+        ok = True
+        for name in ("decisions.jsonl", "state_transitions.jsonl"):
+            with open(os.path.join(out_dir, name)) as f: ok = ok and consistent(f.readlines())
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return _delay(fired), ok
+
+def simulated(stale_ms, n=10000):
+    # Historical replay: a local-time gap of 3 x STALE_TICKER_MS (µs) has to HALT once, on the first event after it,
+    # row-at-a-time and batched alike. The feed comes back with a larger exchange lag; the HALT is stamped with the
+    # last event time before the gap and the halt durations after it stay non-negative.
+    ts = 1700000000000000 + np.arange(n, dtype=np.int64) * 1000
+    local_ts = ts + 2000
+    local_ts[n // 2:] += 3 * stale_ms * 1000
+    ts[n // 2:] += 3 * stale_ms * 1000 - (RESUME_LAG_MS - 2) * 1000
+    prices = 30000.0 + np.cumsum(np.random.default_rng(0).normal(0, 0.5, n))
+    expected = int(ts[n // 2 - 1])
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive(STALE_TICKER_MS=stale_ms))
+    results = [engine.process_event(MarketEvent(t, lt, TICKER, p, 0, None)) for t, lt, p in zip(ts.tolist(), local_ts.tolist(), prices.tolist())]
+    fired = [r['_watchdog']['ts'] for r in results if '_watchdog' in r]
+    rows = [row for r in results for row in ([r['_watchdog']] if '_watchdog' in r else []) + [r]]
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=Config.derive(STALE_TICKER_MS=stale_ms))
+    batch = engine.process_batch({"ts": ts, "local_ts": local_ts, "type": np.full(n, TICKER, np.int8), "price": prices})
+    batched = batch['watchdog_ts'][batch['watchdog_ts'] != 0].tolist()
+    ok = consistent([json.dumps({"ts": r["ts"], "duration_ms": r["duration_ms"]}) for r in rows]) and bool((batch['duration_ms'] >= 0).all())
+    return {"case": "simulated", "stale_ms": stale_ms, "expected_ts": expected, "event": fired, "batch": batched, "exact": fired == batched == [expected] and ok}
+
+def timed(case, trial, stale_ms, trials, n_frames, gap_ms):
+    runs = [trial(stale_ms, n_frames, gap_ms) for _ in range(trials)]
+    fired = sorted(d for d, _ in runs if d is not None)
+    bound = stale_ms + SLACK_MS
+    consistent_runs = sum(ok for _, ok in runs)
+    return {"case": case, "stale_ms": stale_ms, "trials": trials, "missed": trials - len(fired),
+            "min_ms": fired[0] if fired else None, "max_ms": fired[-1] if fired else None, "bound_ms": bound, "consistent": consistent_runs,
+            "within_bound": len(fired) == trials and fired[-1] <= bound and consistent_runs == trials}
+
+if __name__ == "__main__":
+    # python benchmarks/bench_watchdog.py [stale_ms] [trials]
+    # Exits non-zero when a silent feed isn't HALTED within STALE_TICKER_MS + SLACK_MS of its last ticker, or when a
+    # decision after the HALT has an earlier ts or a negative duration
+    stale_ms = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    trials = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rows = [timed("sync_timer", sync_trial, stale_ms, trials, 200, 2), timed("async_pipeline", async_trial, stale_ms, trials, 200, 2), simulated(stale_ms)]
+    for row in rows: print(json.dumps(row))
+    failed = [row["case"] for row in rows if not row.get("within_bound", row.get("exact"))]
+    if failed: sys.exit(f"watchdog bound not met: {', '.join(failed)}")
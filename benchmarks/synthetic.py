@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+T0 = 1700000000000000          # microseconds, like the Tardis-style CSVs the historical mode reads
+
+DEFAULTS = {
+    "duplicate_rate": 0.002,   # trade ids replayed a few rows later
+    "zero_price_rate": 0.001,  # fat-finger trades at price 0
+    "ts_error_rate": 0.0005,   # local_timestamp far off event time
+    "crossed_rate": 0.003,     # book updates through the opposite side
+    "stale_gaps": 2,           # silent periods with no data at all
+    "stale_gap_us": 8000000,
+    "shocks": 3,               # vol/spread regime shocks
+    "shock_len": 2000,         # trades per shock
+}
+
+def _gaps(ts, starts, gap_us):
+    # Shift everything after each gap start so that the feed goes quiet for gap_us
+    for s in starts: ts = np.where(ts >= s, ts + gap_us, ts)
+    return ts
+
+def generate(out_dir, n_trades=200000, seed=0, **overrides):
+    # Seeded trades/orderbook/ticker/liquidation CSVs with injected dirty data; returns the parameters used
+    p = dict(DEFAULTS, **overrides)
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    n = n_trades
+    span = n * 2000
+    gap_starts = np.sort(T0 + rng.integers(span // 10, span, p["stale_gaps"]))
+
+    # Trades: random walk whose volatility jumps x10 inside the shock windows
+    ts = _gaps(np.sort(T0 + rng.integers(0, span, n)), gap_starts, p["stale_gap_us"])
+    sigma = np.full(n, 1e-5)
+    shock_starts = rng.integers(0, max(1, n - p["shock_len"]), p["shocks"])
+    for s in shock_starts: sigma[s:s + p["shock_len"]] *= 10
+    price = 30000 * np.exp(np.cumsum(rng.normal(0, 1, n) * sigma))
+    trade_price = np.round(price, 1)
+    trade_price[rng.random(n) < p["zero_price_rate"]] = 0
+    ids = np.arange(n) + 1000
+    dup = np.flatnonzero(rng.random(n) < p["duplicate_rate"])
+    ids[dup] = ids[np.maximum(dup - 3, 0)]
+    local = ts + rng.integers(0, 2000, n)
+    local[rng.random(n) < p["ts_error_rate"]] += 10 ** 9
+    pd.DataFrame({'timestamp': ts, 'local_timestamp': local, 'id': ids, 'price': trade_price, 'amount': 1.0}).to_csv(os.path.join(out_dir, 'trades.csv'), index=False)
+
+    # Order book: one side per row around the trade mid; spreads blow up x50 during shocks
+    ob_ts = _gaps(np.sort(T0 + rng.integers(0, span, n)), gap_starts, p["stale_gap_us"])
+    side = rng.choice(np.array(['bid', 'ask']), n)
+    mid = np.interp(ob_ts, ts, price)
+    spread = np.abs(rng.normal(0.5, 0.3, n)) + 0.1
+    in_shock = np.zeros(n, bool)
+    for s in shock_starts:
+        lo, hi = ts[s], ts[min(s + p["shock_len"], n - 1)]
+        in_shock |= (ob_ts >= lo) & (ob_ts <= hi)
+    spread[in_shock] *= 50
+    ob_price = np.where(side == 'bid', mid - spread / 2, mid + spread / 2)
+    crossed = rng.random(n) < p["crossed_rate"]
+    ob_price[crossed] = np.where(side[crossed] == 'bid', mid[crossed] + 5, mid[crossed] - 5)
+    pd.DataFrame({'timestamp': ob_ts, 'local_timestamp': ob_ts + 100, 'side': side, 'price': ob_price.round(2), 'amount': 1.0}).to_csv(os.path.join(out_dir, 'orderbook.csv'), index=False)
+
+    tk_ts = _gaps(np.sort(T0 + rng.integers(0, span, n // 20)), gap_starts, p["stale_gap_us"])
+    pd.DataFrame({'timestamp': tk_ts, 'local_timestamp': tk_ts + 50, 'last_price': np.round(np.interp(tk_ts, ts, price), 1)}).to_csv(os.path.join(out_dir, 'ticker.csv'), index=False)
+
+    lq_ts = _gaps(np.sort(T0 + rng.integers(0, span, max(1, n // 100))), gap_starts, p["stale_gap_us"])
+    pd.DataFrame({'timestamp': lq_ts, 'local_timestamp': lq_ts + 10, 'side': rng.choice(np.array(['buy', 'sell']), len(lq_ts)),
+                  'price': np.round(np.interp(lq_ts, ts, price), 1), 'amount': 1.0}).to_csv(os.path.join(out_dir, 'liquidations.csv'), index=False)
+    return dict(p, n_trades=n, seed=seed)
+
+if __name__ == "__main__":
+    # python benchmarks/synthetic.py <out_dir> [n_trades] [seed]
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/synthetic.py <out_dir> [n_trades] [seed]")
+        sys.exit(1)
+    out_dir = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    print(json.dumps(generate(out_dir, n, seed)))
@@ -0,0 +1,139 @@
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import ACTIONS, STATES, ACTION_CODES, STATE_CODES
+from decision_trace import REASONS
+
+# Segment: HEADER (magic, slot count, slot size, open flag) on the first cache line, the head (seq of the last
+# published decision) alone on the second, then the slots. Slot i % slots holds decision i (seqs start at 1):
+# SEQ, then PAYLOAD (ts, duration_ms, publish time in ns since the epoch, action/state codes, reason code).
+MAGIC = 0x31474E4952474541          # b"AEGRING1"
+HEADER = struct.Struct("<QIII")
+HEAD_OFFSET = 64
+SLOTS_OFFSET = 128
+SEQ = struct.Struct("<q")
+PAYLOAD = struct.Struct("<qqqbbH4x")
+SLOT_SIZE = SEQ.size + PAYLOAD.size
+OTHER = len(REASONS)                # a reason outside the fixed dictionary
+REASON_NAMES = REASONS + ("OTHER",)
+REASON_CODES = {r: i for i, r in enumerate(REASONS)}
+
+Decision = namedtuple("Decision", "seq ts action reason duration_ms state publish_ns")
+
+class DecisionPublisher:
+    # Single writer of a ring of fixed-size decision slots in shared memory. A slot is rewritten under a negative
+    # seq and gets its positive seq back once complete; the head moves after that, so everything up to the head is
+    # readable and a reader that sees a different seq in a slot knows the writer lapped it. The stores are plain
+    # memory writes in program order, which x86 keeps; no locks and no syscalls per decision.
+    def __init__(self, name, slots=1 << 16):
+        size = SLOTS_OFFSET + slots * SLOT_SIZE
+        try: self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a publisher that died without close()
+            stale = shared_memory.SharedMemory(name)
+            stale.unlink(); stale.close()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        self.slots = slots
+        self.buf = self.shm.buf
+        self.head = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, slots, SLOT_SIZE, 1)
+        SEQ.pack_into(self.buf, HEAD_OFFSET, 0)
+
+    @classmethod
+    def attach(cls, engine):
+        # Publisher on Config.DECISION_RING that the engine feeds from _format_decision, or None when the name is empty
+        config = engine.config
+        if not config.DECISION_RING: return None
+        publisher = cls(config.DECISION_RING, config.DECISION_RING_SLOTS)
+        engine.publisher = publisher
+        print(f"Publishing decisions: shared memory '{publisher.name}' ({publisher.slots} slots)")
+        return publisher
+
+    def publish(self, result):
+        reason = result['reason']
+        code = REASON_CODES.get(reason.split(" (", 1)[0] if reason else "", OTHER)
+        seq = self.head + 1
+        buf, off = self.buf, SLOTS_OFFSET + (seq - 1) % self.slots * SLOT_SIZE
+        SEQ.pack_into(buf, off, -seq)
+        PAYLOAD.pack_into(buf, off + SEQ.size, result['ts'], result['duration_ms'], time.time_ns(),
+                          ACTION_CODES[result['action']], STATE_CODES[result['_internal_state']], code)
+        SEQ.pack_into(buf, off, seq)
+        SEQ.pack_into(buf, HEAD_OFFSET, seq)
+        self.head = seq
+
+    def close(self):
+        # Readers see the ring closed; the segment goes away once they detach
+        HEADER.pack_into(self.buf, 0, MAGIC, self.slots, SLOT_SIZE, 0)
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+def _attach(name):
+    # An existing segment without handing it to this process's resource tracker, which would otherwise unlink it
+    # when the reader exits (track=False from 3.13; before that, registration is skipped for the call)
+    try: return shared_memory.SharedMemory(name, track=False)
+    except TypeError: pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try: return shared_memory.SharedMemory(name)
+    finally: resource_tracker.register = register
+
+class DecisionReader:
+    # Reader of a DecisionPublisher's ring from any process. poll() returns the decisions published since the
+    # last call, oldest first; when the writer has lapped the reader, the overwritten ones are counted in `lost`
+    # and reading resumes at the oldest decision still in the ring.
+    def __init__(self, name, start="latest"):
+        self.shm = _attach(name)
+        magic, self.slots, slot_size, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or slot_size != SLOT_SIZE: raise ValueError(f"not a decision ring: {name}")
+        self.buf = self.shm.buf
+        self.lost = 0
+        head = self.head()
+        self.next = head + 1 if start == "latest" else max(1, head - self.slots + 1)
+
+    def head(self):
+        return SEQ.unpack_from(self.buf, HEAD_OFFSET)[0]
+
+    @property
+    def closed(self):
+        return HEADER.unpack_from(self.buf, 0)[3] == 0
+
+    def poll(self, limit=4096):
+        buf, slots, out = self.buf, self.slots, []
+        head = self.head()
+        while self.next <= head and len(out) < limit:
+            seq = self.next
+            if head - seq >= slots:
+                # Lapped before we got here
+                self.lost += head - slots + 1 - seq
+                self.next = seq = head - slots + 1
+            off = SLOTS_OFFSET + (seq - 1) % slots * SLOT_SIZE
+            payload = PAYLOAD.unpack_from(buf, off + SEQ.size)
+            if SEQ.unpack_from(buf, off)[0] != seq:
+                # Overwritten while we read it
+                head = self.head()
+                continue
+            ts, duration, publish_ns, action, state, reason = payload
+            out.append(Decision(seq, ts, ACTIONS[action], REASON_NAMES[reason], duration, STATES[state], publish_ns))
+            self.next = seq + 1
+        return out
+
+    def wait(self, timeout=None, limit=4096):
+        # poll() until something arrives, the ring closes or timeout (s) runs out; yields the CPU between polls
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            out = self.poll(limit)
+            if out or self.closed or (deadline is not None and time.monotonic() >= deadline): return out
+            os.sched_yield()
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
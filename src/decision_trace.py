@@ -0,0 +1,179 @@
+import numpy as np
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import zipfile
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config, STATES, ACTIONS
+
+TRACE_VERSION = 1
+TRACE_DIRNAME = "trace"
+# One column per field; reason is a code into the manifest's dictionary
+COLUMNS = {"ts": np.int64, "action": np.int8, "reason": np.int16, "state": np.int8,
+           "dist": np.float64, "threshold": np.float64, "vol": np.float64, "spread": np.float64}
+# Reason codes known up front so partitions agree; anything else is added on first sight.
+# ADAPTIVE_SHOCK drops its "(Dist:..)" suffix, the distance is in its own column.
+REASONS = ("", "QUARANTINE: DUPLICATE", "QUARANTINE: TIMESTAMP_ERROR", "QUARANTINE: FAT_FINGER",
+           "CROSSED_MARKET", "DATA_STALE", "RECOVERED", "ADAPTIVE_SHOCK")
+
+def write_chunk(path, name, chunk, compress_level=1):
+    # One chunk as an .npz of per-column .npy members; written under a temp name so readers never see half a chunk
+    tmp = os.path.join(path, name + ".tmp")
+    method = zipfile.ZIP_DEFLATED if compress_level else zipfile.ZIP_STORED
+    with zipfile.ZipFile(tmp, 'w', method, compresslevel=compress_level or None) as zf:
+        for column, values in chunk.items():
+            with zf.open(column + ".npy", 'w', force_zip64=True) as f: np.lib.format.write_array(f, values, allow_pickle=False)
+    os.replace(tmp, os.path.join(path, name))
+
+def write_manifest(path, reasons, chunks):
+    manifest = {"version": TRACE_VERSION, "rows": sum(c["rows"] for c in chunks), "columns": {c: np.dtype(d).str for c, d in COLUMNS.items()},
+                "reasons": list(reasons), "actions": list(ACTIONS), "states": list(STATES), "chunks": list(chunks)}
+    tmp = os.path.join(path, "manifest.json.tmp")
+    with open(tmp, 'w') as f: json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(path, "manifest.json"))
+    return manifest
+
+def reason_code(codes, reason):
+    # Dictionary code of a trigger, adding it on first sight
+    key = reason.split(" (", 1)[0]
+    if key not in codes: codes[key] = len(codes)
+    return codes[key]
+
+class TraceWriter:
+    # Every event of a historical replay as chunked columns: chunk_NNNNNN.npz holds one .npy per column for
+    # chunk_rows events, deflated on a background thread while the engine carries on. manifest.json (written
+    # after every chunk) lists the chunks and the reason/action/state dictionaries.
+    def __init__(self, path, chunk_rows=1 << 20, compress_level=1):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.compress_level = compress_level
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        self.codes = {r: i for i, r in enumerate(REASONS)}
+        self.parts, self.buffered = [], 0
+        self.chunks = []
+        self.queue = queue.Queue(maxsize=2)
+        self.error = None
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def attach(cls, output_dir, config=Config):
+        # TraceWriter into output_dir/trace when the config has tracing on, else None
+        if not config.TRACE: return None
+        return cls(os.path.join(output_dir, TRACE_DIRNAME), config.TRACE_CHUNK_ROWS, config.TRACE_COMPRESS_LEVEL)
+
+    def write(self, batch, lo=0):
+        # batch: process_batch(..., trace=True) output; rows before lo are warm-up and not traced
+        reasons = batch['reason'][lo:] if lo else batch['reason']
+        if not len(reasons): return
+        get = self.codes.get
+        codes = np.fromiter((get(r, -1) for r in reasons), np.int16, len(reasons))
+        for i in np.flatnonzero(codes < 0).tolist(): codes[i] = reason_code(self.codes, reasons[i])
+        part = {c: (batch[c][lo:] if c != "reason" else codes) for c in COLUMNS}
+        self.parts.append(part)
+        self.buffered += len(codes)
+        while self.buffered >= self.chunk_rows: self._cut(self.chunk_rows)
+
+    def _cut(self, rows):
+        # Hands the first `rows` buffered events to the writer thread as one chunk
+        take, keep, need = [], [], rows
+        for part in self.parts:
+            n = len(part["ts"])
+            if need >= n: take.append(part); need -= n
+            elif need: take.append({c: v[:need] for c, v in part.items()}); keep.append({c: v[need:] for c, v in part.items()}); need = 0
+            else: keep.append(part)
+        self.parts, self.buffered = keep, self.buffered - rows
+        chunk = {c: np.ascontiguousarray(np.concatenate([p[c] for p in take]), dtype=dtype) for c, dtype in COLUMNS.items()}
+        name = f"chunk_{len(self.chunks):06d}.npz"
+        self.chunks.append({"file": name, "rows": rows, "ts_first": int(chunk["ts"][0]), "ts_last": int(chunk["ts"][-1])})
+        self.queue.put((name, chunk, list(self.codes), list(self.chunks)))
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None: return
+            name, chunk, reasons, chunks = item
+            try:
+                write_chunk(self.path, name, chunk, self.compress_level)
+                write_manifest(self.path, reasons, chunks)
+            except OSError as e: self.error = e
+
+    def close(self):
+        # Flushes the last partial chunk and waits for the writer thread; returns the manifest
+        if self.buffered: self._cut(self.buffered)
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None: raise self.error
+        return write_manifest(self.path, self.codes, self.chunks)
+
+def merge_traces(paths, target, compress_level=1):
+    # Concatenates partition traces (in order) into target: chunks are moved and renumbered, and only
+    # rewritten when a partition's reason dictionary differs from the merged one
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    codes, chunks = {r: i for i, r in enumerate(REASONS)}, []
+    for path in paths:
+        with open(os.path.join(path, "manifest.json")) as f: manifest = json.load(f)
+        remap = np.array([reason_code(codes, r) for r in manifest["reasons"]], np.int16)
+        for chunk in manifest["chunks"]:
+            name, source = f"chunk_{len(chunks):06d}.npz", os.path.join(path, chunk["file"])
+            if (remap == np.arange(len(remap))).all(): os.replace(source, os.path.join(target, name))
+            else:
+                with np.load(source) as npz: columns = {c: npz[c] for c in npz.files}
+                columns["reason"] = remap[columns["reason"]]
+                write_chunk(target, name, columns, compress_level)
+                os.remove(source)
+            chunks.append(dict(chunk, file=name))
+    return write_manifest(target, codes, chunks)
+
+class TraceReader:
+    # Read side of a trace directory. column() decompresses one column of every chunk into a single array;
+    # mmap() does that once into columns/<name>.npy and memory-maps it, so later analyses open it for free.
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f: self.manifest = json.load(f)
+        self.reasons, self.actions, self.states = self.manifest["reasons"], self.manifest["actions"], self.manifest["states"]
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def chunks(self, columns=None):
+        # {column: array} per chunk, loading only the requested columns
+        for chunk in self.manifest["chunks"]:
+            with np.load(os.path.join(self.path, chunk["file"])) as npz:
+                yield {c: npz[c] for c in (columns or npz.files)}
+
+    def _fill(self, name, out):
+        pos = 0
+        for chunk in self.chunks([name]):
+            values = chunk[name]
+            out[pos:pos + len(values)] = values; pos += len(values)
+        return out
+
+    def column(self, name):
+        return self._fill(name, np.empty(len(self), np.dtype(self.manifest["columns"][name])))
+
+    def mmap(self, name):
+        target = os.path.join(self.path, "columns", name + ".npy")
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            out = self._fill(name, np.lib.format.open_memmap(target + ".tmp", 'w+', np.dtype(self.manifest["columns"][name]), (len(self),)))
+            out.flush(); del out
+            os.replace(target + ".tmp", target)
+        return np.load(target, mmap_mode='r')
+
+    def frame(self, columns=None):
+        # pandas DataFrame with action/reason/state decoded to categoricals
+        import pandas as pd
+        names = columns or list(self.manifest["columns"])
+        data = {c: self.column(c) for c in names}
+        for c, labels in (("action", self.actions), ("reason", self.reasons), ("state", self.states)):
+            if c in data: data[c] = pd.Categorical.from_codes(data[c], labels)
+        return pd.DataFrame(data)
@@ -1,10 +1,13 @@
 import numpy as np
 import json
+import math
 import os
+from array import array
 from collections import deque
-from dataclasses import dataclass
 from typing import Dict, Tuple
 
+from order_book import OrderBook
+
 class Config:
     FAT_FINGER_PRICE = 0.0
     STALE_TICKER_MS = 5000        
@@ -13,27 +16,106 @@ class Config:
     MU = np.array([0.0, 0.0])
     INV_COV = np.eye(2)
     TIMESTAMP_TOLERANCE_MS = 60 * 1000 
+    DEDUP_BACKEND = "compact"  # "compact": ~4x less memory than "set" (5M ids: ~115 vs ~470 MB) at ~45% fewer ids/s (~0.64M vs ~1.15M, bench_dedupe)
+    DEDUP_MAX_IDS = 5000000  # int and non-int ids together
+    DEDUP_WINDOW_MS = 0
+    SYMBOL_DEDUP_MAX_IDS = 1000000  # multi_symbol: DEDUP_MAX_IDS of each symbol's engine, with many engines per process
+    SNAPSHOT_INTERVAL_MS = 5000
+    SNAPSHOT_MAX_AGE_MS = 10 * 60 * 1000
+    LOG_FLUSH_BYTES = 1 << 20
+    LOG_FLUSH_MS = 200
+    LOG_ROTATE_BYTES = 0          # 0 = no size rotation
+    LOG_ROTATE_HOURLY = False
+    LOG_COMPRESS = False
+    PROFILE = False
+    PROFILE_SAMPLE_EVERY = 64     # profile 1 of every N events (and the leading 1/N of every batch)
+    TRACE = False                 # historical: columnar trace of every event (see decision_trace.py)
+    TRACE_CHUNK_ROWS = 1 << 20
+    TRACE_COMPRESS_LEVEL = 1      # zlib level of the trace chunks, 0 = stored
+    RELOAD_POLL_MS = 1000         # model_config.json watch interval in realtime modes, 0 = off
+    BOOK_LEVELS = 5               # levels per side in the L2 book's depth imbalance (realtime seeds only the top 5 from depth5)
+    RELOAD_RESCALE = False        # on reload, rescale the distance history to the new model instead of discarding it
+    REORDER_LATENCY_MS = 50       # realtime: how long events may wait to be put in event_time order, 0 = no reordering
+    FEED_RECORD = False           # realtime: record raw frames to output/realtime/feeds (see feed_log.py)
+    FEED_BLOCK_BYTES = 256 << 10
+    FEED_FLUSH_MS = 1000          # a block is written at least this often while frames arrive
+    FEED_COMPRESS_LEVEL = 1
+    METRICS_HOST = "127.0.0.1"    # realtime: live metrics endpoint (see metrics.py)
+    METRICS_PORT = 9108           # 0 = off
+    METRICS_RATE_WINDOW_S = 10    # events/s are averaged over this many seconds
+    DECISION_RING = ""            # realtime: shared memory name to publish every decision under (see decision_ring.py), "" = off
+    DECISION_RING_SLOTS = 1 << 16
+    STALE_WATCHDOG = True         # HALT a silent feed after STALE_TICKER_MS on a timer (event time in historical), not on the next event
+    TIME_UNITS_PER_MS = 1000      # engine clock: µs in historical data; the realtime adapter runs in ms
     
     @classmethod
     def load(cls, config_path):
         if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r') as f:
-                    data = json.load(f)
-                    cls.MU = np.array(data['mu'])
-                    cls.INV_COV = np.array(data['inv_cov'])
-                    if 'timestamp_tolerance_ms' in data:
-                        cls.TIMESTAMP_TOLERANCE_MS = data['timestamp_tolerance_ms']
-            except: pass
-
-@dataclass
+            try: params = cls.read_model(config_path)
+            except (OSError, ValueError) as e:
+                # Same report as a rejected hot reload; the engine keeps the parameters it already has
+                print(f"\n[Model Load Rejected] {config_path}: {e}")
+                return
+            for name, value in params.items(): setattr(cls, name, value)
+
+    @staticmethod
+    def read_model(config_path):
+        # Validated model parameters of a model_config.json as Config attributes; ValueError when unusable
+        with open(config_path, 'r') as f: return Config.model_params(json.load(f))
+
+    @staticmethod
+    def model_params(data):
+        try: mu, inv_cov = np.array(data['mu'], dtype=np.float64), np.array(data['inv_cov'], dtype=np.float64)
+        except (KeyError, TypeError) as e: raise ValueError(f"missing or malformed mu/inv_cov: {e!r}")
+        if mu.shape != (2,) or inv_cov.shape != (2, 2): raise ValueError(f"expected mu (2,) and inv_cov (2, 2), got {mu.shape} and {inv_cov.shape}")
+        if not (np.isfinite(mu).all() and np.isfinite(inv_cov).all()): raise ValueError("non-finite mu/inv_cov")
+        if not np.allclose(inv_cov, inv_cov.T) or np.linalg.eigvalsh(inv_cov)[0] <= 0: raise ValueError("inv_cov is not symmetric positive definite")
+        params = {"MU": mu, "INV_COV": inv_cov}
+        if 'timestamp_tolerance_ms' in data:
+            tolerance = data['timestamp_tolerance_ms']
+            if not isinstance(tolerance, (int, float)) or tolerance <= 0: raise ValueError(f"bad timestamp_tolerance_ms: {tolerance!r}")
+            params["TIMESTAMP_TOLERANCE_MS"] = tolerance
+        return params
+
+    @classmethod
+    def derive(cls, **overrides):
+        # Independent copy for one engine: load() on it no longer touches the shared class
+        return type(cls.__name__, (cls,), overrides)
+
 class MarketEvent:
-    event_time: int
-    local_time: int
-    type: str
-    data: Dict
-    sanitization: str = "ACCEPT"
-    reject_reason: str = ""
+    # One event with its fields parsed once at ingest: etype/side as TYPE_CODES/SIDE_CODES, price as float (nan when
+    # absent), key as the normalized dedup id (None when absent), book as a depth update tuple
+    # (snapshot, bids, asks, U, u, pu). The raw payload is kept in data only when the producer asks for it.
+    __slots__ = ("event_time", "local_time", "etype", "price", "side", "key", "book", "data", "sanitization", "reject_reason")
+
+    def __init__(self, event_time, local_time, etype, price=math.nan, side=0, key=None, book=None, data=None):
+        self.event_time = event_time
+        self.local_time = local_time
+        self.etype = etype
+        self.price = price
+        self.side = side
+        self.key = key
+        self.book = book
+        self.data = data
+        self.sanitization = "ACCEPT"
+        self.reject_reason = ""
+
+    @classmethod
+    def from_payload(cls, event_time, local_time, type_name, data, keep_raw=False):
+        # Event from a free-form payload dict ('price', 'side', 'id'), parsed the way the engine always read them
+        price = math.nan
+        if 'price' in data:
+            try: price = float(data['price'])
+            except (TypeError, ValueError): pass
+        key = DataSanitizer.normalize_id(data['id']) if 'id' in data else None
+        return cls(event_time, local_time, TYPE_CODES.get(type_name, -1), price, SIDE_CODES.get(data.get('side'), 0), key, data=data if keep_raw else None)
+
+    @property
+    def type(self):
+        return EVENT_TYPES[self.etype] if 0 <= self.etype < len(EVENT_TYPES) else "UNKNOWN"
+
+    def __repr__(self):
+        return f"MarketEvent({self.event_time}, {self.local_time}, {self.type}, price={self.price}, side={SIDES[self.side]!r}, key={self.key!r})"
 
 class SystemState(str):
     BOOTSTRAP = "BOOTSTRAP"
@@ -41,82 +123,453 @@ class SystemState(str):
     UNSTABLE = "UNSTABLE"
     HALTED = "HALTED"
 
-class DataSanitizer:
-    def __init__(self):
+# Integer codes used by the columnar (batch) API
+EVENT_TYPES = ("TRADE", "ORDERBOOK", "TICKER", "LIQUIDATION")
+SIDES = ("", "bid", "ask")
+ACTIONS = ("ALLOWED", "HALT", "RESTRICTED", "IGNORED")
+STATES = (SystemState.BOOTSTRAP, SystemState.NORMAL, SystemState.UNSTABLE, SystemState.HALTED)
+TYPE_CODES = {name: i for i, name in enumerate(EVENT_TYPES)}
+SIDE_CODES = {name: i for i, name in enumerate(SIDES)}
+ACTION_CODES = {name: i for i, name in enumerate(ACTIONS)}
+STATE_CODES = {name: i for i, name in enumerate(STATES)}
+TRADE, ORDERBOOK, TICKER, LIQUIDATION = range(4)
+BID, ASK = 1, 2
+
+STATE_INFO = {
+    SystemState.BOOTSTRAP: ("DEGRADED", "GATHERING"),
+    SystemState.NORMAL: ("TRUSTED", "VALID"),
+    SystemState.UNSTABLE: ("DEGRADED", "WEAKENING"),
+    SystemState.HALTED: ("UNTRUSTED", "INVALID"),
+}
+
+class SetIdFilter:
+    # Original dedupe store: stringified ids in a set, evicted FIFO by count
+    def __init__(self, max_ids=5000000, window_ms=0, units_per_ms=1000):
+        self.max_ids = max_ids
         self.seen_ids = set()
-        self.recent_ids = deque(maxlen=5000000) 
+        self.recent_ids = deque(maxlen=max_ids)
+
+    def seen(self, key, event_time) -> bool:
+        str_id = str(key)
+        if str_id in self.seen_ids: return True
+        self.seen_ids.add(str_id)
+        self.recent_ids.append(str_id)
+        if len(self.seen_ids) > self.max_ids: 
+            removed = self.recent_ids.popleft()
+            self.seen_ids.discard(removed)
+        return False
+
+    def snapshot(self, since=None):
+        # Common filter snapshot layout: int ids (oldest first) as an array, everything else as [key, time].
+        # Always the full state: without "since" in it the checkpointer takes it as is
+        ints = [int(v) for v in self.recent_ids if v.lstrip('-').isdigit()]
+        return {"ids": np.array(ints, np.int64), "times": None, "other": [[v, 0] for v in self.recent_ids if not v.lstrip('-').isdigit()]}
+
+    def restore(self, state):
+        for key in state["ids"].tolist(): self.seen(key, 0)
+        for key, t in state["other"]: self.seen(key, t)
+
+    def __len__(self): return len(self.seen_ids)
+
+class CompactIdFilter:
+    # Integer ids live in int64 open-addressing tables (linear probing, load <= 0.7) with a FIFO ring recording
+    # insertion order, so expiry by count or by event-time window is O(1) amortized. The table is split into
+    # 2^SHARD_BITS shards on the top hash bits; each starts small and doubles on its own, and so does the ring, up
+    # to max_ids. An engine pays for the ids it holds, and a growth step only rehashes one shard.
+    # Ids that are not int64 (non-numeric strings, huge ints) fall back to a set with the same expiry; both count
+    # against max_ids together and the oldest id of either kind goes first.
+    EMPTY = -(1 << 63)
+    HASH_MULT = 0x9E3779B97F4A7C15
+    SHARD_BITS = 6
+    INITIAL_IDS = 1 << 12
+
+    def __init__(self, max_ids=5000000, window_ms=0, units_per_ms=1000):
+        self.max_ids = max_ids
+        self.window = window_ms * units_per_ms      # in event_time units (µs historical, ms realtime)
+        self.top = 64 - self.SHARD_BITS
+        shards = 1 << self.SHARD_BITS
+        self.tables, self.shifts, self.masks, self.loads, self.limits = [None] * shards, [0] * shards, [0] * shards, [0] * shards, [0] * shards
+        for shard in range(shards): self._allocate(shard, min(max_ids, self.INITIAL_IDS) // shards)
+        self.capacity = min(max_ids, self.INITIAL_IDS)
+        self.ring = array('q', bytes(8 * self.capacity))
+        self.times = array('q', bytes(8 * self.capacity)) if self.window else None
+        self.head = 0
+        self.count = 0
+        self.added = 0          # ids ever put in the ring; the live ones are always the newest `count` of them
+        self.other = {}
+        self.other_order = deque()    # (key, event_time, ints added before it) oldest first
+        self.room = max_ids           # ring entries allowed next to the non-int ids: max_ids - len(other)
+
+    def _allocate(self, shard, ids):
+        # Empty table for one shard holding up to `ids` ids
+        bits = max(4, (int(ids / 0.7) + 1).bit_length())
+        self.tables[shard] = array('q', [self.EMPTY]) * (1 << bits)
+        self.shifts[shard] = self.top - bits
+        self.masks[shard] = (1 << bits) - 1
+        self.limits[shard] = int(0.7 * (1 << bits))
+        self.loads[shard] = 0
+
+    def _place(self, shard, keys):
+        # Bulk insert of distinct keys into the shard's empty table. Sorted by home slot, each key goes to the first
+        # slot past its home and past the keys before it; a run pushed off the end wraps to the first free slots
+        table = np.frombuffer(self.tables[shard], np.int64)
+        hashes = keys.astype(np.uint64) * np.uint64(self.HASH_MULT)
+        home = ((hashes >> np.uint64(self.shifts[shard])) & np.uint64(self.masks[shard])).astype(np.int64)
+        order = np.argsort(home)
+        step = np.arange(len(keys))
+        pos = np.maximum.accumulate(home[order] - step) + step
+        fits = pos < len(table)
+        table[pos[fits]] = keys[order[fits]]
+        if not fits.all(): table[np.flatnonzero(table == self.EMPTY)[:len(keys) - fits.sum()]] = keys[order[~fits]]
+        self.loads[shard] = len(keys)
+
+    def _grow(self, shard):
+        table = np.frombuffer(self.tables[shard], np.int64)
+        keys = table[table != self.EMPTY]
+        self._allocate(shard, len(table))
+        self._place(shard, keys)
+
+    def _grow_ring(self, capacity):
+        # A zero block spliced in at head keeps the ring order: the older part moves up past it and head follows
+        extra = capacity - self.capacity
+        self.ring[self.head:self.head] = array('q', [0]) * extra
+        if self.times is not None: self.times[self.head:self.head] = array('q', [0]) * extra
+        if self.count: self.head += extra
+        self.capacity = capacity
+
+    def seen(self, key, event_time) -> bool:
+        if type(key) is not int or not (self.EMPTY < key < (1 << 63)): return self._seen_other(str(key), event_time)
+        if self.times is not None:
+            horizon = event_time - self.window
+            if (self.count and self.times[self.head] < horizon) or (self.other_order and self.other_order[0][1] < horizon): self._expire(event_time)
+
+        h = (key * self.HASH_MULT) & 0xFFFFFFFFFFFFFFFF
+        shard = h >> self.top
+        table, mask = self.tables[shard], self.masks[shard]
+        i = (h >> self.shifts[shard]) & mask
+        while True:
+            v = table[i]
+            if v == key: return True
+            if v == self.EMPTY: break
+            i = (i + 1) & mask
+        if self.count == self.capacity or self.count >= self.room or self.loads[shard] >= self.limits[shard]:
+            # Full ring (capacity reaches max_ids last), no room left under max_ids or full shard. Evicting may shift
+            # the probe run and growing rehashes the shard, so look for the free slot again
+            while self.count >= self.room: self._evict()
+            if self.count == self.capacity: self._grow_ring(min(self.max_ids, 2 * self.capacity))
+            if self.loads[shard] >= self.limits[shard]: self._grow(shard)
+            table, mask = self.tables[shard], self.masks[shard]
+            i = (h >> self.shifts[shard]) & mask
+            while table[i] != self.EMPTY: i = (i + 1) & mask
+        table[i] = key
+        self.loads[shard] += 1
+
+        tail = (self.head + self.count) % self.capacity
+        self.ring[tail] = key
+        if self.times is not None: self.times[tail] = event_time
+        self.count += 1
+        self.added += 1
+        return False
+
+    def _expire(self, event_time):
+        # Window expiry of both kinds: expired ids of one must not take room under max_ids from the other
+        horizon = event_time - self.window
+        while self.count and self.times[self.head] < horizon: self._pop_ring()
+        while self.other_order and self.other_order[0][1] < horizon: self._pop_other()
+
+    def _pop_ring(self):
+        self._delete(self.ring[self.head])
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+
+    def _pop_other(self):
+        self.other.pop(self.other_order.popleft()[0], None)
+        self.room += 1
+
+    def _evict(self):
+        # Drops the oldest id of either kind: a non-int one is older than the ring head when it came in before that int
+        order = self.other_order
+        if order and (not self.count or order[0][2] <= self.added - self.count): self._pop_other()
+        else: self._pop_ring()
+
+    def _delete(self, key):
+        h = (key * self.HASH_MULT) & 0xFFFFFFFFFFFFFFFF
+        shard = h >> self.top
+        table, mask, shift = self.tables[shard], self.masks[shard], self.shifts[shard]
+        i = (h >> shift) & mask
+        while table[i] != key:
+            if table[i] == self.EMPTY: return
+            i = (i + 1) & mask
+        self.loads[shard] -= 1
+        # Backward-shift deletion: pull later members of the probe run into the hole
+        j = i
+        while True:
+            j = (j + 1) & mask
+            v = table[j]
+            if v == self.EMPTY: break
+            home = (((v * self.HASH_MULT) & 0xFFFFFFFFFFFFFFFF) >> shift) & mask
+            if (i <= j and i < home <= j) or (i > j and (home > i or home <= j)): continue
+            table[i] = v
+            i = j
+        table[i] = self.EMPTY
+
+    def _seen_other(self, key, event_time) -> bool:
+        other, order = self.other, self.other_order
+        if self.times is not None: self._expire(event_time)
+        if key in other: return True
+        while self.count + len(order) >= self.max_ids: self._evict()
+        other[key] = event_time
+        order.append((key, event_time, self.added))
+        self.room -= 1
+        return False
+
+    def _live(self, ring, newest):
+        # Copy of the newest live entries of the ring (or times), oldest first: at most two contiguous slices
+        values, start = np.frombuffer(ring, np.int64), (self.head + self.count - newest) % self.capacity
+        end = start + newest
+        return values[start:end].copy() if end <= self.capacity else np.concatenate((values[start:], values[:end - self.capacity]))
+
+    def snapshot(self, since=None):
+        # Only the live ids go out, oldest first; the hash tables are rebuilt on restore. With `since` (the "added" of
+        # an earlier snapshot) only the ids put in after it, for snapshot.merge_ids to stack on that snapshot
+        newest = self.count if since is None else min(self.added - since, self.count)
+        times = self._live(self.times, newest) if self.times is not None else None
+        state = {"ids": self._live(self.ring, newest), "times": times, "other": [[key, t] for key, t, _ in self.other_order], "added": self.added, "count": self.count}
+        if since is not None: state["since"] = since
+        return state
+
+    def restore(self, state):
+        # Meant for a fresh filter: bulk-places the newest max_ids ids, each shard and the ring sized for what they
+        # get, then replays the non-int ones
+        ids, times = state["ids"][-self.max_ids:], state["times"]
+        n = len(ids)
+        shards = ((ids.astype(np.uint64) * np.uint64(self.HASH_MULT)) >> np.uint64(self.top)).astype(np.uint8)
+        order = np.argsort(shards, kind='stable')
+        bounds = np.searchsorted(shards[order], np.arange(len(self.tables) + 1))
+        for shard in range(len(self.tables)):
+            keys = ids[order[bounds[shard]:bounds[shard + 1]]]
+            if len(keys) >= self.limits[shard]: self._allocate(shard, len(keys))
+            self._place(shard, keys)
+        capacity = self.capacity
+        while capacity < n: capacity = min(self.max_ids, 2 * capacity)
+        if capacity > self.capacity:
+            # Nothing in the ring yet to keep in order: fresh arrays instead of _grow_ring's splice
+            self.ring = array('q', bytes(8 * capacity))
+            if self.times is not None: self.times = array('q', bytes(8 * capacity))
+            self.capacity = capacity
+        np.frombuffer(self.ring, np.int64)[:n] = ids
+        if self.times is not None and times is not None: np.frombuffer(self.times, np.int64)[:n] = times[-n:] if n else times[:0]
+        self.head, self.count = 0, n
+        self.added += n
+        for key, t in state["other"]: self._seen_other(key, t)
+
+    def __len__(self): return self.count + len(self.other)
+
+ID_FILTERS = {"set": SetIdFilter, "compact": CompactIdFilter}
+
+class DataSanitizer:
+    def __init__(self, id_filter=None, config=Config):
+        self.config = config
+        self.id_filter = id_filter if id_filter is not None else ID_FILTERS[config.DEDUP_BACKEND](config.DEDUP_MAX_IDS, config.DEDUP_WINDOW_MS, config.TIME_UNITS_PER_MS)
+
+    @staticmethod
+    def normalize_id(raw_id):
+        # int key for anything numeric (as int(float(id)) always did), stripped string otherwise
+        if raw_id is None: return None
+        if type(raw_id) is int: return raw_id
+        try: 
+            return int(float(raw_id))
+        except: 
+            str_id = str(raw_id).strip()
+        return None if str_id.lower() == 'nan' else str_id
+
+    @staticmethod
+    def normalize_ids(ids):
+        # Column version of normalize_id: list of keys, None where there is no id
+        ids = np.asarray(ids)
+        if ids.dtype.kind in 'iu':
+            return ids.tolist()
+        if ids.dtype.kind == 'f':
+            finite = np.isfinite(ids)
+            keys = ids.astype(np.int64, copy=False) if finite.all() else np.where(finite, ids, 0).astype(np.int64)
+            out = keys.tolist()
+            if not finite.all():
+                for i in np.flatnonzero(~finite).tolist():
+                    out[i] = DataSanitizer.normalize_id(ids[i])
+            return out
+        return [DataSanitizer.normalize_id(v) for v in ids.tolist()]
+
+    def is_duplicate(self, key, event_time=0) -> bool:
+        return self.id_filter.seen(key, event_time)
+
+    def snapshot(self, since=None): return self.id_filter.snapshot(since)
+    def restore(self, state): self.id_filter.restore(state)
 
     def check(self, event: MarketEvent) -> MarketEvent:
-        payload = event.data
-        
-        if 'id' in payload:
-            raw_id = payload['id']
-            if raw_id is not None:
-                try: 
-                    str_id = str(int(float(raw_id)))
-                except: 
-                    str_id = str(raw_id).strip()
-
-                if str_id.lower() != 'nan':
-                    if str_id in self.seen_ids:
-                        event.sanitization = "QUARANTINE"
-                        event.reject_reason = "DUPLICATE"
-                        return event
-                    
-                    self.seen_ids.add(str_id)
-                    self.recent_ids.append(str_id)
-                    if len(self.seen_ids) > 5000000: 
-                        removed = self.recent_ids.popleft()
-                        self.seen_ids.discard(removed)
-
-        diff_us = abs(event.event_time - event.local_time)
-        diff_ms = diff_us / 1000.0
+        key = event.key
+        if key is not None and self.is_duplicate(key, event.event_time):
+            event.sanitization = "QUARANTINE"
+            event.reject_reason = "DUPLICATE"
+            return event
+
+        diff_ms = abs(event.event_time - event.local_time) / self.config.TIME_UNITS_PER_MS
         
-        if diff_ms > Config.TIMESTAMP_TOLERANCE_MS:
+        if diff_ms > self.config.TIMESTAMP_TOLERANCE_MS:
             event.sanitization = "QUARANTINE"
             event.reject_reason = "TIMESTAMP_ERROR"
             return event
         
-        if 'price' in payload:
-            try:
-                price = float(payload['price'])
-                if price <= Config.FAT_FINGER_PRICE:
-                    event.sanitization = "QUARANTINE"
-                    event.reject_reason = "FAT_FINGER"
-                    return event
-            except: pass
+        if event.price <= self.config.FAT_FINGER_PRICE:
+            event.sanitization = "QUARANTINE"
+            event.reject_reason = "FAT_FINGER"
+            return event
         
         event.sanitization = "ACCEPT"
         return event
 
 class TimeManager:
-    def __init__(self):
+    def __init__(self, config=Config):
+        self.config = config
         self.last_ticker = 0
+        self.last_event = 0           # event_time of the last clean event: the engine's event clock
     def update(self, event_local_time):
         self.last_ticker = event_local_time
     def is_stale(self, current_sys_time) -> bool:
         if self.last_ticker == 0: return False
-        diff_us = current_sys_time - self.last_ticker
-        diff_ms = diff_us / 1000.0
-        return diff_ms > Config.STALE_TICKER_MS
+        diff = current_sys_time - self.last_ticker
+        diff_ms = diff / self.config.TIME_UNITS_PER_MS
+        return diff_ms > self.config.STALE_TICKER_MS
+    def stale_at(self):
+        # First instant (engine time units) at which is_stale holds, None before the first ticker
+        if self.last_ticker == 0: return None
+        return self.last_ticker + self.config.STALE_TICKER_MS * self.config.TIME_UNITS_PER_MS + 1
+    def snapshot(self): return {"last_ticker": self.last_ticker, "last_event": self.last_event}
+    def restore(self, state): self.last_ticker, self.last_event = state["last_ticker"], state.get("last_event", 0)
+
+class RollingStats:
+    # Mean/std (population, as np.std) of the last maxlen values with O(1) push/evict.
+    # Welford-style updates; an exact recompute every few windows keeps rounding drift bounded, and so does one
+    # whenever m2 fell CANCEL_RATIO-fold from its peak (the error it carries is relative to the peak).
+    RESYNC_WINDOWS = 64
+    CANCEL_RATIO = 1e3
+
+    def __init__(self, maxlen):
+        self.values = deque(maxlen=maxlen)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.peak = 0.0
+        self.updates = 0
+
+    def append(self, x):
+        values = self.values
+        if len(values) == values.maxlen:
+            old = values[0]
+            values.append(x)
+            prev_mean = self.mean
+            self.mean += (x - old) / len(values)
+            self.m2 += (x - old) * (x - self.mean + old - prev_mean)
+        else:
+            values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(values)
+            self.m2 += delta * (x - self.mean)
+        self.updates += 1
+        if self.m2 > self.peak: self.peak = self.m2
+        if self.updates >= self.RESYNC_WINDOWS * values.maxlen: self.resync()
+        elif self.m2 * self.CANCEL_RATIO < self.peak: self.recompute()
+
+    def resync(self):
+        self.updates = 0
+        self.recompute()
+
+    def recompute(self):
+        n = len(self.values)
+        self.mean = math.fsum(self.values) / n if n else 0.0
+        self.m2 = self.peak = math.fsum((v - self.mean) ** 2 for v in self.values)
+
+    def std(self) -> float:
+        n = len(self.values)
+        return math.sqrt(max(self.m2, 0.0) / n) if n else 0.0
+
+    def clear(self):
+        self.values.clear()
+        self.mean = self.m2 = self.peak = 0.0
+        self.updates = 0
+
+    def scale(self, k):
+        values = [v * k for v in self.values]
+        self.values.clear()
+        self.values.extend(values)
+        self.mean *= k
+        self.m2 *= k * k
+        self.peak *= k * k
+
+    def snapshot(self):
+        return {"values": np.array(self.values, np.float64), "mean": self.mean, "m2": self.m2, "peak": self.peak, "updates": self.updates}
+
+    def restore(self, state):
+        values = state["values"].tolist()
+        self.values.clear()
+        self.values.extend(values)
+        if len(values) == len(self.values):
+            self.mean, self.m2, self.updates = state["mean"], state["m2"], state["updates"]
+            self.peak = state.get("peak", self.m2)
+        else: self.resync()  # window size changed since the snapshot
+
+    def __len__(self): return len(self.values)
+    def __iter__(self): return iter(self.values)
 
 class AdaptiveRegimeModel:
-    def __init__(self):
+    def __init__(self, config=Config):
+        self.config = config
         self.prices = deque(maxlen=50) 
         self.current_vol = 0.0
         self.best_bid = 0.0
         self.best_ask = 0.0
         self.current_spread = 0.0
         self.initialized = False
-        self.dist_history = deque(maxlen=Config.WINDOW_SIZE)
-        self.mu = Config.MU
-        self.inv_cov = Config.INV_COV
+        # L2 book features (order_book.OrderBook), informational only: nothing in the decision path reads them and
+        # they are not part of the distance (research.py calibrates on vol/spread). Realtime only; historical rows
+        # are top-of-book quotes and never build a book
+        self.book_spread = 0.0
+        self.imbalance = 0.0
+        self.microprice = 0.0
+        self.dist_history = RollingStats(config.WINDOW_SIZE)
+        self.set_params(config.MU, config.INV_COV)
+
+    def set_params(self, mu, inv_cov):
+        self.mu = np.asarray(mu, dtype=np.float64)
+        self.inv_cov = np.asarray(inv_cov, dtype=np.float64)
+        # Scalar copies for the closed-form 2x2 Mahalanobis on the hot path
+        self._mu = tuple(self.mu.tolist())
+        self._inv_cov = tuple(self.inv_cov.ravel().tolist())
+
+    def reload(self, mu, inv_cov, rescale=False):
+        # New model parameters; the distance history is either dropped (re-gathers) or mapped onto the new metric
+        factor = self.rescale_factor(mu, inv_cov) if rescale else 0.0
+        self.set_params(mu, inv_cov)
+        if rescale: self.dist_history.scale(factor)
+        else: self.dist_history.clear()
+        return factor
+
+    def rescale_factor(self, mu, inv_cov):
+        # Moment match: for features ~ N(old mu, old cov), E[d_new^2] = tr(inv_cov @ cov) + delta' inv_cov delta vs E[d_old^2] = 2
+        inv_cov = np.asarray(inv_cov, dtype=np.float64)
+        delta = self.mu - np.asarray(mu, dtype=np.float64)
+        expected = np.trace(inv_cov @ np.linalg.inv(self.inv_cov)) + delta @ inv_cov @ delta
+        return math.sqrt(expected / len(delta))
+
+    def mahalanobis(self, vol, spread) -> float:
+        dx = math.log(vol) - self._mu[0]
+        dy = math.log(spread) - self._mu[1]
+        a, b, c, d = self._inv_cov
+        return math.sqrt(max(0.0, dx * (a * dx + c * dy) + dy * (b * dx + d * dy)))
 
     def update_market_data(self, price=None, bid=None, ask=None):
         if price and price > 0:
             self.prices.append(price)
             if len(self.prices) >= 2:
-                ret = np.log(price / self.prices[-2])
+                ret = math.log(price / self.prices[-2])
                 self.current_vol = self.current_vol * 0.9 + abs(ret) * 0.1 
                 self.initialized = True
         
@@ -128,57 +581,185 @@ class AdaptiveRegimeModel:
         if self.best_bid > 0 and self.best_ask > 0:
             self.current_spread = self.best_ask - self.best_bid
 
+    def update_book(self, book):
+        self.book_spread, self.imbalance, self.microprice = book.features()
+
+    def snapshot(self):
+        return {"prices": np.array(self.prices, np.float64), "current_vol": self.current_vol, "best_bid": self.best_bid, "best_ask": self.best_ask,
+                "current_spread": self.current_spread, "initialized": self.initialized, "dist_history": self.dist_history.snapshot()}
+
+    def restore(self, state):
+        self.prices.clear()
+        self.prices.extend(state["prices"].tolist())
+        self.current_vol, self.best_bid, self.best_ask = state["current_vol"], state["best_bid"], state["best_ask"]
+        self.current_spread, self.initialized = state["current_spread"], state["initialized"]
+        self.dist_history.restore(state["dist_history"])
+
+    def dist_stats(self) -> Tuple[float, float]:
+        return self.dist_history.mean, self.dist_history.std()
+
     def detect_shock(self) -> Tuple[float, bool, str]:
         if not self.initialized or self.current_spread <= 0 or self.current_vol <= 1e-9:
             return 0.0, False, ""
-        x = np.array([np.log(self.current_vol), np.log(self.current_spread)])
-        delta = x - self.mu
-        dist = np.sqrt(max(0, delta.T @ self.inv_cov @ delta))
+        dist = self.mahalanobis(self.current_vol, self.current_spread)
         self.dist_history.append(dist)
         
         if len(self.dist_history) < 20: return dist, False, "GATHERING_DATA"
-        mean_dist = np.mean(self.dist_history)
-        std_dist = np.std(self.dist_history)
-        dynamic_threshold = mean_dist + (Config.SIGMA_MULTIPLIER * std_dist)
+        mean_dist, std_dist = self.dist_stats()
+        dynamic_threshold = mean_dist + (self.config.SIGMA_MULTIPLIER * std_dist)
         return dist, dist > dynamic_threshold, f"Dist:{dist:.2f}"
 
 class DecisionEngine:
-    def __init__(self, config_path="/output/model_config.json"):
-        Config.load(config_path)
-        self.sanitizer = DataSanitizer()
-        self.time_manager = TimeManager()
-        self.model = AdaptiveRegimeModel()
+    def __init__(self, config_path="/output/model_config.json", config=Config):
+        # Pass config=Config.derive() to keep this engine's parameters apart from other engines in the process
+        config.load(config_path)
+        self.config = config
+        self.sanitizer = DataSanitizer(config=config)
+        self.time_manager = TimeManager(config)
+        self.model = AdaptiveRegimeModel(config)
+        self.book = OrderBook(config.BOOK_LEVELS)
         self.state = SystemState.BOOTSTRAP
         self.halt_start = 0
+        self.publisher = None         # decision_ring.DecisionPublisher, fed every process_event decision
 
     def process_event(self, event: MarketEvent) -> Dict:
         event = self.sanitizer.check(event)
+        stale = None
         
         if event.sanitization == "QUARANTINE":
             self.state = SystemState.HALTED
-            return self._format_decision(event, "HALT", f"QUARANTINE: {event.reject_reason}")
-
-        if event.type == "ORDERBOOK" and 'price' in event.data and 'side' in event.data:
-            try:
-                price = float(event.data['price'])
-                side = event.data['side']
-                if side == 'bid' and self.model.best_ask > 0 and price >= self.model.best_ask:
-                    return self._format_decision(event, "IGNORED", "CROSSED_MARKET")
-                if side == 'ask' and self.model.best_bid > 0 and price <= self.model.best_bid:
-                    return self._format_decision(event, "IGNORED", "CROSSED_MARKET")
-            except: pass
-
-        is_stale = self.time_manager.is_stale(event.local_time)
-        self.time_manager.update(event.local_time)
+            result = self._format_decision(event, "HALT", f"QUARANTINE: {event.reject_reason}")
+        else:
+            # A watchdog HALT that was due before this event (timer late or not running) comes back under '_watchdog';
+            # a quarantined event's clock isn't trusted to move it
+            stale = self._watchdog(event.local_time)
+            self.time_manager.last_event = event.event_time
+            if event.book is not None: self._apply_depth(event.book)
+            action, trigger = self._advance(event.etype, event.price, event.side, event.local_time, event.book is not None)
+            result = self._format_decision(event, action, trigger)
+        if stale is not None: result['_watchdog'] = stale
+        return result
+
+    def check_stale(self, now):
+        # Stale-feed watchdog on the caller's clock (local time, engine units): HALTED once the ticker is older than
+        # STALE_TICKER_MS at `now`, without waiting for the next event. Returns that HALT decision, None if nothing changed.
+        # Decisions (ts, halt durations) run on event time, which stands still while the feed is silent, so the HALT is
+        # stamped with the last event time seen: no later decision precedes it or gets a negative duration.
+        if self.state == SystemState.HALTED or not self.time_manager.is_stale(now): return None
+        ts = self.time_manager.last_event
+        self.state = SystemState.HALTED
+        if self.halt_start == 0: self.halt_start = ts
+        result = {"ts": ts, "action": "HALT", "reason": "DATA_STALE (watchdog)", "duration_ms": ts - self.halt_start,
+                  "_internal_state": self.state, "_trigger_detail": "DATA_STALE (watchdog)"}
+        if self.publisher is not None: self.publisher.publish(result)
+        return result
+
+    def stale_deadline(self):
+        # When check_stale will next fire (engine time units); None while HALTED, before the first ticker or with the watchdog off
+        if not self.config.STALE_WATCHDOG or self.state == SystemState.HALTED: return None
+        return self.time_manager.stale_at()
+
+    def _watchdog(self, now):
+        # The watchdog replayed on event time: a ticker that went stale before `now` is caught when it did
+        due = self.stale_deadline()
+        return self.check_stale(due) if due is not None and now >= due else None
+
+    def process_batch(self, columns: Dict, trace=False) -> Dict:
+        # columns: aligned arrays 'ts', 'local_ts', 'type' (TYPE_CODES) and optional 'price', 'side' (SIDE_CODES), 'id'.
+        # Returns the same decisions process_event would, one column per field with action/state as codes;
+        # trace=True adds the model's readings after each event ('dist', 'threshold', 'vol', 'spread').
+        ts = np.asarray(columns['ts'], dtype=np.int64)
+        n = len(ts)
+        local_ts = np.asarray(columns['local_ts'], dtype=np.int64) if columns.get('local_ts') is not None else ts
+        types = np.asarray(columns['type'], dtype=np.int8)
+        prices = np.asarray(columns['price'], dtype=np.float64) if columns.get('price') is not None else np.full(n, np.nan)
+        sides = np.asarray(columns['side'], dtype=np.int8) if columns.get('side') is not None else np.zeros(n, np.int8)
+        keys = self.sanitizer.normalize_ids(columns['id']) if columns.get('id') is not None else [None] * n
+
+        # Stateless sanitizer checks for the whole batch, in check() precedence (after DUPLICATE)
+        rejects = np.zeros(n, np.int8)
+        rejects[prices <= self.config.FAT_FINGER_PRICE] = 2
+        rejects[np.abs(ts - local_ts) / self.config.TIME_UNITS_PER_MS > self.config.TIMESTAMP_TOLERANCE_MS] = 1
+        reject_reasons = ("", "QUARANTINE: TIMESTAMP_ERROR", "QUARANTINE: FAT_FINGER")
+
+        actions = np.empty(n, np.int8)
+        states = np.empty(n, np.int8)
+        durations = np.zeros(n, np.int64)
+        reasons = [""] * n
+        is_duplicate, advance = self.sanitizer.is_duplicate, self._advance
+        halt_start = self.halt_start
+        # Watchdog on event time: watchdog_ts is the watchdog HALT's ts (check_stale) where the feed went stale before (clean) row i, else 0
+        watchdog_ts, tm = np.zeros(n, np.int64), self.time_manager
+        watchdog, stale_after = self.config.STALE_WATCHDOG, self.config.STALE_TICKER_MS * self.config.TIME_UNITS_PER_MS
+        if trace:
+            model, hist = self.model, self.model.dist_history
+            vols, spreads, appended, dist_stats = [0.0] * n, [0.0] * n, [], []
+            last_update = hist.updates
+        for i, (t, lt, ty, p, sd, rj, key) in enumerate(zip(ts.tolist(), local_ts.tolist(), types.tolist(), prices.tolist(), sides.tolist(), rejects.tolist(), keys)):
+            if key is not None and is_duplicate(key, t):
+                self.state = SystemState.HALTED
+                action, trigger = "HALT", "QUARANTINE: DUPLICATE"
+            elif rj:
+                self.state = SystemState.HALTED
+                action, trigger = "HALT", reject_reasons[rj]
+            else:
+                if watchdog and tm.last_ticker and lt - tm.last_ticker > stale_after and self.state != SystemState.HALTED:
+                    self.halt_start = halt_start
+                    watchdog_ts[i] = self.check_stale(tm.stale_at())['ts']
+                    halt_start = self.halt_start
+                tm.last_event = t
+                action, trigger = advance(ty, p, sd, lt)
+
+            if action == "HALT":
+                if halt_start == 0: halt_start = t
+                durations[i] = t - halt_start
+            else: halt_start = 0
+            actions[i] = ACTION_CODES[action]
+            states[i] = STATE_CODES[self.state]
+            reasons[i] = trigger
+            if trace:
+                vols[i], spreads[i] = model.current_vol, model.current_spread
+                # detect_shock appended a distance iff the history's update counter moved
+                if hist.updates != last_update:
+                    last_update = hist.updates
+                    appended.append(i); dist_stats.append((hist.values[-1], hist.mean, hist.m2, len(hist.values)))
+        self.halt_start = halt_start
+
+        batch = {"ts": ts, "action": actions, "reason": reasons, "duration_ms": durations, "state": states, "watchdog_ts": watchdog_ts}
+        if trace: batch.update(self._trace_columns(n, vols, spreads, appended, dist_stats))
+        return batch
+
+    def _trace_columns(self, n, vols, spreads, appended, dist_stats):
+        # dist/threshold are NaN where detect_shock appended nothing, threshold also while the history is gathering.
+        # The threshold repeats detect_shock's arithmetic (mean + SIGMA * std) on the stats right after the append.
+        dist, threshold = np.full(n, np.nan), np.full(n, np.nan)
+        if appended:
+            values, means, m2s, counts = np.array(dist_stats).T
+            dist[appended] = values
+            thr = means + self.config.SIGMA_MULTIPLIER * np.sqrt(np.maximum(m2s, 0.0) / counts)
+            threshold[appended] = np.where(counts >= 20, thr, np.nan)
+        return {"dist": dist, "threshold": threshold, "vol": np.array(vols), "spread": np.array(spreads)}
+
+    def _is_crossed(self, etype, price, side) -> bool:
+        if etype != ORDERBOOK: return False
+        model = self.model
+        if side == BID: return model.best_ask > 0 and price >= model.best_ask
+        if side == ASK: return model.best_bid > 0 and price <= model.best_bid
+        return False
+
+    def _advance(self, etype, price, side, local_time, depth=False) -> Tuple[str, str]:
+        model = self.model
+        if self._is_crossed(etype, price, side): return "IGNORED", "CROSSED_MARKET"
+
+        is_stale = self.time_manager.is_stale(local_time)
+        self.time_manager.update(local_time)
         trigger = ""
 
-        if event.type == "TRADE":
-            self.model.update_market_data(price=float(event.data.get('price', 0)))
-        elif event.type == "ORDERBOOK":
-            side = event.data.get('side')
-            price = float(event.data.get('price', 0))
-            if side == 'bid': self.model.update_market_data(bid=price)
-            elif side == 'ask': self.model.update_market_data(ask=price)
+        if etype == TRADE:
+            model.update_market_data(price=price)
+        elif etype == ORDERBOOK:
+            if side == BID: model.update_market_data(bid=price)
+            elif side == ASK: model.update_market_data(ask=price)
 
         if is_stale:
             self.state = SystemState.HALTED
@@ -188,25 +769,33 @@ class DecisionEngine:
                 self.state = SystemState.NORMAL
                 trigger = "RECOVERED"
             
-            dist, is_shock, info = self.model.detect_shock()
-            if is_shock:
-                self.state = SystemState.UNSTABLE
-                trigger = f"ADAPTIVE_SHOCK ({info})"
-            elif self.state == SystemState.UNSTABLE:
-                mean_dist = np.mean(self.model.dist_history)
-                std_dist = np.std(self.model.dist_history)
-                if dist < (mean_dist + 1.0 * std_dist): 
-                    self.state = SystemState.NORMAL
-
-        if self.state == SystemState.BOOTSTRAP and len(self.model.dist_history) > 20:
+            # A depth update moves no model input: it adds no distance to dist_history and leaves UNSTABLE as it is
+            if not depth:
+                dist, is_shock, info = model.detect_shock()
+                if is_shock:
+                    self.state = SystemState.UNSTABLE
+                    trigger = f"ADAPTIVE_SHOCK ({info})"
+                elif self.state == SystemState.UNSTABLE:
+                    mean_dist, std_dist = model.dist_stats()
+                    if dist < (mean_dist + 1.0 * std_dist): 
+                        self.state = SystemState.NORMAL
+
+        if self.state == SystemState.BOOTSTRAP and len(model.dist_history) > 20:
             self.state = SystemState.NORMAL
 
         action = "ALLOWED"
         if self.state == SystemState.HALTED: action = "HALT"
         elif self.state == SystemState.UNSTABLE: action = "RESTRICTED"
         elif self.state == SystemState.BOOTSTRAP: action = "HALT"
+        return action, trigger
 
-        return self._format_decision(event, action, trigger)
+    def _apply_depth(self, update):
+        # Realtime depth message (MarketEvent.book): partial-depth snapshot or sequenced diff into the L2 book
+        snapshot, bids, asks, first_id, final_id, prev_final_id = update
+        book = self.book
+        if snapshot: applied = book.apply_snapshot(bids, asks, final_id, partial=True)
+        else: applied = book.apply_diff(bids, asks, first_id, final_id, prev_final_id)
+        if applied: self.model.update_book(book)
 
     def _format_decision(self, event, action, trigger=""):
         duration = 0
@@ -215,7 +804,7 @@ class DecisionEngine:
             duration = event.event_time - self.halt_start
         else: self.halt_start = 0
             
-        return {
+        result = {
             "ts": event.event_time,
             "action": action,      
             "reason": trigger if trigger else event.reject_reason, 
@@ -223,13 +812,26 @@ class DecisionEngine:
             "_internal_state": self.state,
             "_trigger_detail": trigger
         }
+        if self.publisher is not None: self.publisher.publish(result)
+        return result
 
     def get_state_info(self):
-        trust = "TRUSTED"; hypothesis = "VALID"
-        if self.state == SystemState.HALTED: 
-            trust = "UNTRUSTED"; hypothesis = "INVALID"
-        elif self.state == SystemState.UNSTABLE: 
-            trust = "DEGRADED"; hypothesis = "WEAKENING"
-        elif self.state == SystemState.BOOTSTRAP: 
-            trust = "DEGRADED"; hypothesis = "GATHERING"
-        return trust, hypothesis
+        return STATE_INFO[self.state]
+
+    def snapshot(self, ids_since=None) -> Dict:
+        # Everything process_event depends on; see snapshot.py for the on-disk format. ids_since: only the dedupe ids
+        # added after that earlier snapshot (its sanitizer "added"), see Checkpointer
+        return {"state": str(self.state), "halt_start": self.halt_start, "sanitizer": self.sanitizer.snapshot(ids_since),
+                "time_manager": self.time_manager.snapshot(), "model": self.model.snapshot()}
+
+    def restore(self, state: Dict):
+        self.state = STATES[STATE_CODES[state["state"]]]
+        self.halt_start = state["halt_start"]
+        self.sanitizer.restore(state["sanitizer"])
+        self.time_manager.restore(state["time_manager"])
+        self.model.restore(state["model"])
+
+def iter_decisions(batch: Dict):
+    # Row view of a process_batch result, in the process_event dict layout
+    for t, a, r, d, s in zip(batch['ts'].tolist(), batch['action'].tolist(), batch['reason'], batch['duration_ms'].tolist(), batch['state'].tolist()):
+        yield {"ts": t, "action": ACTIONS[a], "reason": r, "duration_ms": d, "_internal_state": STATES[s], "_trigger_detail": r}
@@ -0,0 +1,125 @@
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config
+
+# File: MAGIC, then blocks of BLOCK_HEADER (compressed size, raw size, crc32 of the compressed bytes) + zlib payload.
+# A payload is a run of RECORD_HEADER (kind, receive time in ms, size) + record bytes.
+MAGIC = b"AEGFEED1"
+BLOCK_HEADER = struct.Struct("<III")
+RECORD_HEADER = struct.Struct("<BqI")
+FRAME, MODEL, SNAPSHOT, TICK, FLUSH = range(5)
+# FRAME: raw websocket frame (utf-8) as handed to the realtime handler
+# MODEL: model parameters (JSON) in force from this point: session start and every hot reload
+# SNAPSHOT: engine snapshot (.npz bytes, see snapshot.py) the session started from
+# TICK: the handler released held events on a timer, not on a frame (async pipeline)
+# FLUSH: shutdown, the handler decided everything still held
+
+def model_record(config, rescale=False):
+    # The engine's current model as a MODEL record payload
+    return json.dumps({"mu": config.MU.tolist(), "inv_cov": config.INV_COV.tolist(),
+                       "timestamp_tolerance_ms": config.TIMESTAMP_TOLERANCE_MS, "rescale": rescale}).encode()
+
+class FeedRecorder:
+    # Append-only recording of what the realtime handler consumed. Records are packed into a buffer on the
+    # caller's thread; full blocks (or blocks older than flush_ms) are deflated and appended by a writer
+    # thread, so a crash loses at most the unwritten tail and never leaves a block half-readable.
+    def __init__(self, path, block_bytes=256 << 10, flush_ms=1000, compress_level=1):
+        self.path = path
+        self.block_bytes = block_bytes
+        self.flush_ms = flush_ms
+        self.compress_level = compress_level
+        self.lock = threading.Lock()
+        self.buf = bytearray()
+        self.first_ms = 0
+        self.blocks = []
+        self.cond = threading.Condition()
+        self.stats = {"records": 0, "blocks": 0, "raw_bytes": 0, "bytes": 0}
+        self.f = open(path, 'ab')
+        if self.f.tell() == 0: self.f.write(MAGIC)
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+        if flush_ms: threading.Thread(target=self._timer_loop, daemon=True).start()
+
+    @classmethod
+    def from_config(cls, path, config=Config):
+        return cls(path, config.FEED_BLOCK_BYTES, config.FEED_FLUSH_MS, config.FEED_COMPRESS_LEVEL)
+
+    def write(self, kind, recv_ms, data):
+        if isinstance(data, str): data = data.encode()
+        with self.lock:
+            if not self.buf: self.first_ms = time.time() * 1000
+            self.buf += RECORD_HEADER.pack(kind, recv_ms, len(data))
+            self.buf += data
+            self.stats["records"] += 1
+            if len(self.buf) >= self.block_bytes: self._cut()
+
+    def frame(self, recv_ms, message):
+        self.write(FRAME, recv_ms, message)
+
+    def _cut(self):
+        # Caller holds self.lock
+        if not self.buf: return
+        block, self.buf = bytes(self.buf), bytearray()
+        with self.cond:
+            self.blocks.append(block)
+            self.cond.notify()
+
+    def _timer_loop(self):
+        while not self.closed.wait(self.flush_ms / 1000.0):
+            with self.lock:
+                if self.buf and time.time() * 1000 - self.first_ms >= self.flush_ms: self._cut()
+
+    def _write_loop(self):
+        while True:
+            with self.cond:
+                while not self.blocks and not self.closed.is_set(): self.cond.wait()
+                blocks, self.blocks = self.blocks, []
+            if not blocks and self.closed.is_set(): return
+            for raw in blocks:
+                data = zlib.compress(raw, self.compress_level)
+                self.f.write(BLOCK_HEADER.pack(len(data), len(raw), zlib.crc32(data)) + data)
+                self.stats["blocks"] += 1; self.stats["raw_bytes"] += len(raw); self.stats["bytes"] += len(data)
+            self.f.flush()
+
+    def close(self):
+        with self.lock: self._cut()
+        with self.cond:
+            self.closed.set()
+            self.cond.notify()
+        self.thread.join()
+        self.f.close()
+        return self.stats
+
+def read_feed(path, stats=None):
+    # (kind, recv_ms, bytes) records in file order. Reading stops quietly at a truncated or corrupt block
+    # (a recorder that died mid-write); stats, when given, receives block/record counts and whether that happened.
+    stats = stats if stats is not None else {}
+    stats.update({"blocks": 0, "records": 0, "truncated": False})
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC: raise ValueError(f"not a feed recording: {path}")
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if not header: return
+            if len(header) < BLOCK_HEADER.size: stats["truncated"] = True; return
+            size, raw_size, crc = BLOCK_HEADER.unpack(header)
+            data = f.read(size)
+            if len(data) < size or zlib.crc32(data) != crc: stats["truncated"] = True; return
+            raw = zlib.decompress(data)
+            stats["blocks"] += 1
+            pos, unpack, header_size = 0, RECORD_HEADER.unpack_from, RECORD_HEADER.size
+            while pos < raw_size:
+                kind, recv_ms, n = unpack(raw, pos)
+                pos += header_size
+                yield kind, recv_ms, raw[pos:pos + n]
+                pos += n
+                stats["records"] += 1
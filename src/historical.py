@@ -1,99 +1,413 @@
 import pandas as pd
+import numpy as np
 import os
-import heapq
+import itertools
 import json
+import multiprocessing as mp
+import shutil
 import sys
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(CURRENT_DIR)
 BASE_DIR = os.path.dirname(CURRENT_DIR)
 
-from engine import DecisionEngine, MarketEvent
+from engine import Config, DecisionEngine, DataSanitizer, MarketEvent, TYPE_CODES, SIDE_CODES, ACTIONS, STATES, STATE_INFO, ACTION_CODES, STATE_CODES, SystemState
+from log_sink import LogSink
+from profiling import StageProfiler
+from decision_trace import TraceWriter, TRACE_DIRNAME, merge_traces
+from replay_cache import chunk_columns, open_cache, decode, build_cache
 
 DATA_DIR = "/data" if os.path.exists("/data") else os.path.join(BASE_DIR, "validation")
 BASE_OUTPUT = "/output" if os.path.exists("/output") else os.path.join(BASE_DIR, "output")
 OUTPUT_DIR = os.path.join(BASE_OUTPUT, "historical")
+PROGRESS_EVERY = 50000          # events between progress lines
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+class CsvSource:
+    # Cursor over one CSV: keeps the not-yet-merged rows of at most a couple of chunks as column arrays.
+    # Rows outside [start, end) are dropped; sources are assumed time-sorted, so reading stops at end.
+    def __init__(self, name, path, chunksize, raw=False, start=None, end=None):
+        self.name = name
+        self.type = TYPE_CODES[name.upper()]
+        self.reader = pd.read_csv(path, chunksize=chunksize)
+        self.raw = raw
+        self.start, self.end = start, end
+        self.done = False
+        self.buf = None
+
+    def fill(self):
+        try: chunk = next(self.reader)
+        except StopIteration:
+            self.done = True; return
+        parsed = chunk_columns(chunk)
+        if parsed is None or (self.end is not None and len(parsed['ts']) and parsed['ts'][0] >= self.end):
+            self.done = True; return
+
+        n = len(chunk)
+        cols = {'ts': parsed['ts'], 'local_ts': parsed['local_ts'], 'type': np.full(n, self.type, np.int8)}
+        cols['price'] = parsed['price'] if parsed['price'] is not None else np.full(n, np.nan)
+        cols['side'] = parsed['side'].map(SIDE_CODES).fillna(0).to_numpy(np.int8) if parsed['side'] is not None else np.zeros(n, np.int8)
+        cols['id'] = parsed['id'].to_numpy() if parsed['id'] is not None else np.full(n, np.nan)
+        if self.raw:
+            cols['data'] = np.empty(n, object)
+            cols['data'][:] = [dict(zip(chunk.columns, row)) for row in chunk.itertuples(index=False, name=None)]
+        self._push(cols)
+
+    def _push(self, cols):
+        if self.start is not None or self.end is not None:
+            keep = np.ones(len(cols['ts']), bool)
+            if self.start is not None: keep &= cols['ts'] >= self.start
+            if self.end is not None: keep &= cols['ts'] < self.end
+            if not keep.all(): cols = {k: v[keep] for k, v in cols.items()}
+        ts = cols['ts']
+        if len(ts) > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind='stable')
+            cols = {k: v[order] for k, v in cols.items()}
+        if self.buf is not None and len(self.buf['ts']):
+            cols = {k: np.concatenate((self.buf[k], v)) for k, v in cols.items()}
+        self.buf = cols
+
+    def take(self, k):
+        head = {c: v[:k] for c, v in self.buf.items()}
+        self.buf = {c: v[k:] for c, v in self.buf.items()}
+        return head
+
+class CacheSource(CsvSource):
+    # Same cursor over a replay cache: chunks are slices of the memory-mapped columns
+    def __init__(self, name, cache, chunksize, raw=False, start=None, end=None):
+        self.name = name
+        self.type = TYPE_CODES[name.upper()]
+        self.manifest, self.cols = cache
+        self.chunksize = chunksize
+        self.pos, self.stop = 0, self.manifest["rows"]
+        self.start, self.end = start, end
+        ts = self.cols['ts']
+        if (start is not None or end is not None) and (len(ts) < 2 or (np.diff(ts) >= 0).all()):
+            # Sorted column: jump straight to the window instead of filtering every chunk
+            if start is not None: self.pos = int(np.searchsorted(ts, start, 'left'))
+            if end is not None: self.stop = int(np.searchsorted(ts, end, 'left'))
+        self.raw = raw
+        self.done = False
+        self.buf = None
+        side = self.manifest["columns"].get('side')
+        # Cache side dictionary -> engine side codes, last entry for missing (-1)
+        self.side_lut = np.array([SIDE_CODES.get(v, 0) for v in side["dictionary"]] + [0], np.int8) if side else None
+
+    def fill(self):
+        start, stop = self.pos, min(self.pos + self.chunksize, self.stop)
+        if start >= stop:
+            self.done = True; return
+        self.pos = stop
+        n = stop - start
+        src = self.cols
+        ts = src['ts'][start:stop]
+        cols = {'ts': ts, 'local_ts': src['local_ts'][start:stop] if 'local_ts' in src else ts, 'type': np.full(n, self.type, np.int8)}
+        cols['price'] = src['price'][start:stop] if 'price' in src else np.full(n, np.nan)
+        cols['side'] = self.side_lut[src['side'][start:stop]] if self.side_lut is not None else np.zeros(n, np.int8)
+        if 'id' not in src: cols['id'] = np.full(n, np.nan)
+        elif 'dictionary' in self.manifest["columns"]['id']: cols['id'] = decode(self.manifest, src, 'id', start, stop)
+        else: cols['id'] = src['id'][start:stop]
+        if self.raw:
+            data = {'timestamp': ts, 'local_timestamp': cols['local_ts']}
+            if 'price' in src: data['price'] = cols['price']
+            if 'side' in src: data['side'] = decode(self.manifest, src, 'side', start, stop)
+            if 'id' in src: data['id'] = cols['id']
+            keys = list(data)
+            cols['data'] = np.empty(n, object)
+            cols['data'][:] = [dict(zip(keys, row)) for row in zip(*(v.tolist() for v in data.values()))]
+        self._push(cols)
+
 class CsvStreamer:
-    def __init__(self, files):
-        self.readers = {}
-        self.queue = [] 
-        self.seq = 0        
-        for name, path in files.items():
-            if os.path.exists(path):
-                self.readers[name] = pd.read_csv(path, chunksize=50000)
-                self._load_next_chunk(name)
-
-    def _load_next_chunk(self, name):
-        try:
-            chunk = next(self.readers[name])
-            chunk.columns = [c.strip().lower() for c in chunk.columns]
-            ts_col = next((c for c in chunk.columns if 'time' in c or 'ts' in c), None)
-            if not ts_col: return
-            id_col = next((c for c in chunk.columns if c == 'id'), None)
-            for _, row in chunk.iterrows():
-                ts = int(row[ts_col])
-                data_dict = row.to_dict()
-                if id_col and pd.notnull(row[id_col]):
-                    data_dict['id'] = row[id_col]
-                heapq.heappush(self.queue, (ts, self.seq, name, data_dict))
-                self.seq += 1
-        except StopIteration: pass
+    def __init__(self, files, chunksize=50000, start=None, end=None):
+        self.files = {name: path for name, path in files.items() if os.path.exists(path)}
+        self.chunksize = chunksize
+        self.start, self.end = start, end
+        self.caches = {name: open_cache(path) for name, path in self.files.items()}
+        self.cached = [name for name, cache in self.caches.items() if cache is not None]
+
+    def _open(self, name, raw):
+        cache = self.caches[name]
+        if cache is not None: return CacheSource(name, cache, self.chunksize, raw, self.start, self.end)
+        return CsvSource(name, self.files[name], self.chunksize, raw, self.start, self.end)
+
+    def _merge(self, raw=False):
+        # k-way merge by block: rows strictly below the smallest buffered tail of the still-open
+        # sources can no longer be preceded by anything unread. Ties keep (ts, source order, row order).
+        sources = [self._open(name, raw) for name in self.files]
+        while True:
+            for src in sources:
+                while not src.done and (src.buf is None or not len(src.buf['ts'])): src.fill()
+            live = [src for src in sources if src.buf is not None and len(src.buf['ts'])]
+            if not live: return
+            tails = [src.buf['ts'][-1] for src in live if not src.done]
+            if tails:
+                limit = min(tails)
+                counts = [int(np.searchsorted(src.buf['ts'], limit, 'left')) for src in live]
+                if not any(counts):
+                    for src in live:
+                        if not src.done and src.buf['ts'][-1] == limit: src.fill()
+                    continue
+            else: counts = [len(src.buf['ts']) for src in live]
+
+            parts = [src.take(k) for src, k in zip(live, counts) if k]
+            block = {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+            order = np.argsort(block['ts'], kind='stable')
+            yield {c: v[order] for c, v in block.items()}
 
     def __iter__(self):
-        while self.queue:
-            ts, _, name, data = heapq.heappop(self.queue)
-            if len(self.queue) < 1000: 
-                for k in self.readers.keys():
-                    if sum(1 for item in self.queue if item[2] == k) < 100: self._load_next_chunk(k)
-            local_ts = data.get('local_timestamp', ts)
-            yield MarketEvent(event_time=ts, local_time=int(local_ts) if pd.notnull(local_ts) else ts, type=name.upper(), data=data)
-
-def run_historical():
+        return self.iter_events()
+
+    def iter_events(self, raw=False):
+        # Merged stream as MarketEvents built straight from the columns; raw=True also attaches each row as a dict
+        for block in self._merge(raw=raw):
+            keys = DataSanitizer.normalize_ids(block['id'])
+            data = block['data'] if raw else itertools.repeat(None)
+            for ts, local_ts, etype, price, side, key, row in zip(block['ts'].tolist(), block['local_ts'].tolist(), block['type'].tolist(),
+                                                                  block['price'].tolist(), block['side'].tolist(), keys, data):
+                yield MarketEvent(ts, local_ts, etype, price, side, key, data=row)
+
+    def iter_batches(self):
+        # Columnar view of the merged stream for DecisionEngine.process_batch
+        return self._merge()
+
+def source_files(data_dir):
+    return {
+        'trade': os.path.join(data_dir, 'trades.csv'), 
+        'orderbook': os.path.join(data_dir, 'orderbook.csv'), 
+        'ticker': os.path.join(data_dir, 'ticker.csv'),
+        'liquidation': os.path.join(data_dir, 'liquidations.csv') 
+    }
+
+def run_build_cache():
+    print(f">>> Building replay cache")
+    for name, path in source_files(DATA_DIR).items():
+        if not os.path.exists(path): continue
+        if open_cache(path) is not None:
+            print(f"    {name}: up to date"); continue
+        print(f"    {name}: {build_cache(path)}")
+
+def replay(engine, batches, f_dec, f_trans, last_state="BOOTSTRAP", start=None, progress=True, tracer=None, stats=None):
+    # Feeds merged batches through the engine and writes decisions/transitions (and the trace, with a tracer) for
+    # events at or after start; earlier events only warm the engine up. Returns the counters and the state at both ends of the window.
+    # A caller-owned stats dict is filled in place batch by batch, so an interrupted run still has the counts so far.
+    stats = {} if stats is None else stats
+    stats.update({"total_events": 0, "blocked_events": 0, "entry_state": last_state, "first_state": None, "first": None, "final_state": last_state})
+    allowed = ACTION_CODES["ALLOWED"]
+    for columns in batches:
+        batch = engine.process_batch(columns, tracer is not None)
+        actions, states = batch['action'], batch['state']
+        ts, reasons, durations = batch['ts'], batch['reason'], batch['duration_ms']
+        lo = int(np.searchsorted(ts, start, 'left')) if start is not None else 0
+        if lo == len(ts):
+            if len(states): last_state = stats["final_state"] = STATES[states[-1]]
+            continue
+        if lo: last_state = STATES[states[lo - 1]]
+        if stats["first"] is None:
+            stats["entry_state"], stats["first_state"] = last_state, STATES[states[lo]]
+            trust, hypo = STATE_INFO[stats["first_state"]]
+            stats["first"] = {"ts": int(ts[lo]), "data_trust": trust, "hypothesis": hypo, "decision": ACTIONS[actions[lo]], "trigger": reasons[lo]}
+        if tracer is not None: tracer.write(batch, lo)
+
+        blocked = lo + np.flatnonzero(actions[lo:] != allowed)
+        seen = stats["total_events"]
+        stats["total_events"] += len(ts) - lo
+        stats["blocked_events"] += len(blocked)
+        f_dec.write("".join(json.dumps({"ts": int(ts[i]), "action": ACTIONS[actions[i]], "reason": reasons[i], "duration_ms": int(durations[i])}) + "\n" for i in blocked.tolist()))
+
+        prev = np.concatenate(([STATES.index(last_state)], states[lo:-1]))
+        # A watchdog HALT before row i is its own transition, stamped (check_stale) with the last event time before the gap
+        stale = batch['watchdog_ts'][lo:]
+        fired = stale != 0
+        prev[fired] = STATE_CODES[SystemState.HALTED]
+        for i in (lo + np.flatnonzero((states[lo:] != prev) | fired)).tolist():
+            if stale[i - lo]:
+                trust, hypo = STATE_INFO[SystemState.HALTED]
+                f_trans.write(json.dumps({"ts": int(stale[i - lo]), "data_trust": trust, "hypothesis": hypo, "decision": "HALT", "trigger": "DATA_STALE (watchdog)"}) + "\n")
+                if states[i] == prev[i - lo]: continue
+            trust, hypo = STATE_INFO[STATES[states[i]]]
+            trans_log = {"ts": int(ts[i]), "data_trust": trust, "hypothesis": hypo, "decision": ACTIONS[actions[i]], "trigger": reasons[i]}
+            f_trans.write(json.dumps(trans_log) + "\n")
+        last_state = stats["final_state"] = STATES[states[-1]]
+
+        # Progress line every PROGRESS_EVERY events, as the row-at-a-time loop did
+        if progress and seen // PROGRESS_EVERY != stats["total_events"] // PROGRESS_EVERY:
+            sys.stdout.write(f"\rProcessed: {stats['total_events']} | Blocked: {stats['blocked_events']}")
+    return stats
+
+def default_config_path():
+    return "/output/model_config.json" if os.path.exists("/output/model_config.json") else os.path.join(BASE_DIR, "output", "model_config.json")
+
+def partition_bounds(files, n, sample_every=100):
+    # Start timestamps of n partitions holding roughly equal event counts, from a sample of every source's ts
+    samples = []
+    for path in files.values():
+        if not os.path.exists(path): continue
+        cache = open_cache(path)
+        if cache is not None:
+            samples.append(np.asarray(cache[1]['ts'][::sample_every]))
+            continue
+        for chunk in pd.read_csv(path, chunksize=500000):
+            cols = chunk_columns(chunk)
+            if cols is None: break
+            samples.append(cols['ts'][::sample_every])
+    if not samples: return []
+    ts = np.concatenate(samples)
+    if not len(ts): return []
+    return sorted(set(int(v) for v in np.quantile(ts, np.arange(1, n) / n, method='lower')))
+
+def replay_partition(task):
+    # Worker: warm up on [start - warmup, start), then replay [start, end) into the partition's own files
+    index, files, start, end, warmup_us, part_dir, config_path = task
+    os.makedirs(part_dir, exist_ok=True)
+    engine = DecisionEngine(config_path=config_path)
+    profiler = StageProfiler.attach(engine)
+    tracer = TraceWriter.attach(part_dir, engine.config)
+    streamer = CsvStreamer(files, start=None if start is None else start - warmup_us, end=end)
+    with LogSink.from_config(os.path.join(part_dir, 'decisions.jsonl'), engine.config, realtime=False, rotate=False) as f_dec, \
+         LogSink.from_config(os.path.join(part_dir, 'state_transitions.jsonl'), engine.config, realtime=False, rotate=False) as f_trans:
+        stats = replay(engine, streamer.iter_batches(), f_dec, f_trans, start=start, progress=False, tracer=tracer)
+    if tracer is not None: tracer.close()
+    stats.update({"partition": index, "start": start, "end": end})
+    if profiler is not None: stats["profile"] = profiler.hists
+    return stats
+
+def _replay_serial(files, output_dir, config_path):
+    os.makedirs(output_dir, exist_ok=True)
+    engine = DecisionEngine(config_path=config_path)
+    with LogSink.from_config(os.path.join(output_dir, 'decisions.jsonl'), engine.config, realtime=False, rotate=False) as f_dec, \
+         LogSink.from_config(os.path.join(output_dir, 'state_transitions.jsonl'), engine.config, realtime=False, rotate=False) as f_trans:
+        stats = replay(engine, CsvStreamer(files).iter_batches(), f_dec, f_trans, progress=False)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump({"total_events": stats["total_events"], "blocked_events": stats["blocked_events"], "final_state": stats["final_state"]}, f, indent=4)
+    return stats
+
+def _line_diff(lines, path):
+    # Lines present only in `lines` or only in the file (as multisets) and the ts of the first differing line
+    with open(path) as fb:
+        first = None
+        counts = {}
+        for a, b in itertools.zip_longest(lines, fb):
+            if a != b and first is None: first = json.loads(a or b)["ts"]
+            if a is not None: counts[a] = counts.get(a, 0) + 1
+            if b is not None: counts[b] = counts.get(b, 0) - 1
+    return {"only_parallel": sum(v for v in counts.values() if v > 0), "only_serial": -sum(v for v in counts.values() if v < 0), "first_divergence_ts": first}
+
+def _file_lines(paths):
+    for path in paths:
+        with open(path) as f: yield from f
+
+def _written(lines, sink, chunk=4096):
+    # Passes the lines through, writing them to the sink chunk lines at a time
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) == chunk:
+            sink.write("".join(buf)); buf = []
+        yield line
+    sink.write("".join(buf))
+
+def run_historical_parallel(workers, warmup_ms=60 * 1000, verify=False):
+    # Time-partitioned replay; ts are in microseconds like the rest of the historical path
+    print(f">>> Historical Validation Mode (parallel: {workers} workers, warm-up {warmup_ms} ms)")
+    print(f"    Data Dir: {DATA_DIR}")
+    print(f"    Output Dir: {OUTPUT_DIR}")
+    files = {name: path for name, path in source_files(DATA_DIR).items() if os.path.exists(path)}
+    config_path = default_config_path()
+    bounds = partition_bounds(files, workers)
+    edges = [None] + bounds + [None]
+    part_root = os.path.join(OUTPUT_DIR, "partitions")
+    tasks = [(i, files, edges[i], edges[i + 1], warmup_ms * 1000, os.path.join(part_root, f"part_{i}"), config_path) for i in range(len(edges) - 1)]
+
+    # fork keeps whatever the parent patched into the engine (main.py imports realtime)
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+    # The serial reference gets a process of its own so the partitions it checks are not queued behind it
+    with ctx.Pool(workers + 1 if verify else workers) as pool:
+        serial = pool.apply_async(_replay_serial, (files, os.path.join(part_root, "serial"), config_path)) if verify else None
+        parts = pool.map(replay_partition, tasks, chunksize=1)
+        serial_stats = serial.get() if verify else None
+
+    # Stitch: transitions are logged against the previous partition's real final state, not the warm-up's
+    report = {"workers": workers, "warmup_ms": warmup_ms, "partitions": [], "boundary_mismatches": 0}
+    last_state = "BOOTSTRAP"
+    transitions = []
+    for stats, task in zip(parts, tasks):
+        with open(os.path.join(task[5], 'state_transitions.jsonl')) as f: lines = f.readlines()
+        first = stats["first"]
+        if first is not None and stats["entry_state"] != last_state:
+            report["boundary_mismatches"] += 1
+            # The partition logged its first event iff it differed from the warm-up state
+            first_logged = stats["first_state"] != stats["entry_state"]
+            if first_logged and stats["first_state"] == last_state: lines = lines[1:]
+            elif not first_logged and stats["first_state"] != last_state: lines.insert(0, json.dumps(first) + "\n")
+        transitions.extend(lines)
+        report["partitions"].append({"start": stats["start"], "end": stats["end"], "events": stats["total_events"], "blocked": stats["blocked_events"], "entry_state": stats["entry_state"], "previous_final_state": last_state})
+        if first is not None: last_state = stats["final_state"]
+
+    # The stitched logs go out through LogSink like run_historical's; with verify they are compared with the serial run as they are written
+    serial_dir = os.path.join(part_root, "serial")
+    with LogSink.from_config(os.path.join(OUTPUT_DIR, 'decisions.jsonl'), Config, realtime=False) as f_dec, \
+         LogSink.from_config(os.path.join(OUTPUT_DIR, 'state_transitions.jsonl'), Config, realtime=False) as f_trans:
+        decisions = _written(_file_lines(os.path.join(task[5], 'decisions.jsonl') for task in tasks), f_dec)
+        transitions = _written(transitions, f_trans)
+        if verify:
+            diffs = {"decisions": _line_diff(decisions, os.path.join(serial_dir, 'decisions.jsonl')),
+                     "state_transitions": _line_diff(transitions, os.path.join(serial_dir, 'state_transitions.jsonl'))}
+        else:
+            for _ in itertools.chain(decisions, transitions): pass
+
+    total = sum(p["total_events"] for p in parts)
+    blocked = sum(p["blocked_events"] for p in parts)
+    summary = {"total_events": total, "blocked_events": blocked, "final_state": last_state}
+    if any("profile" in p for p in parts):
+        profiler = StageProfiler()
+        for p in parts:
+            if "profile" in p: profiler.merge(p["profile"])
+        summary["profile"] = profiler.report()
+    if Config.TRACE:
+        manifest = merge_traces([os.path.join(task[5], TRACE_DIRNAME) for task in tasks], os.path.join(OUTPUT_DIR, TRACE_DIRNAME), Config.TRACE_COMPRESS_LEVEL)
+        summary["trace"] = {"rows": manifest["rows"], "chunks": len(manifest["chunks"])}
+    with open(os.path.join(OUTPUT_DIR, 'summary.json'), 'w') as f: 
+        json.dump(summary, f, indent=4)
+
+    if verify:
+        report["serial"] = {
+            "total_events": serial_stats["total_events"], "blocked_events": serial_stats["blocked_events"], "final_state": serial_stats["final_state"],
+            "blocked_events_delta": blocked - serial_stats["blocked_events"], **diffs,
+        }
+    with open(os.path.join(OUTPUT_DIR, 'parallel_report.json'), 'w') as f: json.dump(report, f, indent=4)
+    shutil.rmtree(part_root, ignore_errors=True)
+    print(f"Processed: {total} | Blocked: {blocked} | Boundary mismatches: {report['boundary_mismatches']}")
+    if verify: print(f"vs serial: decisions {report['serial']['decisions']} | transitions {report['serial']['state_transitions']}")
+    print(f"Done. Saved to {OUTPUT_DIR}")
+
+def run_historical(workers=1, warmup_ms=60 * 1000, verify=False):
+    if workers > 1: return run_historical_parallel(workers, warmup_ms, verify)
     print(f">>> Historical Validation Mode")
     print(f"    Data Dir: {DATA_DIR}")
     print(f"    Output Dir: {OUTPUT_DIR}")
 
-    config_path = "/output/model_config.json" if os.path.exists("/output/model_config.json") else os.path.join(BASE_DIR, "output", "model_config.json")
-    
-    engine = DecisionEngine(config_path=config_path)
-    
-    files = {
-        'trade': os.path.join(DATA_DIR, 'trades.csv'), 
-        'orderbook': os.path.join(DATA_DIR, 'orderbook.csv'), 
-        'ticker': os.path.join(DATA_DIR, 'ticker.csv'),
-        'liquidation': os.path.join(DATA_DIR, 'liquidations.csv') 
-    }
+    engine = DecisionEngine(config_path=default_config_path())
+    profiler = StageProfiler.attach(engine)
+    tracer = TraceWriter.attach(OUTPUT_DIR, engine.config)
     
-    streamer = CsvStreamer(files)
+    streamer = CsvStreamer(source_files(DATA_DIR))
+    if streamer.cached: print(f"    Replay cache: {', '.join(streamer.cached)}")
     
-    f_dec = open(os.path.join(OUTPUT_DIR, 'decisions.jsonl'), 'w')
-    f_trans = open(os.path.join(OUTPUT_DIR, 'state_transitions.jsonl'), 'w')
+    f_dec = LogSink.from_config(os.path.join(OUTPUT_DIR, 'decisions.jsonl'), engine.config, realtime=False)
+    f_trans = LogSink.from_config(os.path.join(OUTPUT_DIR, 'state_transitions.jsonl'), engine.config, realtime=False)
     
-    cnt, blocked_cnt, last_state = 0, 0, "BOOTSTRAP"
+    stats = {"total_events": 0, "blocked_events": 0, "final_state": "BOOTSTRAP"}
     try:
-        for event in streamer:
-            result = engine.process_event(event)
-
-            if result['action'] != 'ALLOWED':
-                blocked_cnt += 1
-                f_dec.write(json.dumps({k: v for k, v in result.items() if not k.startswith('_')}) + "\n")
-
-            curr_state = result['_internal_state']
-            if curr_state != last_state:
-                trust, hypo = engine.get_state_info()
-                trans_log = {"ts": result['ts'], "data_trust": trust, "hypothesis": hypo, "decision": result['action'], "trigger": result['_trigger_detail']}
-                f_trans.write(json.dumps(trans_log) + "\n")
-                last_state = curr_state
-            
-            cnt += 1
-            if cnt % 50000 == 0: sys.stdout.write(f"\rProcessed: {cnt} | Blocked: {blocked_cnt}")
-            
+        replay(engine, streamer.iter_batches(), f_dec, f_trans, tracer=tracer, stats=stats)
     except KeyboardInterrupt: pass
     finally:
         f_dec.close(); f_trans.close()
+        summary = {"total_events": stats["total_events"], "blocked_events": stats["blocked_events"], "final_state": stats["final_state"]}
+        if profiler is not None: summary["profile"] = profiler.report()
+        if tracer is not None:
+            manifest = tracer.close()
+            summary["trace"] = {"rows": manifest["rows"], "chunks": len(manifest["chunks"])}
         with open(os.path.join(OUTPUT_DIR, 'summary.json'), 'w') as f: 
-            json.dump({"total_events": cnt, "blocked_events": blocked_cnt, "final_state": last_state}, f, indent=4)
+            json.dump(summary, f, indent=4)
     print(f"\nDone. Saved to {OUTPUT_DIR}")
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config
+
+def apply_model(engine, params, rescale=False):
+    # Swaps validated model parameters into a running engine; returns the distance history's rescale factor
+    for name, value in params.items(): setattr(engine.config, name, value)
+    return engine.model.reload(params["MU"], params["INV_COV"], rescale)
+
+class ModelWatcher:
+    # Watches model_config.json from a background thread. A changed file is read and validated there; the
+    # validated parameters wait in `pending` until apply() swaps them in on the engine's thread between events.
+    def __init__(self, engine, path, poll_ms=None, rescale=None):
+        self.engine = engine
+        self.path = path
+        self.poll_ms = engine.config.RELOAD_POLL_MS if poll_ms is None else poll_ms
+        self.rescale = engine.config.RELOAD_RESCALE if rescale is None else rescale
+        self.stamp = self._stamp()
+        self.pending = None
+        self.lock = threading.Lock()
+        self.stats = {"reloads": 0, "rejected": 0}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._watch_loop, daemon=True)
+        if self.poll_ms > 0: self.thread.start()
+
+    @classmethod
+    def attach(cls, engine, path):
+        # ModelWatcher when the engine's config has reloading on, else None
+        return cls(engine, path) if engine.config.RELOAD_POLL_MS > 0 else None
+
+    def _stamp(self):
+        try: st = os.stat(self.path)
+        except OSError: return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _watch_loop(self):
+        while not self.stopped.wait(self.poll_ms / 1000.0): self.check()
+
+    def check(self):
+        # One poll (watch thread): True when a new validated model is waiting for apply()
+        stamp = self._stamp()
+        if stamp is None or stamp == self.stamp: return False
+        self.stamp = stamp
+        t0 = time.perf_counter()
+        try: params = Config.read_model(self.path)
+        except (OSError, ValueError) as e:
+            self.stats["rejected"] += 1
+            print(f"\n[Model Reload Rejected] {self.path}: {e}")
+            return False
+        with self.lock: self.pending = (params, (time.perf_counter() - t0) * 1000.0)
+        return True
+
+    def apply(self, ts):
+        # Engine thread, between events: swap in the pending model. Returns its transition log entry, or None
+        if self.pending is None: return None
+        with self.lock: params, load_ms = self.pending; self.pending = None
+        t0 = time.perf_counter()
+        engine = self.engine
+        factor = apply_model(engine, params, self.rescale)
+        swap_us = (time.perf_counter() - t0) * 1e6
+        self.stats["reloads"] += 1
+        trust, hypo = engine.get_state_info()
+        history = f"rescaled x{factor:.4f}" if self.rescale else "reset"
+        return {"ts": ts, "data_trust": trust, "hypothesis": hypo, "decision": "RELOAD",
+                "trigger": f"MODEL_RELOAD (load {load_ms:.2f}ms, swap {swap_us:.0f}us, history {history})", "load_ms": round(load_ms, 3)}
+
+    def close(self):
+        self.stopped.set()
+        if self.thread.is_alive(): self.thread.join()
@@ -0,0 +1,111 @@
+import gzip
+import os
+import shutil
+import sys
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config
+
+class LogSink:
+    # Buffered JSONL file: lines are collected in memory and written with one write() per flush.
+    # A flush happens when flush_bytes are buffered, when the oldest buffered line is flush_ms old
+    # (a timer thread covers idle periods), or on close(). Files rotate by size and/or on the hour;
+    # rotated segments are optionally gzipped in the background.
+    def __init__(self, path, flush_bytes=1 << 20, flush_ms=200, rotate_bytes=0, rotate_hourly=False, compress=False, append=True):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_ms = flush_ms
+        self.rotate_bytes = rotate_bytes
+        self.rotate_hourly = rotate_hourly
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.buf = []
+        self.buffered = 0
+        self.first_ms = 0
+        self.stats = {"lines": 0, "flushes": 0, "rotations": 0}
+        self.compressors = []
+        self._open(append)
+        self.closed = threading.Event()
+        self.timer = None
+        if flush_ms:
+            self.timer = threading.Thread(target=self._timer_loop, daemon=True)
+            self.timer.start()
+
+    @classmethod
+    def from_config(cls, path, config=Config, realtime=True, rotate=True):
+        # Historical replays start a fresh file and only flush by size; realtime appends and also
+        # bounds how long a line can sit in memory. rotate=False for files that are read back whole (parallel partitions)
+        return cls(path, config.LOG_FLUSH_BYTES, config.LOG_FLUSH_MS if realtime else 0, config.LOG_ROTATE_BYTES if rotate else 0,
+                   rotate and config.LOG_ROTATE_HOURLY, rotate and config.LOG_COMPRESS, append=realtime)
+
+    def _open(self, append=True):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC), 0o644)
+        self.size = os.fstat(self.fd).st_size
+        self.hour = time.strftime("%Y%m%d%H")
+
+    def write(self, text):
+        # text: one or more complete '\n'-terminated lines
+        if not text: return
+        with self.lock:
+            if not self.buf: self.first_ms = time.time() * 1000
+            self.buf.append(text)
+            self.buffered += len(text)
+            self.stats["lines"] += text.count("\n")
+            if self.buffered >= self.flush_bytes: self._flush()
+
+    def flush(self):
+        with self.lock: self._flush()
+
+    def _flush(self):
+        if not self.buf: return
+        data = "".join(self.buf).encode()
+        self.buf, self.buffered = [], 0
+        if self.size and ((self.rotate_bytes and self.size + len(data) > self.rotate_bytes) or (self.rotate_hourly and time.strftime("%Y%m%d%H") != self.hour)):
+            self._rotate()
+        view = memoryview(data)
+        while view: view = view[os.write(self.fd, view):]
+        self.size += len(data)
+        self.stats["flushes"] += 1
+
+    def _rotate(self):
+        os.close(self.fd)
+        base, ext = os.path.splitext(self.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        target, n = f"{base}.{stamp}{ext}", 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target, n = f"{base}.{stamp}-{n}{ext}", n + 1
+        os.replace(self.path, target)
+        if self.compress:
+            t = threading.Thread(target=self._gzip, args=(target,))
+            t.start()
+            self.compressors.append(t)
+        self.stats["rotations"] += 1
+        self._open()
+
+    @staticmethod
+    def _gzip(path):
+        with open(path, 'rb') as src, gzip.open(path + ".gz.tmp", 'wb') as dst: shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+
+    def _timer_loop(self):
+        interval = self.flush_ms / 2000.0
+        while not self.closed.wait(interval):
+            with self.lock:
+                if self.buf and time.time() * 1000 - self.first_ms >= self.flush_ms: self._flush()
+
+    def close(self):
+        if self.closed.is_set(): return
+        self.closed.set()
+        if self.timer is not None: self.timer.join()
+        with self.lock:
+            self._flush()
+            os.close(self.fd)
+        for t in self.compressors: t.join()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
@@ -1,14 +1,54 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from historical import run_historical
-from realtime import run_realtime
+from historical import run_historical, run_build_cache
+from realtime import run_realtime, replay_feed
+from realtime_async import run_realtime_async
+from multi_symbol import run_multi_symbol
+from sweep import run_sweep, parse_grid
+from engine import Config
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python src/main.py [historical|realtime]")
+    if len(sys.argv) < 2 or sys.argv[1:] == ["--profile"]:
+        print("Usage: python src/main.py [historical [--workers N] [--warmup-ms MS] [--verify] [--trace]|realtime [--async [url] [--ingest-policy block|drop_oldest|drop_newest]] [--record] [--ring [NAME]]|replay <feed> [--pace [SPEED]]|cache|multi <symbol> ...|sweep [PARAM=v1,v2 ...] [--verify K]] [--profile]")
         sys.exit(1)
+    if "--profile" in sys.argv:
+        Config.PROFILE = True
+        sys.argv.remove("--profile")
+    if "--record" in sys.argv:
+        Config.FEED_RECORD = True
+        sys.argv.remove("--record")
+    if "--ring" in sys.argv:
+        i = sys.argv.index("--ring")
+        named = i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-")
+        Config.DECISION_RING = sys.argv[i + 1] if named else "aegis_decisions"
+        del sys.argv[i:i + 1 + named]
     mode = sys.argv[1]
-    if mode == "historical": run_historical()
+    if mode == "historical":
+        args = sys.argv[2:]
+        Config.TRACE = Config.TRACE or "--trace" in args
+        opt = lambda name, default: int(args[args.index(name) + 1]) if name in args else default
+        run_historical(workers=opt("--workers", 1), warmup_ms=opt("--warmup-ms", 60 * 1000), verify="--verify" in args)
+    elif mode == "realtime" and "--async" in sys.argv:
+        args = [a for a in sys.argv[2:] if a != "--async"]
+        policy = "block"
+        if "--ingest-policy" in args:
+            i = args.index("--ingest-policy")
+            policy = args[i + 1]
+            del args[i:i + 2]
+        run_realtime_async(*args[:1], ingest_policy=policy)
     elif mode == "realtime": run_realtime()
+    elif mode == "replay" and len(sys.argv) > 2:
+        args = sys.argv[3:]
+        speed = 0.0
+        if "--pace" in args:
+            i = args.index("--pace")
+            speed = float(args[i + 1]) if i + 1 < len(args) else 1.0
+        replay_feed(sys.argv[2], speed=speed)
+    elif mode == "cache": run_build_cache()
+    elif mode == "sweep":
+        args = sys.argv[2:]
+        verify = int(args[args.index("--verify") + 1]) if "--verify" in args else 0
+        run_sweep(parse_grid([a for a in args if "=" in a]), verify)
+    elif mode == "multi": run_multi_symbol(sys.argv[2:] or os.environ.get("SYMBOLS", "btcusdt").split(","))
     else: sys.exit(1)
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import STATES
+
+# Feed lag histogram over whole ms: bucket 0 is <= 0 (clock skew), bucket k holds [2^(k-1), 2^k - 1], the last one everything above
+LAG_BUCKETS = 22
+LAG_BOUNDS = [0] + [(1 << k) - 1 for k in range(1, LAG_BUCKETS - 1)]
+
+def _lag_summary(hist, total, count):
+    # Percentiles as the upper bound of the bucket they fall in
+    out = {"count": count, "sum": total, "mean": round(total / count, 3) if count else None}
+    for name, q in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999)):
+        target, seen, bound = q * count, 0, None
+        for k, n in enumerate(hist):
+            seen += n
+            if count and seen >= target:
+                bound = LAG_BOUNDS[k] if k < len(LAG_BOUNDS) else None
+                break
+        out[name] = bound
+    return out
+
+class FeedMetrics:
+    # Live counters of a realtime session. Only the engine's thread updates them, with plain int increments on
+    # lists it owns (no locks); the HTTP thread copies them as they are, so a scrape may be a few events behind
+    # but never holds up the feed. Event rates come from a sampler thread that keeps the last rate_window_s
+    # seconds of per-stream totals.
+    def __init__(self, engine, rate_window_s=10):
+        self.engine = engine
+        self.streams = {}                 # stream -> ([frames, events, lag ms sum], lag histogram)
+        self.blocked = {}                 # reason (without its detail) -> blocked decisions
+        self.sources = {}                 # name -> callable giving a flat dict of numbers (queues, reorder buffer, totals)
+        self.samples = deque(maxlen=rate_window_s + 1)
+        self.start = time.time()
+        self.closed = threading.Event()
+        self.server = None
+
+    @classmethod
+    def attach(cls, engine):
+        # FeedMetrics served on Config.METRICS_HOST:METRICS_PORT, or None when the port is 0 or can't be bound
+        config = engine.config
+        if not config.METRICS_PORT: return None
+        metrics = cls(engine, config.METRICS_RATE_WINDOW_S)
+        try: metrics.serve(config.METRICS_HOST, config.METRICS_PORT)
+        except OSError as e:
+            print(f"[Metrics] not served on {config.METRICS_HOST}:{config.METRICS_PORT}: {e}")
+            return None
+        print(f"Metrics: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+        return metrics
+
+    def frame(self, stream, events, now_ms):
+        # One websocket frame and the events parsed from it, before any reordering
+        entry = self.streams.get(stream)
+        if entry is None: entry = self.streams[stream] = ([0, 0, 0], [0] * LAG_BUCKETS)
+        counts, hist = entry
+        counts[0] += 1
+        counts[1] += len(events)
+        top = LAG_BUCKETS - 1
+        for event in events:
+            lag = now_ms - event.event_time
+            if lag > 0:
+                counts[2] += lag
+                k = lag.bit_length()
+                hist[k if k < top else top] += 1
+            else: hist[0] += 1
+
+    def block(self, reason):
+        key = reason.split(" (", 1)[0] if reason else "GATHERING_DATA"
+        self.blocked[key] = self.blocked.get(key, 0) + 1
+
+    def add_source(self, name, fn):
+        self.sources[name] = fn
+
+    def sample(self):
+        self.samples.append((time.time(), {stream: entry[0][1] for stream, entry in self.streams.copy().items()}))
+
+    def rates(self):
+        # events/s per stream over the sampled window
+        if len(self.samples) < 2: return {}
+        (t0, first), (t1, last) = self.samples[0], self.samples[-1]
+        return {stream: round((n - first.get(stream, 0)) / (t1 - t0), 1) for stream, n in last.items()}
+
+    def report(self):
+        engine, now_ms = self.engine, int(time.time() * 1000)
+        rates, streams, lag = self.rates(), {}, [0] * LAG_BUCKETS
+        lag_sum = lag_count = 0
+        for stream, (counts, hist) in self.streams.copy().items():
+            counts, hist = list(counts), list(hist)
+            n = sum(hist)
+            streams[stream] = {"frames": counts[0], "events": counts[1], "events_per_sec": rates.get(stream, 0.0), "lag_ms": _lag_summary(hist, counts[2], n),
+                               "lag_hist": hist}
+            lag = [a + b for a, b in zip(lag, hist)]; lag_sum += counts[2]; lag_count += n
+        last_ticker = engine.time_manager.last_ticker
+        return {"uptime_sec": round(time.time() - self.start, 1), "state": str(engine.state),
+                "dedupe_ids": len(engine.sanitizer.id_filter), "since_last_ticker_ms": now_ms - last_ticker if last_ticker else None,
+                "events_per_sec": round(sum(rates.values()), 1), "lag_ms": _lag_summary(lag, lag_sum, lag_count), "lag_bounds_ms": LAG_BOUNDS,
+                "streams": streams, "blocked": self.blocked.copy(), **{name: fn() for name, fn in self.sources.items()}}
+
+    def prometheus(self):
+        # Prometheus text exposition of report()
+        r = self.report()
+        lines = [f"aegis_uptime_seconds {r['uptime_sec']}", f"aegis_dedupe_ids {r['dedupe_ids']}"]
+        lines += [f'aegis_state{{state="{s}"}} {int(s == r["state"])}' for s in STATES]
+        if r["since_last_ticker_ms"] is not None: lines.append(f"aegis_since_last_ticker_ms {r['since_last_ticker_ms']}")
+        lines += ["# TYPE aegis_stream_events_total counter"] + [f'aegis_stream_events_total{{stream="{s}"}} {v["events"]}' for s, v in r["streams"].items()]
+        lines += [f'aegis_stream_events_per_second{{stream="{s}"}} {v["events_per_sec"]}' for s, v in r["streams"].items()]
+        lines.append("# TYPE aegis_feed_lag_ms histogram")
+        for stream, v in r["streams"].items():
+            seen = 0
+            for bound, n in zip(LAG_BOUNDS, v["lag_hist"]):
+                seen += n
+                lines.append(f'aegis_feed_lag_ms_bucket{{stream="{stream}",le="{bound}"}} {seen}')
+            lines.append(f'aegis_feed_lag_ms_bucket{{stream="{stream}",le="+Inf"}} {v["lag_ms"]["count"]}')
+            lines.append(f'aegis_feed_lag_ms_sum{{stream="{stream}"}} {v["lag_ms"]["sum"]}')
+            lines.append(f'aegis_feed_lag_ms_count{{stream="{stream}"}} {v["lag_ms"]["count"]}')
+        lines += ["# TYPE aegis_blocked_total counter"] + [f'aegis_blocked_total{{reason="{k}"}} {n}' for k, n in r["blocked"].items()]
+        for name in self.sources:
+            lines += [f"aegis_{name}_{key} {value}" for key, value in r[name].items() if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host, port):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics": body, kind = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif path in ("/", "/metrics.json"): body, kind = json.dumps(metrics.report()), "application/json"
+                else: self.send_error(404); return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", kind); self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args): pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+
+    def _sample_loop(self):
+        self.sample()
+        while not self.closed.wait(1.0): self.sample()
+
+    def close(self):
+        self.closed.set()
+        if self.server is not None: self.server.shutdown(); self.server.server_close()
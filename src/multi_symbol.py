@@ -0,0 +1,203 @@
+import bisect
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import websocket
+from queue import Empty
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config, DecisionEngine, STATE_INFO
+from log_sink import LogSink
+from hot_reload import ModelWatcher
+from reorder import ReorderBuffer
+from realtime import message_events, book_order, realtime_config, stream_url, STREAMS, BASE_OUTPUT, CONFIG_PATH
+
+OUTPUT_DIR = os.path.join(BASE_OUTPUT, "multi")
+BATCH_SIZE = 256          # frames per queue put
+BATCH_DELAY_MS = 5        # max time a frame waits in the router
+MAX_STREAMS_PER_CONN = 200
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+class HashRing:
+    # Consistent hashing with virtual nodes: adding a shard only moves ~1/n of the symbols
+    def __init__(self, n_shards, vnodes=64):
+        points = sorted((_hash(f"shard-{shard}#{v}"), shard) for shard in range(n_shards) for v in range(vnodes))
+        self.points = [p for p, _ in points]
+        self.shards = [s for _, s in points]
+
+    def shard(self, symbol):
+        return self.shards[bisect.bisect(self.points, _hash(symbol)) % len(self.points)]
+
+def stream_symbol(message):
+    # '{"stream":"btcusdt@aggTrade",...' -> 'btcusdt' without parsing the whole frame
+    start = message.find('"stream"')
+    if start < 0: return None
+    start = message.find('"', start + 8) + 1
+    return message[start:message.find('@', start)]
+
+def symbol_config_path(symbol):
+    path = os.path.join(BASE_OUTPUT, f"model_config_{symbol}.json")
+    return path if os.path.exists(path) else CONFIG_PATH
+
+def shard_worker(shard_id, symbols, queue, output_dir):
+    # One DecisionEngine per symbol, each on its own Config copy with the per-symbol dedupe cap, and one pair of logs per shard
+    engines = {sym: DecisionEngine(config_path=symbol_config_path(sym), config=realtime_config(DEDUP_MAX_IDS=Config.SYMBOL_DEDUP_MAX_IDS)) for sym in symbols}
+    watchers = {sym: w for sym in symbols for w in [ModelWatcher.attach(engines[sym], symbol_config_path(sym))] if w is not None}
+    reorders = {sym: r for sym in symbols for r in [ReorderBuffer.attach(engines[sym])] if r is not None}
+    last_states = {sym: "BOOTSTRAP" for sym in symbols}
+    stats = {sym: {"processed": 0, "blocked": 0} for sym in symbols}
+
+    shard_dir = os.path.join(output_dir, f"shard_{shard_id}")
+    os.makedirs(shard_dir, exist_ok=True)
+    f_dec = LogSink.from_config(os.path.join(shard_dir, 'decisions.jsonl'))
+    f_trans = LogSink.from_config(os.path.join(shard_dir, 'state_transitions.jsonl'))
+    start_time = int(time.time())
+    def transition(symbol, result):
+        curr_state = result['_internal_state']
+        if curr_state != last_states[symbol]:
+            trust, hypo = STATE_INFO[curr_state]
+            trans_log = {"symbol": symbol, "ts": result['ts'], "data_trust": trust, "hypothesis": hypo, "decision": result['action'], "trigger": result['_trigger_detail']}
+            f_trans.write(json.dumps(trans_log) + "\n")
+            last_states[symbol] = curr_state
+
+    def decide(symbol, events):
+        engine = engines[symbol]
+        for event in book_order(events, engine.model):
+            result = engine.process_event(event)
+            stats[symbol]["processed"] += 1
+            if '_watchdog' in result: transition(symbol, result['_watchdog'])
+            if result['action'] != "ALLOWED":
+                stats[symbol]["blocked"] += 1
+                f_dec.write(json.dumps({"symbol": symbol, **{k: v for k, v in result.items() if not k.startswith('_')}}) + "\n")
+            transition(symbol, result)
+
+    try:
+        while True:
+            # While events are held for reordering or a feed may go stale, wait no longer than the earliest is due. A symbol
+            # with held events only counts their release: its watchdog waits for them
+            dues = [reorders[s].next_due() if s in reorders and reorders[s].heap else e.stale_deadline() for s, e in engines.items()]
+            due = min((d for d in dues if d is not None), default=None)
+            try: batch = queue.get() if due is None else queue.get(timeout=max(due - time.time() * 1000, 0) / 1000.0)
+            except Empty: batch = []
+            if batch is None: break
+            for now_ms, message in batch:
+                try:
+                    msg = json.loads(message)
+                    symbol = msg['stream'].split('@', 1)[0]
+                    engine = engines.get(symbol)
+                    if engine is None: continue
+                    watcher = watchers.get(symbol)
+                    reload_log = watcher.apply(now_ms) if watcher is not None else None
+                    if reload_log is not None: f_trans.write(json.dumps({"symbol": symbol, **reload_log}) + "\n")
+                    events = message_events(msg, engine, now_ms)
+                    reorder = reorders.get(symbol)
+                    decide(symbol, reorder.feed(events, now_ms) if reorder is not None else events)
+                except Exception:
+                    pass
+            # Symbols without frames in this batch still let their due events go, then get the stale-feed watchdog
+            now_ms = int(time.time() * 1000)
+            for symbol, reorder in reorders.items():
+                if reorder.heap: decide(symbol, reorder.release(now_ms))
+            for symbol, engine in engines.items():
+                if symbol in reorders and reorders[symbol].heap: continue
+                stale = engine.check_stale(now_ms)
+                if stale is not None: transition(symbol, stale)
+        for symbol, reorder in reorders.items(): decide(symbol, reorder.flush(int(time.time() * 1000)))
+    except KeyboardInterrupt: pass
+    finally:
+        for watcher in watchers.values(): watcher.close()
+        f_dec.close(); f_trans.close()
+        summary = {
+            "timestamp": int(time.time()),
+            "duration_sec": int(time.time()) - start_time,
+            "total_events": sum(s["processed"] for s in stats.values()),
+            "blocked_events": sum(s["blocked"] for s in stats.values()),
+            "symbols": {sym: {**stats[sym], "final_state": last_states[sym], **({"reorder": reorders[sym].report()} if sym in reorders else {})} for sym in symbols}
+        }
+        with open(os.path.join(shard_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=4)
+
+class ShardRouter:
+    # Routes raw frames to shard processes in small batches; a background thread bounds the batching delay
+    def __init__(self, symbols, n_shards=None, output_dir=OUTPUT_DIR):
+        n_shards = n_shards or os.cpu_count() or 1
+        ring = HashRing(n_shards)
+        self.assignment = {sym: ring.shard(sym) for sym in symbols}
+        members = {shard: [sym for sym, s in self.assignment.items() if s == shard] for shard in range(n_shards)}
+        self.queues = {shard: mp.Queue(maxsize=1024) for shard, syms in members.items() if syms}
+        self.workers = [mp.Process(target=shard_worker, args=(shard, members[shard], queue, output_dir), daemon=True) for shard, queue in self.queues.items()]
+        self.pending = {shard: [] for shard in self.queues}
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        for w in self.workers: w.start()
+        self.running = True
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        return self
+
+    def route(self, message, now_ms):
+        shard = self.assignment.get(stream_symbol(message))
+        if shard is None: return
+        with self.lock:
+            buf = self.pending[shard]
+            buf.append((now_ms, message))
+            if len(buf) >= BATCH_SIZE:
+                self.queues[shard].put(buf)
+                self.pending[shard] = []
+
+    def flush(self):
+        with self.lock:
+            for shard, buf in self.pending.items():
+                if buf:
+                    self.queues[shard].put(buf)
+                    self.pending[shard] = []
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(BATCH_DELAY_MS / 1000.0)
+            self.flush()
+
+    def close(self):
+        self.running = False
+        self.flush()
+        for queue in self.queues.values(): queue.put(None)
+        for w in self.workers: w.join()
+
+def run_multi_symbol(symbols, n_shards=None):
+    symbols = [s.lower() for s in symbols]
+    print(f"Multi-Symbol Realtime Mode Started")
+    print(f"Symbols: {len(symbols)} | Output Dir: {OUTPUT_DIR}")
+    router = ShardRouter(symbols, n_shards).start()
+    print(f"Shards: {len(router.workers)}")
+
+    def on_message(ws, message):
+        router.route(message, int(time.time() * 1000))
+
+    def connection(conn_symbols):
+        while True:
+            try:
+                ws = websocket.WebSocketApp(stream_url(conn_symbols), on_message=on_message,
+                                            on_error=lambda ws, e: print(f"\n[Connection Error] {e}"))
+                ws.run_forever(ping_interval=60, ping_timeout=10)
+            except Exception as e:
+                print(f"\n[Critical Error] {e}")
+            time.sleep(3)
+
+    per_conn = max(1, MAX_STREAMS_PER_CONN // len(STREAMS))
+    for i in range(0, len(symbols), per_conn):
+        threading.Thread(target=connection, args=(symbols[i:i + per_conn],), daemon=True).start()
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nManually stopped.")
+    finally:
+        router.close()
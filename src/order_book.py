@@ -0,0 +1,122 @@
+import numpy as np
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+class BookSide:
+    # Levels of one side in preallocated arrays sorted ascending by key with the best level last
+    # (bids keyed by price, asks by -price), so updates near the touch only shift a few slots
+    def __init__(self, sign, capacity=1024):
+        self.sign = sign
+        self.keys = np.empty(capacity)
+        self.sizes = np.empty(capacity)
+        self.n = 0
+
+    def set(self, price, size):
+        # size 0 removes the level
+        key = self.sign * price
+        keys, sizes, n = self.keys, self.sizes, self.n
+        i = int(keys[:n].searchsorted(key))
+        if i < n and keys[i] == key:
+            if size > 0: sizes[i] = size
+            else:
+                keys[i:n - 1] = keys[i + 1:n]; sizes[i:n - 1] = sizes[i + 1:n]
+                self.n = n - 1
+        elif size > 0:
+            if n == len(keys):
+                self._grow(2 * n)
+                keys, sizes = self.keys, self.sizes
+            keys[i + 1:n + 1] = keys[i:n]; sizes[i + 1:n + 1] = sizes[i:n]
+            keys[i] = key; sizes[i] = size
+            self.n = n + 1
+
+    def load(self, prices, sizes, top=False):
+        # Replace every level; a price listed twice keeps its last size. top=True replaces only the levels from the
+        # worst listed one to the touch and keeps the deeper ones
+        keep = sizes > 0
+        keys, first = np.unique((self.sign * prices[keep])[::-1], return_index=True)
+        if top and not len(keys): return
+        i = int(self.keys[:self.n].searchsorted(keys[0])) if top else 0
+        n = i + len(keys)
+        if n > len(self.keys): self._grow(2 * n)
+        self.keys[i:n] = keys
+        self.sizes[i:n] = sizes[keep][::-1][first]
+        self.n = n
+
+    def _grow(self, capacity):
+        keys, sizes = np.empty(capacity), np.empty(capacity)
+        keys[:self.n] = self.keys[:self.n]; sizes[:self.n] = self.sizes[:self.n]
+        self.keys, self.sizes = keys, sizes
+
+    def best(self):
+        n = self.n
+        return (self.sign * float(self.keys[n - 1]), float(self.sizes[n - 1])) if n else (0.0, 0.0)
+
+    def depth(self, levels):
+        return float(self.sizes[max(self.n - levels, 0):self.n].sum())
+
+    def levels(self):
+        # [(price, size)] best first
+        n = self.n
+        return list(zip((self.sign * self.keys[:n][::-1]).tolist(), self.sizes[:n][::-1].tolist()))
+
+class OrderBook:
+    # L2 book built from depth snapshots and update-id sequenced diffs (Binance U / u / pu).
+    # A diff that does not continue the sequence marks the book unsynced until the next snapshot.
+    def __init__(self, levels=5, capacity=1024):
+        self.bids = BookSide(1.0, capacity)
+        self.asks = BookSide(-1.0, capacity)
+        self.levels = levels
+        self.last_update_id = 0
+        self.synced = False
+        self.diff_fed = False     # diffs have been applied on top of the last snapshot
+        self.stats = {"snapshots": 0, "refreshes": 0, "diffs": 0, "stale": 0, "gaps": 0}
+
+    def apply_snapshot(self, bids, asks, last_update_id=0, partial=False):
+        # Replaces the book. A partial (top-N) snapshot never truncates a diff-fed book: it resyncs an unsynced one,
+        # and on a synced one it refreshes the top N levels when it is of the book's own update id (the levels a
+        # diff deleted from the top N are then replaced by the ones below them, which diffs may never have listed)
+        refresh = partial and self.synced and self.diff_fed
+        if refresh and last_update_id != self.last_update_id: return False
+        for side, levels in ((self.bids, bids), (self.asks, asks)):
+            levels = np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+            side.load(levels[:, 0], levels[:, 1], top=refresh)
+        if refresh:
+            self.stats["refreshes"] += 1
+            return True
+        self.last_update_id = last_update_id
+        self.synced, self.diff_fed = True, False
+        self.stats["snapshots"] += 1
+        return True
+
+    def apply_diff(self, bids, asks, first_id, final_id, prev_final_id=None):
+        # True when applied. The first diff after a snapshot must bridge it (U <= lastUpdateId + 1 <= u + 1); later
+        # ones must continue the previous one (pu == previous u on futures, U == previous u + 1 without pu)
+        if not self.synced: return False
+        if final_id <= self.last_update_id:
+            self.stats["stale"] += 1
+            return False
+        if not self.diff_fed: in_sequence = first_id <= self.last_update_id + 1
+        elif prev_final_id is not None: in_sequence = prev_final_id == self.last_update_id
+        else: in_sequence = first_id == self.last_update_id + 1
+        if not in_sequence:
+            self.synced = False
+            self.stats["gaps"] += 1
+            return False
+        set_bid, set_ask = self.bids.set, self.asks.set
+        for price, size in bids: set_bid(float(price), float(size))
+        for price, size in asks: set_ask(float(price), float(size))
+        self.last_update_id = final_id
+        self.diff_fed = True
+        self.stats["diffs"] += 1
+        return True
+
+    def features(self):
+        # (spread, depth imbalance over the top `levels` of each side, microprice); zeros until both sides have a level
+        bid, bid_qty = self.bids.best()
+        ask, ask_qty = self.asks.best()
+        if not (bid_qty and ask_qty): return 0.0, 0.0, 0.0
+        bid_depth, ask_depth = self.bids.depth(self.levels), self.asks.depth(self.levels)
+        return ask - bid, (bid_depth - ask_depth) / (bid_depth + ask_depth), (bid * ask_qty + ask * bid_qty) / (bid_qty + ask_qty)
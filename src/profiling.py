@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import Config, EVENT_TYPES
+
+# Log-linear histogram over nanoseconds: exact below 16ns, then 8 buckets per power of two (~6% wide)
+SUB_BUCKETS = 8
+N_BUCKETS = 16 + SUB_BUCKETS * 60
+
+def _bucket_mid_ns(i):
+    if i < 16: return float(i)
+    b, m = (i - 16) // SUB_BUCKETS + 5, (i - 16) % SUB_BUCKETS + 8
+    return ((m << (b - 4)) + ((m + 1) << (b - 4))) / 2.0
+
+class StageProfiler:
+    # Per-stage, per-event-type latency histograms for a DecisionEngine. Nothing is patched while idle:
+    # for a sampled event (or the leading 1/N slice of a batch) timed wrappers are set as instance
+    # attributes over the stage methods and removed again afterwards, so unsampled events run the
+    # plain engine code. Without an engine it only collects merged histograms.
+    def __init__(self, engine=None, sample_every=None):
+        self.engine = engine
+        self.sample_every = sample_every or (engine.config if engine is not None else Config).PROFILE_SAMPLE_EVERY
+        self.hists = {}
+        self.etype = "UNKNOWN"
+        self.countdown = 1
+        self.dup_types = iter(())
+        if engine is None: return
+        self.process_event = engine.process_event
+        self.process_batch = engine.process_batch
+        engine.process_event = self._process_event
+        engine.process_batch = self._process_batch
+        engine.profiler = self
+
+        # Wrappers are built once; arming is just setattr/delattr
+        e = engine
+        stages = [(e, '_is_crossed', "crossed_market"), (e.time_manager, 'is_stale', "time_manager"), (e.time_manager, 'update', "time_manager"),
+                  (e.model, 'update_market_data', "model_update"), (e.model, 'detect_shock', "detect_shock")]
+        common = [(obj, name, self._timed(stage, getattr(obj, name))) for obj, name, stage in stages] + [(e, '_advance', self._set_type(e._advance))]
+        self.event_wrappers = common + [(e.sanitizer, 'check', self._timed("sanitizer", e.sanitizer.check)),
+                                        (e, '_format_decision', self._timed("format_decision", e._format_decision))]
+        self.batch_wrappers = common + [(e.sanitizer, 'is_duplicate', self._dedupe(e.sanitizer.is_duplicate))]
+
+    @classmethod
+    def attach(cls, engine):
+        # StageProfiler when the engine's config asks for one, else None
+        return cls(engine) if engine.config.PROFILE else None
+
+    def record(self, stage, ns):
+        # Histogram per (type, stage); the running sum of ns lives in the extra last slot
+        key = (self.etype, stage)
+        hist = self.hists.get(key)
+        if hist is None: hist = self.hists[key] = [0] * (N_BUCKETS + 1)
+        if ns < 16: hist[ns if ns > 0 else 0] += 1
+        else:
+            b = ns.bit_length()
+            hist[min(16 + (b - 5) * SUB_BUCKETS + (ns >> (b - 4)) - 8, N_BUCKETS - 1)] += 1
+        hist[N_BUCKETS] += ns
+
+    def _timed(self, stage, func):
+        clock, record = time.perf_counter_ns, self.record
+        def timed(*args, **kwargs):
+            t0 = clock()
+            out = func(*args, **kwargs)
+            record(stage, clock() - t0)
+            return out
+        return timed
+
+    def _set_type(self, func):
+        # _advance gets the type code first; sets the label for every stage nested inside it
+        clock, record = time.perf_counter_ns, self.record
+        def timed(etype, *args):
+            self.etype = EVENT_TYPES[etype] if 0 <= etype < len(EVENT_TYPES) else "UNKNOWN"
+            t0 = clock()
+            out = func(etype, *args)
+            record("advance", clock() - t0)
+            return out
+        return timed
+
+    def _dedupe(self, func):
+        # Batch path: is_duplicate runs once per row with an id, in row order, before _advance
+        clock, record = time.perf_counter_ns, self.record
+        def timed(key, event_time=0):
+            self.etype = next(self.dup_types, "UNKNOWN")
+            t0 = clock()
+            out = func(key, event_time)
+            record("sanitizer", clock() - t0)
+            return out
+        return timed
+
+    def _arm(self, batch=False):
+        self.armed = self.batch_wrappers if batch else self.event_wrappers
+        for obj, name, wrapper in self.armed: setattr(obj, name, wrapper)
+
+    def _disarm(self):
+        for obj, name, _ in self.armed: delattr(obj, name)
+
+    def _process_event(self, event):
+        self.countdown -= 1
+        if self.countdown: return self.process_event(event)
+        self.countdown = self.sample_every
+        self.etype = event.type
+        self._arm()
+        t0 = time.perf_counter_ns()
+        try: return self.process_event(event)
+        finally:
+            self.etype = event.type
+            self.record("total", time.perf_counter_ns() - t0)
+            self._disarm()
+
+    def _process_batch(self, columns, trace=False):
+        n = len(columns['ts'])
+        k = min(n, -(-n // self.sample_every))
+        if k == 0 or k == n: return self._profiled_batch(columns, trace) if k else self.process_batch(columns, trace)
+        head = {c: (v[:k] if v is not None else None) for c, v in columns.items()}
+        tail = {c: (v[k:] if v is not None else None) for c, v in columns.items()}
+        first, rest = self._profiled_batch(head, trace), self.process_batch(tail, trace)
+        return {c: first[c] + rest[c] if isinstance(first[c], list) else np.concatenate((first[c], rest[c])) for c in first}
+
+    def _profiled_batch(self, columns, trace=False):
+        types = np.asarray(columns['type'])
+        if columns.get('id') is not None:
+            ids = np.asarray(columns['id'])
+            if ids.dtype.kind in 'iu': has_id = np.ones(len(ids), bool)
+            elif ids.dtype.kind == 'f': has_id = ~np.isnan(ids)
+            else: has_id = np.array([v is not None for v in self.engine.sanitizer.normalize_ids(ids)], bool)
+            self.dup_types = iter([EVENT_TYPES[t] for t in types[has_id].tolist()])
+        self._arm(batch=True)
+        try: return self.process_batch(columns, trace)
+        finally:
+            self._disarm()
+            self.dup_types = iter(())
+
+    def merge(self, hists):
+        # Adds histograms recorded elsewhere (e.g. by partition workers)
+        for key, hist in hists.items():
+            mine = self.hists.setdefault(key, [0] * (N_BUCKETS + 1))
+            for i, c in enumerate(hist):
+                if c: mine[i] += c
+
+    def report(self):
+        # {event type: {stage: count/mean/p50/p90/p99 in microseconds}} over the sampled events
+        out = {}
+        for (etype, stage), hist in sorted(self.hists.items()):
+            count = sum(hist[:N_BUCKETS])
+            if not count: continue
+            cum, marks, stats = 0, [0.5, 0.9, 0.99], {"count": count, "mean_us": round(hist[N_BUCKETS] / count / 1000.0, 3)}
+            for i, c in enumerate(hist[:N_BUCKETS]):
+                cum += c
+                while marks and cum >= marks[0] * count:
+                    stats[f"p{int(round(marks[0] * 100))}_us"] = round(_bucket_mid_ns(i) / 1000.0, 3)
+                    marks.pop(0)
+                if not marks: break
+            out.setdefault(etype, {})[stage] = stats
+        return {"sample_every": self.sample_every, "stages": out}
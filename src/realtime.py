@@ -1,15 +1,24 @@
 import json
+import math
+import threading
 import time
 import websocket
 import os
 import sys
-import numpy as np
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(CURRENT_DIR)
 BASE_DIR = os.path.dirname(CURRENT_DIR)
 
-from engine import DecisionEngine, MarketEvent, AdaptiveRegimeModel, Config
+from engine import DecisionEngine, Config, DataSanitizer, MarketEvent, AdaptiveRegimeModel, STATE_INFO, TRADE, ORDERBOOK, LIQUIDATION, BID, ASK
+from log_sink import LogSink
+from profiling import StageProfiler
+from snapshot import Checkpointer, restore_engine, snapshot_bytes, snapshot_from_bytes
+from hot_reload import ModelWatcher, apply_model
+from reorder import ReorderBuffer
+from feed_log import FeedRecorder, read_feed, model_record, FRAME, MODEL, SNAPSHOT, TICK, FLUSH
+from metrics import FeedMetrics
+from decision_ring import DecisionPublisher
 
 def fixed_detect_shock(self):
     effective_vol = self.current_vol if self.current_vol > 1e-9 else 1e-9
@@ -18,9 +27,7 @@ def fixed_detect_shock(self):
     dist = 0.0
     if self.initialized:
         try:
-            x = np.array([np.log(effective_vol), np.log(effective_spread)])
-            delta = x - self.mu
-            dist = np.sqrt(max(0, delta.T @ self.inv_cov @ delta))
+            dist = self.mahalanobis(effective_vol, effective_spread)
         except:
             dist = 0.0
 
@@ -29,9 +36,8 @@ def fixed_detect_shock(self):
     if len(self.dist_history) < 20: 
         return dist, False, "GATHERING_DATA"
         
-    mean_dist = np.mean(self.dist_history)
-    std_dist = np.std(self.dist_history)
-    dynamic_threshold = mean_dist + (Config.SIGMA_MULTIPLIER * std_dist)
+    mean_dist, std_dist = self.dist_stats()
+    dynamic_threshold = mean_dist + (self.config.SIGMA_MULTIPLIER * std_dist)
     
     return dist, dist > dynamic_threshold, f"Dist:{dist:.2f}"
 
@@ -40,98 +46,241 @@ AdaptiveRegimeModel.detect_shock = fixed_detect_shock
 BASE_OUTPUT = "/output" if os.path.exists("/output") else os.path.join(BASE_DIR, "output")
 OUTPUT_DIR = os.path.join(BASE_OUTPUT, "realtime")
 CONFIG_PATH = os.path.join(BASE_OUTPUT, "model_config.json")
+SNAPSHOT_PATH = os.path.join(OUTPUT_DIR, "engine_snapshot.npz")
+FEED_DIR = os.path.join(OUTPUT_DIR, "feeds")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-WS_URL = "wss://fstream.binance.com/stream?streams=btcusdt@aggTrade/btcusdt@depth5@100ms/btcusdt@forceOrder/btcusdt@bookTicker"
+# depth@100ms: sequenced L2 diffs; depth5@100ms: partial snapshots that (re)sync the book
+STREAMS = ("aggTrade", "depth@100ms", "depth5@100ms", "forceOrder", "bookTicker")
+
+def stream_url(symbols):
+    return "wss://fstream.binance.com/stream?streams=" + "/".join(f"{sym}@{stream}" for sym in symbols for stream in STREAMS)
+
+WS_URL = stream_url(["btcusdt"])
+
+def _price(value):
+    try: return float(value)
+    except (TypeError, ValueError): return math.nan
+
+def realtime_config(**overrides):
+    # Config copy for a realtime engine, whose clock (event local_time, watchdog) is the receive time in ms
+    return Config.derive(TIME_UNITS_PER_MS=1, **overrides)
+
+def message_events(msg, engine, now_ms, keep_raw=False):
+    # Binance combined-stream message -> MarketEvents in the order the engine should see them.
+    # Fields are parsed here once; keep_raw also attaches the message payload to each event.
+    data = msg['data']
+    raw = data if keep_raw else None
+    if 'aggTrade' in msg['stream']: 
+        return [MarketEvent(data['T'], now_ms, TRADE, _price(data['p']), key=DataSanitizer.normalize_id(data['a']), data=raw)]
+    
+    elif 'depth' in msg['stream']: 
+        update = (msg['stream'].split('@')[1] != 'depth', data['b'], data['a'], data.get('U', 0), data.get('u', 0), data.get('pu'))
+        return [MarketEvent(data['E'], now_ms, ORDERBOOK, book=update, data=raw)]
+    
+    elif 'forceOrder' in msg['stream']: 
+        return [MarketEvent(data['E'], now_ms, LIQUIDATION, data=raw)]
+    
+    elif 'bookTicker' in msg['stream']:
+        new_bid = float(data['b'])
+        new_ask = float(data['a'])
+        
+        curr_bid = engine.model.best_bid
+        curr_ask = engine.model.best_ask
+        
+        ev_ask = MarketEvent(data['E'], now_ms, ORDERBOOK, new_ask, ASK, data=raw)
+        ev_bid = MarketEvent(data['E'], now_ms, ORDERBOOK, new_bid, BID, data=raw)
+        
+        if curr_ask > 0 and new_bid >= curr_ask:
+            return [ev_ask, ev_bid]
+        elif curr_bid > 0 and new_ask <= curr_bid:
+            return [ev_bid, ev_ask]
+        else:
+            return [ev_ask, ev_bid]
+    return []
+
+def _quote_pair(a, b):
+    # The two halves of one bookTicker message: quote events (no depth update) with the same times, one per side
+    return (a.etype == ORDERBOOK and b.etype == ORDERBOOK and a.book is None and b.book is None and {a.side, b.side} == {BID, ASK}
+            and a.event_time == b.event_time and a.local_time == b.local_time)
+
+def book_order(events, model):
+    # message_events orders a bookTicker pair against the book as it is when the frame is parsed. Behind the reorder
+    # buffer the held events in front of it change the book before the pair is decided, so the order is decided
+    # again here, lazily: each pair is compared against the book left by everything decided before it.
+    i, n = 0, len(events)
+    while i < n:
+        event = events[i]
+        if i + 1 < n and _quote_pair(event, events[i + 1]):
+            ask, bid = (event, events[i + 1]) if event.side == ASK else (events[i + 1], event)
+            if not (model.best_ask > 0 and bid.price >= model.best_ask) and model.best_bid > 0 and ask.price <= model.best_bid:
+                yield bid; yield ask
+            else:
+                yield ask; yield bid
+            i += 2
+        else:
+            yield event; i += 1
+
+class RealtimeHandler:
+    # The realtime on_message path: raw frame -> events (-> reorder buffer) -> engine -> decision/transition logs.
+    # now_ms comes from the caller, so replay_feed() runs a recording through exactly this code with the
+    # original receive times. With a recorder, everything that steers the decisions is recorded in order.
+    # Frames and timer ticks may come from different threads; the lock keeps them (and the recording) in one order.
+    def __init__(self, engine, f_dec, f_trans, watcher=None, reorder=None, checkpointer=None, recorder=None, metrics=None, verbose=True):
+        self.engine = engine
+        self.f_dec, self.f_trans = f_dec, f_trans
+        self.watcher = watcher
+        self.reorder = reorder
+        self.checkpointer = checkpointer
+        self.recorder = recorder
+        self.metrics = metrics
+        self.verbose = verbose
+        self.last_state = str(engine.state)
+        self.stats = {"processed": 0, "blocked": 0, "start_time": int(time.time())}
+        self.lock = threading.Lock()
+        if metrics is not None:
+            metrics.add_source("events", lambda: {"processed": self.stats["processed"], "blocked": self.stats["blocked"]})
+            if reorder is not None: metrics.add_source("reorder", lambda: {**reorder.stats, "held": len(reorder.heap)})
+
+    def on_message(self, message, now_ms):
+        with self.lock: self._on_message(message, now_ms)
+
+    def _on_message(self, message, now_ms):
+        try:
+            if self.watcher is not None:
+                reload_log = self.watcher.apply(now_ms)
+                if reload_log is not None:
+                    if self.verbose: print(f"\n{reload_log['trigger']}")
+                    self.f_trans.write(json.dumps(reload_log) + "\n")
+                    if self.recorder is not None: self.recorder.write(MODEL, now_ms, model_record(self.engine.config, self.watcher.rescale))
+            if self.recorder is not None: self.recorder.write(FRAME, now_ms, message)
+            msg = json.loads(message)
+            if 'stream' not in msg: return
+            events = message_events(msg, self.engine, now_ms)
+            if self.metrics is not None: self.metrics.frame(msg['stream'], events, now_ms)
+            if self.reorder is not None: events = self.reorder.feed(events, now_ms)
+            self.decide(events)
+            if self.checkpointer is not None: self.checkpointer.maybe(now_ms)
+        except Exception as e:
+            pass
+
+    def decide(self, events):
+        engine, stats, metrics = self.engine, self.stats, self.metrics
+        for event in book_order(events, engine.model):
+            result = engine.process_event(event)
+            stats["processed"] += 1
+            if '_watchdog' in result: self.transition(result['_watchdog'])
+            
+            if result['action'] != "ALLOWED":
+                stats["blocked"] += 1
+                if metrics is not None: metrics.block(result['reason'])
+                self.f_dec.write(json.dumps({k: v for k, v in result.items() if not k.startswith('_')}) + "\n")
+                
+                if self.verbose and stats["blocked"] % 50 == 0:
+                    reason_display = result['reason'] if result['reason'] else "GATHERING_DATA"
+                    print(f"\r[BLOCK] {reason_display} | State: {result['_internal_state']}", end="")
+            self.transition(result)
+
+    def transition(self, result):
+        curr_state = result['_internal_state']
+        if curr_state != self.last_state:
+            if self.verbose: print(f"\nState Transition: {self.last_state} -> {curr_state}")
+            trust, hypo = STATE_INFO[curr_state]
+            trans_log = {"ts": result['ts'], "data_trust": trust, "hypothesis": hypo, "decision": result['action'], "trigger": result['_trigger_detail']}
+            self.f_trans.write(json.dumps(trans_log) + "\n")
+            self.last_state = curr_state
+
+    def next_due(self):
+        # Receive-time ms at which tick() has something to do, None when nothing is pending. While events are held only
+        # their release counts: tick() leaves the watchdog alone until they are out, so a passed stale deadline would spin
+        held = self.reorder.next_due() if self.reorder is not None else None
+        return held if held is not None else self.engine.stale_deadline()
+
+    def tick(self, now_ms):
+        # Timer wake-up without a frame: releases held events that are due, then the stale-feed watchdog. Held events
+        # go first since they may carry a fresher ticker; the watchdog waits until none are left.
+        with self.lock:
+            if self.recorder is not None: self.recorder.write(TICK, now_ms, b"")
+            if self.reorder is not None:
+                self.decide(self.reorder.release(now_ms))
+                if self.reorder.heap: return
+            stale = self.engine.check_stale(now_ms)
+            if stale is not None: self.transition(stale)
+
+    def run_timer(self, stop, resolution_ms=10):
+        # Timer thread: tick() as soon as something is due, rechecking at least every resolution_ms for new deadlines
+        while True:
+            due = self.next_due()
+            wait_ms = resolution_ms if due is None else min(resolution_ms, max(due - time.time() * 1000, 0))
+            if stop.wait(wait_ms / 1000.0): return
+            due, now_ms = self.next_due(), int(time.time() * 1000)
+            if due is not None and now_ms >= due: self.tick(now_ms)
+
+    def start_timer(self, resolution_ms=10):
+        # Daemon thread running run_timer(); set the returned event to stop it
+        stop = threading.Event()
+        threading.Thread(target=self.run_timer, args=(stop, resolution_ms), daemon=True).start()
+        return stop
+
+    def close(self, now_ms):
+        # Shutdown: whatever the reorder buffer still holds is decided in order
+        if self.reorder is None: return
+        with self.lock:
+            if self.recorder is not None: self.recorder.write(FLUSH, now_ms, b"")
+            self.decide(self.reorder.flush(now_ms))
+
+def start_recording(engine, restored, path=None):
+    # FeedRecorder for a new session file under FEED_DIR (Config.FEED_RECORD), opened with the model in force
+    # and, when the engine was restored, the snapshot it started from. None when recording is off.
+    if not engine.config.FEED_RECORD: return None
+    os.makedirs(FEED_DIR, exist_ok=True)
+    path = path or os.path.join(FEED_DIR, time.strftime("feed-%Y%m%d-%H%M%S.bin"))
+    recorder = FeedRecorder.from_config(path, engine.config)
+    now_ms = int(time.time() * 1000)
+    recorder.write(MODEL, now_ms, model_record(engine.config))
+    if restored: recorder.write(SNAPSHOT, now_ms, snapshot_bytes(engine.snapshot()))
+    print(f"Recording feed: {path}")
+    return recorder
 
 def run_realtime():
     print(f"Realtime Mode Started")
     print(f"Output Dir: {OUTPUT_DIR}")
     
-    engine = DecisionEngine(config_path=CONFIG_PATH)
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config())
+    restored = restore_engine(engine, SNAPSHOT_PATH)
+    if restored: print(f"Restored engine snapshot: {engine.state}")
+    checkpointer = Checkpointer(engine, SNAPSHOT_PATH)
+    profiler = StageProfiler.attach(engine)
+    watcher = ModelWatcher.attach(engine, CONFIG_PATH)
+    recorder = start_recording(engine, restored)
+    metrics = FeedMetrics.attach(engine)
+    publisher = DecisionPublisher.attach(engine)
     
-    f_dec = open(os.path.join(OUTPUT_DIR, 'decisions.jsonl'), 'a')
-    f_trans = open(os.path.join(OUTPUT_DIR, 'state_transitions.jsonl'), 'a')
-
-    if not hasattr(run_realtime, "stats"):
-        run_realtime.last_state = "BOOTSTRAP"
-        run_realtime.stats = {"processed": 0, "blocked": 0, "start_time": int(time.time())}
+    f_dec = LogSink.from_config(os.path.join(OUTPUT_DIR, 'decisions.jsonl'), engine.config)
+    f_trans = LogSink.from_config(os.path.join(OUTPUT_DIR, 'state_transitions.jsonl'), engine.config)
+    # Held events and the stale-feed watchdog are also driven by a timer thread, so a silent feed still gets its decisions
+    handler = RealtimeHandler(engine, f_dec, f_trans, watcher, ReorderBuffer.attach(engine), checkpointer, recorder, metrics)
+    timer = handler.start_timer()
 
     def save_summary():
         summary_path = os.path.join(OUTPUT_DIR, "summary.json")
         summary_data = {
             "timestamp": int(time.time()),
-            "duration_sec": int(time.time()) - run_realtime.stats["start_time"],
-            "total_events": run_realtime.stats["processed"],
-            "blocked_events": run_realtime.stats["blocked"],
-            "final_state": run_realtime.last_state
+            "duration_sec": int(time.time()) - handler.stats["start_time"],
+            "total_events": handler.stats["processed"],
+            "blocked_events": handler.stats["blocked"],
+            "final_state": handler.last_state
         }
+        if profiler is not None: summary_data["profile"] = profiler.report()
+        if handler.reorder is not None: summary_data["reorder"] = handler.reorder.report()
+        if recorder is not None: summary_data["recording"] = {"path": recorder.path, **recorder.stats}
         with open(summary_path, 'w') as f:
             json.dump(summary_data, f, indent=4)
         print(f"\n[Summary] Saved to {summary_path}")
 
     def on_message(ws, message):
-        try:
-            msg = json.loads(message)
-            if 'stream' not in msg: return
-            data, now_ms = msg['data'], int(time.time() * 1000)
-            
-            events_to_process = []
-            
-            if 'aggTrade' in msg['stream']: 
-                data['price'] = data['p']
-                data['id'] = data['a']
-                events_to_process.append(MarketEvent(event_time=data['T'], local_time=now_ms, type="TRADE", data=data))
-            
-            elif 'depth' in msg['stream']: 
-                data['bids'] = data['b']
-                data['asks'] = data['a']
-                events_to_process.append(MarketEvent(event_time=data['E'], local_time=now_ms, type="ORDERBOOK", data=data))
-            
-            elif 'forceOrder' in msg['stream']: 
-                events_to_process.append(MarketEvent(event_time=data['E'], local_time=now_ms, type="LIQUIDATION", data=data))
-            
-            elif 'bookTicker' in msg['stream']:
-                new_bid = float(data['b'])
-                new_ask = float(data['a'])
-                
-                curr_bid = engine.model.best_bid
-                curr_ask = engine.model.best_ask
-                
-                ev_ask = MarketEvent(event_time=data['E'], local_time=now_ms, type="ORDERBOOK", data={'side': 'ask', 'price': new_ask})
-                ev_bid = MarketEvent(event_time=data['E'], local_time=now_ms, type="ORDERBOOK", data={'side': 'bid', 'price': new_bid})
-                
-                if curr_ask > 0 and new_bid >= curr_ask:
-                    events_to_process = [ev_ask, ev_bid]
-                elif curr_bid > 0 and new_ask <= curr_bid:
-                    events_to_process = [ev_bid, ev_ask]
-                else:
-                    events_to_process = [ev_ask, ev_bid]
-
-            for event in events_to_process:
-                result = engine.process_event(event)
-                run_realtime.stats["processed"] += 1
-                
-                if result['action'] != "ALLOWED":
-                    run_realtime.stats["blocked"] += 1
-                    f_dec.write(json.dumps({k: v for k, v in result.items() if not k.startswith('_')}) + "\n")
-                    f_dec.flush()
-                    
-                    if run_realtime.stats["blocked"] % 50 == 0:
-                        reason_display = result['reason'] if result['reason'] else "GATHERING_DATA"
-                        print(f"\r[BLOCK] {reason_display} | State: {result['_internal_state']}", end="")
-                
-                curr_state = result['_internal_state']
-                if curr_state != run_realtime.last_state:
-                    print(f"\nState Transition: {run_realtime.last_state} -> {curr_state}")
-                    trust, hypo = engine.get_state_info()
-                    trans_log = {"ts": result['ts'], "data_trust": trust, "hypothesis": hypo, "decision": result['action'], "trigger": result['_trigger_detail']}
-                    f_trans.write(json.dumps(trans_log) + "\n"); f_trans.flush()
-                    run_realtime.last_state = curr_state
-
-        except Exception as e:
-            pass
+        handler.on_message(message, int(time.time() * 1000))
 
     def on_error(ws, error):
         print(f"\n[Connection Error] {error}")
@@ -156,9 +305,64 @@ def run_realtime():
     except KeyboardInterrupt:
         print("\nManually stopped.")
     finally:
+        timer.set()
+        handler.close(int(time.time() * 1000))
+        checkpointer.close()
+        if watcher is not None: watcher.close()
+        if recorder is not None: recorder.close()
+        if metrics is not None: metrics.close()
+        if publisher is not None: publisher.close()
         f_dec.close()
         f_trans.close()
         save_summary()
 
+def replay_feed(path, output_dir=None, speed=0.0):
+    # Runs a recording through RealtimeHandler, as fast as possible (speed 0) or at speed x the original pace,
+    # into output_dir (fresh decisions.jsonl / state_transitions.jsonl / summary.json). Nothing touches the
+    # network, the live snapshot or model_config.json: the model and start state come from the recording.
+    output_dir = output_dir or os.path.join(BASE_OUTPUT, "replay")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f">>> Feed Replay: {path} ({'max speed' if not speed else f'{speed}x pace'})")
+    print(f"    Output Dir: {output_dir}")
+    feed_stats = {}
+    records = read_feed(path, feed_stats)
+    kind, first_ms, data = next(records, (None, 0, b""))
+    if kind != MODEL: raise ValueError(f"recording does not start with the session model: {path}")
+    config = realtime_config()
+    for name, value in Config.model_params(json.loads(data)).items(): setattr(config, name, value)
+    engine = DecisionEngine(config_path="", config=config)
+    f_dec = LogSink.from_config(os.path.join(output_dir, 'decisions.jsonl'), config, realtime=False)
+    f_trans = LogSink.from_config(os.path.join(output_dir, 'state_transitions.jsonl'), config, realtime=False)
+    handler = RealtimeHandler(engine, f_dec, f_trans, reorder=ReorderBuffer.attach(engine), verbose=False)
+    frames = 0
+    start = time.perf_counter()
+    try:
+        for kind, recv_ms, data in records:
+            if speed:
+                ahead = (recv_ms - first_ms) / 1000.0 / speed - (time.perf_counter() - start)
+                if ahead > 0: time.sleep(ahead)
+            if kind == FRAME:
+                handler.on_message(data.decode(), recv_ms); frames += 1
+            elif kind == MODEL:
+                model = json.loads(data)
+                apply_model(engine, Config.model_params(model), model.get("rescale", False))
+                trust, hypo = engine.get_state_info()
+                f_trans.write(json.dumps({"ts": recv_ms, "data_trust": trust, "hypothesis": hypo, "decision": "RELOAD", "trigger": "MODEL_RELOAD (replayed)"}) + "\n")
+            elif kind == SNAPSHOT:
+                engine.restore(snapshot_from_bytes(data))
+                handler.last_state = str(engine.state)
+            elif kind == TICK: handler.tick(recv_ms)
+            elif kind == FLUSH: handler.close(recv_ms)
+    finally:
+        f_dec.close(); f_trans.close()
+    elapsed = time.perf_counter() - start
+    summary = {"total_events": handler.stats["processed"], "blocked_events": handler.stats["blocked"], "final_state": handler.last_state,
+               "frames": frames, "elapsed_sec": round(elapsed, 3), "frames_per_sec": round(frames / elapsed) if elapsed else 0,
+               "events_per_sec": round(handler.stats["processed"] / elapsed) if elapsed else 0, "feed": feed_stats}
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(f"Frames: {frames} | Events: {summary['total_events']} | Blocked: {summary['blocked_events']} | {summary['frames_per_sec']} frames/s")
+    return summary
+
 if __name__ == "__main__":
     run_realtime()
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import websockets
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import DecisionEngine, STATE_INFO
+from realtime import message_events, book_order, start_recording, realtime_config, WS_URL, OUTPUT_DIR, CONFIG_PATH, SNAPSHOT_PATH
+from log_sink import LogSink
+from profiling import StageProfiler
+from snapshot import Checkpointer, restore_engine
+from hot_reload import ModelWatcher
+from reorder import ReorderBuffer
+from feed_log import model_record, FRAME, MODEL, TICK, FLUSH
+from metrics import FeedMetrics
+from decision_ring import DecisionPublisher
+
+INGEST_QUEUE_SIZE = 20000     # raw frames waiting for the decision stage
+WRITE_QUEUE_SIZE = 20000      # log lines waiting for the writer
+WRITE_BATCH = 4096            # max lines per write()/flush()
+YIELD_EVERY = 256             # decision stage gives the loop back to ingest this often
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+class StageQueue:
+    # Bounded queue between two stages with an explicit policy for when it is full:
+    # block (backpressure on the producer), drop_oldest (keep the freshest data) or drop_newest
+    def __init__(self, maxsize, policy="block"):
+        if policy not in DROP_POLICIES: raise ValueError(f"unknown drop policy: {policy}")
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.dropped = 0
+        self.high_water = 0
+
+    async def put(self, item, force=False):
+        q = self.queue
+        if q.full() and not force:
+            if self.policy == "drop_newest":
+                self.dropped += 1; return
+            if self.policy == "drop_oldest":
+                q.get_nowait(); self.dropped += 1
+        await q.put(item)
+        if q.qsize() > self.high_water: self.high_water = q.qsize()
+
+    async def get(self):
+        return await self.queue.get()
+
+    def drain(self, limit):
+        # Whatever is already queued, without waiting
+        items = []
+        while len(items) < limit and not self.queue.empty(): items.append(self.queue.get_nowait())
+        return items
+
+    def stats(self):
+        return {"policy": self.policy, "maxsize": self.queue.maxsize, "dropped": self.dropped, "high_water": self.high_water}
+
+def _percentiles(samples):
+    if not samples: return {}
+    values = sorted(samples)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 3)
+    return {"count": len(values), "p50": pick(0.5), "p99": pick(0.99), "max": round(values[-1], 3)}
+
+class AsyncPipeline:
+    # ingest (socket reads only) -> decide (parse + engine) -> write (batched file I/O off the loop)
+    def __init__(self, engine, output_dir=OUTPUT_DIR, ingest_policy="block", write_policy="block",
+                 ingest_size=INGEST_QUEUE_SIZE, write_size=WRITE_QUEUE_SIZE, checkpointer=None, watcher=None, recorder=None, metrics=None, verbose=True):
+        self.engine = engine
+        self.output_dir = output_dir
+        self.ingest_q = StageQueue(ingest_size, ingest_policy)
+        self.write_q = StageQueue(write_size, write_policy)
+        self.checkpointer = checkpointer
+        self.watcher = watcher
+        self.recorder = recorder      # feed_log.FeedRecorder: frames as decided (after ingest drops), reloads and timer wake-ups
+        self.metrics = metrics
+        self.verbose = verbose
+        self.profiler = StageProfiler.attach(engine)
+        self.reorder = ReorderBuffer.attach(engine)
+        self.last_state = str(engine.state)
+        self.stats = {"frames": 0, "processed": 0, "blocked": 0, "start_time": int(time.time())}
+        # event_time -> decision / -> on disk, in ms; bounded so long runs keep a recent window
+        self.decide_latency = deque(maxlen=100000)
+        self.persist_latency = deque(maxlen=100000)
+        self.writing = None           # batch being written in a worker thread
+        self.f_dec = LogSink.from_config(os.path.join(output_dir, 'decisions.jsonl'), engine.config)
+        self.f_trans = LogSink.from_config(os.path.join(output_dir, 'state_transitions.jsonl'), engine.config)
+        if metrics is not None:
+            stats, reorder = self.stats, self.reorder
+            metrics.add_source("events", lambda: {"frames": stats["frames"], "processed": stats["processed"], "blocked": stats["blocked"]})
+            metrics.add_source("ingest_queue", lambda: {**self.ingest_q.stats(), "depth": self.ingest_q.queue.qsize()})
+            metrics.add_source("write_queue", lambda: {**self.write_q.stats(), "depth": self.write_q.queue.qsize()})
+            if reorder is not None: metrics.add_source("reorder", lambda: {**reorder.stats, "held": len(reorder.heap)})
+
+    async def ingest(self, url, reconnect=True):
+        while True:
+            try:
+                async with websockets.connect(url, ping_interval=60, ping_timeout=10, max_queue=None) as ws:
+                    async for message in ws:
+                        self.stats["frames"] += 1
+                        await self.ingest_q.put((int(time.time() * 1000), message))
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                if self.verbose: print(f"\n[Connection Error] {e}")
+            if not reconnect: break
+            await asyncio.sleep(3)
+        await self.ingest_q.put(None, force=True)
+
+    async def _next_frame(self):
+        # Next ingest item; wakes up instead (None, None) when the oldest held event is due or, with none held, the
+        # stale-feed watchdog (it waits for held events, so its deadline alone would spin while they are in)
+        held = self.reorder.next_due() if self.reorder is not None else None
+        due = held if held is not None else self.engine.stale_deadline()
+        if due is None or not self.ingest_q.queue.empty(): return await self.ingest_q.get()
+        try: return await asyncio.wait_for(self.ingest_q.get(), max(due - time.time() * 1000, 0) / 1000.0)
+        except asyncio.TimeoutError: return None, None
+
+    async def decide(self):
+        engine, reorder = self.engine, self.reorder
+        n = 0
+        while True:
+            item = await self._next_frame()
+            if item is None: break
+            now_ms, message = item
+            if message is None:
+                now_ms = int(time.time() * 1000)
+                if self.recorder is not None: self.recorder.write(TICK, now_ms, b"")
+                if reorder is not None:
+                    await self._decide_events(reorder.release(now_ms))
+                    if reorder.heap: continue
+                # Held events first (they may carry a fresher ticker), then the watchdog
+                stale = engine.check_stale(now_ms)
+                if stale is not None: await self.write_q.put((now_ms, None, self._transition(stale)))
+                continue
+            if self.watcher is not None:
+                reload_log = self.watcher.apply(now_ms)
+                if reload_log is not None:
+                    if self.verbose: print(f"\n{reload_log['trigger']}")
+                    await self.write_q.put((now_ms, None, json.dumps(reload_log) + "\n"))
+                    if self.recorder is not None: self.recorder.write(MODEL, now_ms, model_record(engine.config, self.watcher.rescale))
+            if self.recorder is not None: self.recorder.write(FRAME, now_ms, message)
+            try:
+                msg = json.loads(message)
+                if 'stream' not in msg: continue
+                events = message_events(msg, engine, now_ms)
+                if self.metrics is not None: self.metrics.frame(msg['stream'], events, now_ms)
+                if reorder is not None: events = reorder.feed(events, now_ms)
+                await self._decide_events(events)
+            except Exception:
+                pass
+            if self.checkpointer is not None: self.checkpointer.maybe(now_ms)
+            n += 1
+            if n % YIELD_EVERY == 0: await asyncio.sleep(0)
+        if reorder is not None:
+            now_ms = int(time.time() * 1000)
+            if self.recorder is not None: self.recorder.write(FLUSH, now_ms, b"")
+            await self._decide_events(reorder.flush(now_ms))
+        await self.write_q.put(None, force=True)
+
+    async def _decide_events(self, events):
+        for item in self._decided(events): await self.write_q.put(item)
+
+    def _decided(self, events):
+        # Write-queue items (ts, decision line, transition line) of the events, decided in order
+        engine, stats, metrics = self.engine, self.stats, self.metrics
+        for event in book_order(events, engine.model):
+            result = engine.process_event(event)
+            stats["processed"] += 1
+            self.decide_latency.append(time.time() * 1000 - result['ts'])
+            if '_watchdog' in result: yield result['_watchdog']['ts'], None, self._transition(result['_watchdog'])
+            dec_line = None
+            if result['action'] != "ALLOWED":
+                stats["blocked"] += 1
+                if metrics is not None: metrics.block(result['reason'])
+                dec_line = json.dumps({k: v for k, v in result.items() if not k.startswith('_')}) + "\n"
+
+            trans_line = self._transition(result)
+            if dec_line or trans_line: yield result['ts'], dec_line, trans_line
+
+    def _transition(self, result):
+        # The state_transitions.jsonl line when result changed the state, else None
+        curr_state = result['_internal_state']
+        if curr_state == self.last_state: return None
+        if self.verbose: print(f"\nState Transition: {self.last_state} -> {curr_state}")
+        trust, hypo = STATE_INFO[curr_state]
+        self.last_state = curr_state
+        return json.dumps({"ts": result['ts'], "data_trust": trust, "hypothesis": hypo, "decision": result['action'], "trigger": result['_trigger_detail']}) + "\n"
+
+    def _write_batch(self, items):
+        dec = "".join(d for _, d, _ in items if d)
+        trans = "".join(t for _, _, t in items if t)
+        # The write stage already batches, so each batch goes straight to disk (and through rotation)
+        if dec: self.f_dec.write(dec); self.f_dec.flush()
+        if trans: self.f_trans.write(trans); self.f_trans.flush()
+
+    async def write(self):
+        done = False
+        while not done:
+            items = [await self.write_q.get()] + self.write_q.drain(WRITE_BATCH - 1)
+            if items[-1] is None: done = True; items.pop()
+            if not items: continue
+            # Blocking file I/O runs in a worker thread so a slow disk only backs up the write queue. Shielded: when the
+            # pipeline is cancelled, run() waits for the batch in flight before writing what is left
+            self.writing = asyncio.ensure_future(asyncio.to_thread(self._write_batch, items))
+            await asyncio.shield(self.writing)
+            now = time.time() * 1000
+            self.persist_latency.extend(now - ts for ts, _, _ in items)
+
+    async def run(self, url, reconnect=True):
+        try:
+            await asyncio.gather(self.ingest(url, reconnect), self.decide(), self.write())
+        finally:
+            if self.writing is not None and not self.writing.done(): await asyncio.wait([self.writing])
+            self.close()
+
+    def close(self):
+        # Shutdown (also on cancellation / Ctrl-C): lines still queued, then whatever the reorder buffer still holds,
+        # decided in order as the sync handler's close() does, go straight to the logs
+        items = [item for item in self.write_q.drain(self.write_q.queue.qsize()) if item is not None]
+        if self.reorder is not None and self.reorder.heap:
+            now_ms = int(time.time() * 1000)
+            if self.recorder is not None: self.recorder.write(FLUSH, now_ms, b"")
+            items.extend(self._decided(self.reorder.flush(now_ms)))
+        if items: self._write_batch(items)
+        self.f_dec.close(); self.f_trans.close()
+
+    def summary(self):
+        summary = {
+            "timestamp": int(time.time()),
+            "duration_sec": int(time.time()) - self.stats["start_time"],
+            "total_events": self.stats["processed"],
+            "blocked_events": self.stats["blocked"],
+            "final_state": self.last_state,
+            "pipeline": {
+                "frames": self.stats["frames"],
+                "ingest_queue": self.ingest_q.stats(),
+                "write_queue": self.write_q.stats(),
+                "decide_latency_ms": _percentiles(self.decide_latency),
+                "persist_latency_ms": _percentiles(self.persist_latency),
+            }
+        }
+        if self.reorder is not None: summary["pipeline"]["reorder"] = self.reorder.report()
+        if self.recorder is not None: summary["recording"] = {"path": self.recorder.path, **self.recorder.stats}
+        if self.profiler is not None: summary["profile"] = self.profiler.report()
+        return summary
+
+def run_realtime_async(url=WS_URL, ingest_policy="block"):
+    print(f"Realtime Mode Started (asyncio pipeline, ingest policy: {ingest_policy})")
+    print(f"Output Dir: {OUTPUT_DIR}")
+
+    engine = DecisionEngine(config_path=CONFIG_PATH, config=realtime_config())
+    restored = restore_engine(engine, SNAPSHOT_PATH)
+    if restored: print(f"Restored engine snapshot: {engine.state}")
+    checkpointer = Checkpointer(engine, SNAPSHOT_PATH)
+    watcher = ModelWatcher.attach(engine, CONFIG_PATH)
+    recorder = start_recording(engine, restored)
+    metrics = FeedMetrics.attach(engine)
+    publisher = DecisionPublisher.attach(engine)
+    pipeline = AsyncPipeline(engine, ingest_policy=ingest_policy, checkpointer=checkpointer, watcher=watcher, recorder=recorder, metrics=metrics)
+    try:
+        asyncio.run(pipeline.run(url))
+    except KeyboardInterrupt:
+        print("\nManually stopped.")
+    finally:
+        checkpointer.close()
+        if watcher is not None: watcher.close()
+        if recorder is not None: recorder.close()
+        if metrics is not None: metrics.close()
+        if publisher is not None: publisher.close()
+        summary_path = os.path.join(OUTPUT_DIR, "summary.json")
+        with open(summary_path, 'w') as f:
+            json.dump(pipeline.summary(), f, indent=4)
+        print(f"\n[Summary] Saved to {summary_path}")
+
+if __name__ == "__main__":
+    run_realtime_async(sys.argv[1] if len(sys.argv) > 1 else WS_URL)
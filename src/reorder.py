@@ -0,0 +1,77 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+class ReorderBuffer:
+    # Ingestion stage in front of process_event: events wait in a heap keyed on event_time and leave in
+    # event_time order once the watermark passes them. The watermark trails the newest event_time seen by
+    # latency_ms; an event is also let go after waiting latency_ms of wall-clock time (by its local_time), so a
+    # quiet stream never holds anything longer than the budget. The watermark never moves back, and events
+    # older than it arrive too late to be put in order: they are counted and dropped.
+    def __init__(self, latency_ms=50, samples=100000):
+        self.latency_ms = latency_ms
+        self.heap = []
+        self.arrivals = deque()       # (local_time, event_time) in arrival order, for the wall-clock bound
+        self.seq = 0                  # arrival order, keeps equal event_times (bookTicker bid/ask) as the adapter sent them
+        self.newest = None
+        self.watermark = None
+        self.stats = {"events": 0, "released": 0, "reordered": 0, "late": 0, "high_water": 0}
+        self.held_ms = deque(maxlen=samples)
+
+    @classmethod
+    def attach(cls, engine):
+        # ReorderBuffer when the engine's config has a latency budget, else None (events go straight through)
+        return cls(engine.config.REORDER_LATENCY_MS) if engine.config.REORDER_LATENCY_MS > 0 else None
+
+    def push(self, event):
+        # False when the event is behind the watermark and was dropped
+        stats, t = self.stats, event.event_time
+        stats["events"] += 1
+        if self.watermark is not None and t < self.watermark:
+            stats["late"] += 1
+            return False
+        if self.newest is None or t > self.newest:
+            self.newest = t
+            mark = t - self.latency_ms
+            if self.watermark is None or mark > self.watermark: self.watermark = mark
+        elif t < self.newest: stats["reordered"] += 1
+        heapq.heappush(self.heap, (t, self.seq, event))
+        self.arrivals.append((event.local_time, t))
+        self.seq += 1
+        if len(self.heap) > stats["high_water"]: stats["high_water"] = len(self.heap)
+        return True
+
+    def release(self, now_ms):
+        # Events that are due, oldest event_time first. An event that has waited out the budget
+        # pulls the watermark up to its event_time, releasing everything before it too.
+        heap, arrivals, out = self.heap, self.arrivals, []
+        expired = now_ms - self.latency_ms
+        while arrivals and arrivals[0][0] <= expired:
+            t = arrivals.popleft()[1]
+            if t > self.watermark: self.watermark = t
+        while heap and heap[0][0] <= self.watermark:
+            event = heapq.heappop(heap)[2]
+            self.held_ms.append(now_ms - event.local_time)
+            out.append(event)
+        if not heap: arrivals.clear()
+        self.stats["released"] += len(out)
+        return out
+
+    def feed(self, events, now_ms):
+        for event in events: self.push(event)
+        return self.release(now_ms)
+
+    def flush(self, now_ms):
+        # Everything still held, in order (shutdown)
+        if self.heap: self.watermark = max(self.watermark, max(t for t, _, _ in self.heap))
+        return self.release(now_ms)
+
+    def next_due(self):
+        # Wall-clock ms by which the longest-waiting held event has to go out, None when nothing is held
+        return self.arrivals[0][0] + self.latency_ms if self.heap else None
+
+    def report(self):
+        held = np.array(self.held_ms, dtype=np.float64)
+        added = {"p50": float(np.percentile(held, 50)), "p99": float(np.percentile(held, 99)), "max": float(held.max())} if len(held) else {}
+        return {"latency_ms": self.latency_ms, **self.stats, "held": len(self.heap), "added_latency_ms": added}
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+import shutil
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from engine import DataSanitizer
+
+CACHE_VERSION = 1
+CACHE_DIRNAME = ".replay_cache"
+
+def chunk_columns(chunk: pd.DataFrame):
+    # Canonical replay columns of one CSV chunk; side/id are left raw, None when the CSV has no such column
+    chunk.columns = [c.strip().lower() for c in chunk.columns]
+    ts_col = next((c for c in chunk.columns if 'time' in c or 'ts' in c), None)
+    if not ts_col: return None
+
+    n = len(chunk)
+    ts = chunk[ts_col].to_numpy().astype(np.int64)
+    cols = {'ts': ts, 'local_ts': ts, 'price': None, 'side': None, 'id': None}
+    if 'local_timestamp' in chunk.columns:
+        local_ts = chunk['local_timestamp']
+        cols['local_ts'] = local_ts.to_numpy(np.int64) if local_ts.dtype.kind in 'iu' else np.where(local_ts.isna(), ts, local_ts.to_numpy(np.float64)).astype(np.int64)
+    if 'price' in chunk.columns:
+        cols['price'] = pd.to_numeric(chunk['price'], errors='coerce').to_numpy(np.float64)
+    if 'side' in chunk.columns: cols['side'] = chunk['side']
+    if 'id' in chunk.columns: cols['id'] = chunk['id']
+    return cols
+
+def cache_dir(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIRNAME, name)
+
+def _source_stamp(csv_path):
+    st = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+class _ColumnWriter:
+    # Appends chunks to a raw temp file; finish() prepends the .npy header once the length is known
+    def __init__(self, path, dtype):
+        self.path, self.dtype, self.rows = path, np.dtype(dtype), 0
+        self.f = open(path + ".raw", 'wb')
+
+    def append(self, values):
+        np.ascontiguousarray(values, dtype=self.dtype).tofile(self.f)
+        self.rows += len(values)
+
+    def finish(self):
+        self.f.close()
+        with open(self.path, 'wb') as out, open(self.path + ".raw", 'rb') as raw:
+            np.lib.format.write_array_header_1_0(out, {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.rows,)})
+            shutil.copyfileobj(raw, out, 16 << 20)
+        os.remove(self.path + ".raw")
+
+def build_cache(csv_path, chunksize=500000, id_mode=None):
+    # One-time CSV -> per-column .npy conversion; sides and non-numeric ids are dictionary-encoded.
+    # id_mode ("numeric"/"dictionary") is taken from the first chunk unless given
+    target = cache_dir(csv_path)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    stamp = _source_stamp(csv_path)
+    writers, columns = {}, {}
+    side_dict, id_dict = {}, {}
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        cols = chunk_columns(chunk)
+        if cols is None: break
+
+        if cols['side'] is not None:
+            for v in cols['side'].dropna().unique().tolist():
+                if v not in side_dict: side_dict[v] = len(side_dict)
+            cols['side'] = cols['side'].map(side_dict).fillna(-1).to_numpy(np.int8)
+        if cols['id'] is not None:
+            ids = cols['id']
+            if id_mode is None: id_mode = "numeric" if ids.dtype.kind in 'iufb' else "dictionary"
+            if id_mode == "numeric":
+                # float64 is exactly what the sanitizer's int(float(id)) normalization sees
+                cols['id'] = pd.to_numeric(ids, errors='coerce').to_numpy(np.float64)
+                if np.isnan(cols['id']).sum() > ids.isna().sum():
+                    # A later chunk has ids that are not numbers: as NaN they would skip dedupe, so start over in dictionary mode
+                    for w in writers.values(): w.f.close()
+                    return build_cache(csv_path, chunksize, "dictionary")
+            else:
+                keys = [DataSanitizer.normalize_id(v) for v in ids.tolist()]
+                for k in keys:
+                    if k is not None and k not in id_dict: id_dict[k] = len(id_dict)
+                cols['id'] = np.array([-1 if k is None else id_dict[k] for k in keys], np.int32)
+
+        for name, values in cols.items():
+            if values is None: continue
+            if name not in writers:
+                writers[name] = _ColumnWriter(os.path.join(tmp, name + ".npy"), values.dtype)
+                columns[name] = {"dtype": np.lib.format.dtype_to_descr(np.dtype(values.dtype))}
+            writers[name].append(values)
+        rows += len(chunk)
+
+    if 'ts' not in writers:
+        # Header-only CSV (or no time column): an empty ts column, so the cache reads as rows=0 like any other
+        writers['ts'] = _ColumnWriter(os.path.join(tmp, "ts.npy"), np.int64)
+        columns['ts'] = {"dtype": np.lib.format.dtype_to_descr(np.dtype(np.int64))}
+        rows = 0
+    for w in writers.values(): w.finish()
+    if 'side' in columns: columns['side']['dictionary'] = list(side_dict)
+    if 'id' in columns and id_mode == "dictionary":
+        with open(os.path.join(tmp, "id.dictionary.json"), 'w') as f: json.dump(list(id_dict), f)
+        columns['id']['dictionary'] = "id.dictionary.json"
+
+    # Columns missing from the CSV are simply absent; the manifest is written last and marks a complete cache
+    with open(os.path.join(tmp, "manifest.json"), 'w') as f:
+        json.dump({"version": CACHE_VERSION, "source": stamp, "rows": rows, "columns": columns}, f, indent=4)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+def open_cache(csv_path):
+    # Memory-mapped columns of a valid cache, or None when missing, from another version, or stale
+    manifest_path = os.path.join(cache_dir(csv_path), "manifest.json")
+    if not os.path.exists(manifest_path) or not os.path.exists(csv_path): return None
+    try:
+        with open(manifest_path) as f: manifest = json.load(f)
+        if manifest.get("version") != CACHE_VERSION: return None
+        st = os.stat(csv_path)
+        if manifest["source"]["size"] != st.st_size or manifest["source"]["mtime_ns"] != st.st_mtime_ns: return None
+        base = os.path.dirname(manifest_path)
+        cols = {name: np.asarray(np.load(os.path.join(base, name + ".npy"), mmap_mode='r')) for name in manifest["columns"]}
+        for meta in manifest["columns"].values():
+            if 'dictionary' not in meta: continue
+            if isinstance(meta['dictionary'], str):
+                with open(os.path.join(base, meta['dictionary'])) as f: meta['dictionary'] = json.load(f)
+            # Trailing None so that the -1 "missing" code decodes to None
+            meta['values'] = np.array(meta['dictionary'] + [None], dtype=object)
+    except (OSError, ValueError, KeyError): return None
+    return manifest, cols
+
+def decode(manifest, cols, name, start=0, stop=None):
+    # Slice of a dictionary-encoded column as an object array (None where missing)
+    return manifest["columns"][name]['values'][cols[name][start:stop]]
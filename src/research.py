@@ -5,59 +5,178 @@ import os
 import sys
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
 BASE_DIR = os.path.dirname(CURRENT_DIR)
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 CONFIG_FILE = os.path.join(OUTPUT_DIR, "model_config.json")
 RESEARCH_DIR = os.path.join(BASE_DIR, "research")
 if not os.path.exists(RESEARCH_DIR): RESEARCH_DIR = os.path.join(BASE_DIR, "validation")
 
-def run_research():
-    print("[Phase 0] Research")
-    trades_path = os.path.join(RESEARCH_DIR, "trades.csv")
-    ob_path = os.path.join(RESEARCH_DIR, "orderbook.csv")
-    
-    trades = pd.read_csv(trades_path, nrows=100000) if os.path.exists(trades_path) else None
-    books = pd.read_csv(ob_path, nrows=100000) if os.path.exists(ob_path) else None
-    
-    if trades is None or books is None:
-        default_model = {"mu": [0.0, 0.0], "inv_cov": [[1.0, 0.0], [0.0, 1.0]], "threshold": 3.0}
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        with open(CONFIG_FILE, 'w') as f: json.dump(default_model, f)
+from replay_cache import open_cache, decode
+
+CHUNK_ROWS = 500000
+VOL_WINDOW = 50
+PERCENTILE = 99.9
+
+def iter_frames(path, columns, chunksize=CHUNK_ROWS, nrows=None):
+    # Consecutive chunks of a source (timestamp + wanted columns), zero-copy from its replay cache when one is valid
+    cache = open_cache(path)
+    if cache is None:
+        if not os.path.exists(path): return
+        for chunk in pd.read_csv(path, chunksize=chunksize, nrows=nrows, usecols=lambda c: c.strip().lower() in ('timestamp',) + columns):
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            yield chunk
         return
+    manifest, cols = cache
+    total = len(cols['ts']) if nrows is None else min(nrows, len(cols['ts']))
+    for start in range(0, total, chunksize):
+        stop = min(start + chunksize, total)
+        frame = {'timestamp': cols['ts'][start:stop]}
+        if 'price' in columns and 'price' in cols: frame['price'] = cols['price'][start:stop]
+        if 'side' in columns and 'side' in cols: frame['side'] = decode(manifest, cols, 'side', start, stop)
+        yield pd.DataFrame(frame, copy=False)
+
+class VolatilityStream:
+    # Rolling std of trade returns; the last price and last window-1 returns carry over between chunks
+    def __init__(self, window=VOL_WINDOW):
+        self.window = window
+        self.last_price = None
+        self.tail = np.zeros(0)
+
+    def update(self, prices):
+        prices = np.asarray(prices, np.float64)
+        head = [] if self.last_price is None else [self.last_price]
+        ret = pd.Series(np.concatenate((head, prices))).pct_change().fillna(0).to_numpy()[len(head):]
+        vol = pd.Series(np.concatenate((self.tail, ret))).rolling(self.window).std().to_numpy()[len(self.tail):]
+        if len(prices): self.last_price = prices[-1]
+        self.tail = np.concatenate((self.tail, ret))[-(self.window - 1):]
+        return np.nan_to_num(vol, nan=0.0)
+
+class SpreadStream:
+    # Best ask - best bid per book timestamp; rows of the last timestamp wait for the next chunk in case it continues
+    def __init__(self):
+        self.pending = None
 
-    trades.columns = [c.strip().lower() for c in trades.columns]
-    books.columns = [c.strip().lower() for c in books.columns]
-    
-    trades = trades.sort_values('timestamp')
-    trades['ret'] = trades['price'].pct_change().fillna(0)
-    trades['vol'] = trades['ret'].rolling(50).std().fillna(0)
-    
-    books = books.sort_values('timestamp')
-    if 'side' in books.columns:
+    def update(self, books=None):
+        # books=None marks the end of the stream and flushes the held rows
+        if books is None: books, self.pending = self.pending, None
+        else:
+            if self.pending is not None: books = pd.concat([self.pending, books], ignore_index=True)
+            last = books['timestamp'].iloc[-1] if len(books) else None
+            self.pending, books = books[books['timestamp'] == last], books[books['timestamp'] != last]
+        if books is None or 'side' not in books.columns: return np.zeros(0, np.int64), np.zeros(0)
         bids = books[books['side']=='bid'].groupby('timestamp')['price'].max()
         asks = books[books['side']=='ask'].groupby('timestamp')['price'].min()
         spread_df = pd.concat([bids, asks], axis=1, keys=['bid', 'ask']).dropna()
         spread_df['spread'] = spread_df['ask'] - spread_df['bid']
         spread_df = spread_df[spread_df['spread'] > 0]
-    else: return
-
-    trades_idx = trades[['timestamp', 'vol']].set_index('timestamp')
-    merged = pd.merge_asof(trades_idx.sort_index(), spread_df['spread'].sort_index(), left_index=True, right_index=True, direction='backward').dropna()
-    
-    X = merged[['vol', 'spread']].values
-    X[:, 0] = np.log(X[:, 0] + 1e-9)
-    X[:, 1] = np.log(X[:, 1] + 1e-9)
-    
-    mu = np.mean(X, axis=0)
-    cov = np.cov(X, rowvar=False)
-    inv_cov = np.linalg.inv(cov + np.eye(2) * 1e-6)
-    
-    dists = [np.sqrt((row-mu).T @ inv_cov @ (row-mu)) for row in X[::100]]
-    threshold = float(np.percentile(dists, 99.9)) if dists else 3.0
-    
-    model_config = {"mu": mu.tolist(), "inv_cov": inv_cov.tolist(), "threshold": max(threshold, 3.0)}
+        return spread_df.index.to_numpy(np.int64), spread_df['spread'].to_numpy(np.float64)
+
+def iter_features(trades_path, ob_path, chunksize=CHUNK_ROWS, nrows=None):
+    # [log vol, log spread] per trade, chunk by chunk; each trade takes the last spread at or before it (merge_asof backward)
+    vols, spreads = VolatilityStream(), SpreadStream()
+    books = iter_frames(ob_path, ('side', 'price'), chunksize, nrows)
+    sp_ts, sp = np.zeros(0, np.int64), np.zeros(0)
+    books_done = False
+    for trades in iter_frames(trades_path, ('price',), chunksize, nrows):
+        trades = trades.sort_values('timestamp', kind='stable')
+        ts = trades['timestamp'].to_numpy(np.int64)
+        vol = vols.update(trades['price'].to_numpy())
+        if not len(ts): continue
+        # Pull book chunks until the spreads reach past this trade chunk
+        while not books_done and (not len(sp_ts) or sp_ts[-1] <= ts[-1]):
+            chunk = next(books, None)
+            books_done = chunk is None
+            new_ts, new_sp = spreads.update(None if books_done else chunk.sort_values('timestamp', kind='stable'))
+            sp_ts, sp = np.concatenate((sp_ts, new_ts)), np.concatenate((sp, new_sp))
+        idx = np.searchsorted(sp_ts, ts, 'right') - 1
+        ok = idx >= 0
+        yield np.column_stack((np.log(vol[ok] + 1e-9), np.log(sp[idx[ok]] + 1e-9)))
+        # Keep the last spread at or before this chunk (the next chunk may still need it) and everything after
+        keep = max(np.searchsorted(sp_ts, ts[-1], 'right') - 1, 0)
+        sp_ts, sp = sp_ts[keep:], sp[keep:]
+
+class Moments:
+    # Count, mean and centered cross-product sums of feature rows; partial results merge exactly (Chan et al.)
+    def __init__(self, dim=2):
+        self.n, self.mean, self.m2 = 0, np.zeros(dim), np.zeros((dim, dim))
+
+    def update(self, X):
+        part = Moments(X.shape[1])
+        if len(X):
+            part.n, part.mean = len(X), X.mean(axis=0)
+            d = X - part.mean
+            part.m2 = d.T @ d
+        return self.merge(part)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if not other.n: return self
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * self.n * other.n / n
+        self.n = n
+        return self
+
+    def cov(self):
+        return self.m2 / (self.n - 1)
+
+class QuantileSketch:
+    # Fixed log-spaced histogram (1e-6 .. 1e6, ~0.2% wide bins); constant size and mergeable by adding counts
+    LO, HI, BINS = -6.0, 6.0, 1 << 14
+
+    def __init__(self):
+        self.counts = np.zeros(self.BINS + 2, np.int64)   # + underflow / overflow
+
+    def update(self, values):
+        pos = (np.log10(np.maximum(values, 1e-300)) - self.LO) / (self.HI - self.LO) * self.BINS
+        self.counts += np.bincount(np.clip(np.floor(pos).astype(np.int64) + 1, 0, self.BINS + 1), minlength=self.BINS + 2)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        # Same rank as np.percentile's linear interpolation, resolved to the middle of its bin
+        n = int(self.counts.sum())
+        if not n: return None
+        i = int(np.searchsorted(np.cumsum(self.counts), q * (n - 1) + 1))
+        i = min(max(i, 1), self.BINS)
+        return float(10 ** (self.LO + (i - 0.5) / self.BINS * (self.HI - self.LO)))
+
+def mahalanobis(X, mu, inv_cov):
+    d = X - mu
+    return np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', d, inv_cov, d), 0))
+
+def save_model(model_config, indent=None):
+    # tmp + rename, so a running engine watching the file never reads it half-written
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(CONFIG_FILE, 'w') as f: json.dump(model_config, f, indent=4)
-    print(f"Config saved.")
+    tmp = CONFIG_FILE + ".tmp"
+    with open(tmp, 'w') as f: json.dump(model_config, f, indent=indent)
+    os.replace(tmp, CONFIG_FILE)
+
+def run_research(chunksize=CHUNK_ROWS, nrows=None):
+    # Two streaming passes over the full dataset in constant memory: moments, then the distance percentile
+    print("[Phase 0] Research")
+    trades_path = os.path.join(RESEARCH_DIR, "trades.csv")
+    ob_path = os.path.join(RESEARCH_DIR, "orderbook.csv")
+
+    moments = Moments()
+    for X in iter_features(trades_path, ob_path, chunksize, nrows): moments.update(X)
+
+    if moments.n < 2:
+        save_model({"mu": [0.0, 0.0], "inv_cov": [[1.0, 0.0], [0.0, 1.0]], "threshold": 3.0})
+        return
+
+    mu = moments.mean
+    inv_cov = np.linalg.inv(moments.cov() + np.eye(2) * 1e-6)
+
+    sketch = QuantileSketch()
+    for X in iter_features(trades_path, ob_path, chunksize, nrows): sketch.update(mahalanobis(X, mu, inv_cov))
+    threshold = sketch.quantile(PERCENTILE / 100.0) or 3.0
+
+    save_model({"mu": mu.tolist(), "inv_cov": inv_cov.tolist(), "threshold": max(threshold, 3.0)}, indent=4)
+    print(f"Config saved. ({moments.n} rows)")
 
 if __name__ == "__main__": run_research()
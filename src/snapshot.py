@@ -0,0 +1,136 @@
+import numpy as np
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+SNAPSHOT_VERSION = 1
+COMPRESS_LEVEL = 1              # deflate level: the difference-coded ids shrink ~15x already at 1, and 6 costs ~6x the time
+
+def _split(state, arrays, prefix=""):
+    # Nested snapshot dict -> JSON-able dict with arrays replaced by {"__array__": name}. int64 columns (dedupe ids
+    # and times, mostly near their neighbours) are stored as differences, which deflate far better
+    if isinstance(state, np.ndarray):
+        if state.dtype == np.int64 and state.ndim == 1:
+            arrays[prefix] = np.diff(state, prepend=np.int64(0))
+            return {"__array__": prefix, "delta": True}
+        arrays[prefix] = state
+        return {"__array__": prefix}
+    if isinstance(state, dict): return {k: _split(v, arrays, f"{prefix}/{k}" if prefix else k) for k, v in state.items()}
+    return state
+
+def _join(meta, arrays):
+    if isinstance(meta, dict):
+        if "__array__" in meta: return np.cumsum(arrays[meta["__array__"]], dtype=np.int64) if meta.get("delta") else arrays[meta["__array__"]]
+        return {k: _join(v, arrays) for k, v in meta.items()}
+    return meta
+
+def _write(state, f):
+    arrays = {}
+    meta = {"version": SNAPSHOT_VERSION, "saved_at_ms": int(time.time() * 1000), "state": _split(state, arrays)}
+    arrays["__meta__"] = np.array(json.dumps(meta))
+    # np.savez_compressed's layout (np.load reads it back), at COMPRESS_LEVEL
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as zf:
+        for name, value in arrays.items():
+            with zf.open(name + '.npy', 'w', force_zip64=True) as out: np.lib.format.write_array(out, value, allow_pickle=False)
+
+def _read(f, max_age_ms=None):
+    with np.load(f, allow_pickle=False) as npz:
+        meta = json.loads(str(npz["__meta__"]))
+        if meta.get("version") != SNAPSHOT_VERSION: return None
+        if max_age_ms is not None and time.time() * 1000 - meta["saved_at_ms"] > max_age_ms: return None
+        return _join(meta["state"], {k: npz[k] for k in npz.files if k != "__meta__"})
+
+def save_snapshot(state, path):
+    # Compressed .npz (header JSON + one array per column), written to a temp file and renamed into place
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        _write(state, f)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_snapshot(path, max_age_ms=None):
+    # Snapshot state dict, or None when missing, unreadable, from another version or older than max_age_ms
+    if not os.path.exists(path): return None
+    try: return _read(path, max_age_ms)
+    except (OSError, ValueError, KeyError): return None
+
+def snapshot_bytes(state):
+    # The same .npz as save_snapshot, in memory (e.g. to embed in a feed recording)
+    f = io.BytesIO()
+    _write(state, f)
+    return f.getvalue()
+
+def snapshot_from_bytes(data):
+    return _read(io.BytesIO(data))
+
+def restore_engine(engine, path):
+    state = load_snapshot(path, engine.config.SNAPSHOT_MAX_AGE_MS)
+    if state is None: return False
+    engine.restore(state)
+    return True
+
+def merge_ids(base, state):
+    # Full state from a capture taken with engine.snapshot(ids_since=...) and the full state of the capture before it:
+    # the live ids are the newest `count` of the earlier live ids followed by the ones added since
+    ids = state["sanitizer"]
+    if "since" not in ids: return state
+    prev, merged = base["sanitizer"], {k: v for k, v in ids.items() if k != "since"}
+    for name in ("ids", "times"):
+        if ids[name] is not None:
+            joined = np.concatenate((prev[name], ids[name]))
+            merged[name] = joined[len(joined) - ids["count"]:]
+    return dict(state, sanitizer=merged)
+
+class Checkpointer:
+    # State is captured on the engine's own thread (maybe()), then a background thread writes the latest capture.
+    # After the first capture only the dedupe ids added since the previous one are copied on the engine thread; the
+    # writer keeps the full state and stacks each capture on it (merge_ids), in order
+    def __init__(self, engine, path, interval_ms=None):
+        self.engine = engine
+        self.path = path
+        self.interval_ms = engine.config.SNAPSHOT_INTERVAL_MS if interval_ms is None else interval_ms
+        self.last_ms = 0
+        self.since = None
+        self.pending = []
+        self.state = None
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def maybe(self, now_ms):
+        if now_ms - self.last_ms < self.interval_ms: return
+        self.last_ms = now_ms
+        self.capture()
+
+    def capture(self):
+        state = self.engine.snapshot(ids_since=self.since)
+        self.since = state["sanitizer"].get("added")
+        with self.cond:
+            self.pending.append(state)
+            self.cond.notify()
+
+    def _write_loop(self):
+        while True:
+            with self.cond:
+                while not self.pending and self.running: self.cond.wait()
+                captures, self.pending = self.pending, []
+            if not captures: return
+            for state in captures: self.state = merge_ids(self.state, state)
+            try: save_snapshot(self.state, self.path)
+            except Exception as e: print(f"\n[Snapshot Error] {e}")
+
+    def close(self):
+        # Final checkpoint, then wait for the writer to drain
+        self.capture()
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
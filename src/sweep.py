@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+import itertools
+import json
+import os
+import sys
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+import historical
+from engine import DecisionEngine, Config, SystemState, STATES, STATE_CODES, ACTION_CODES
+
+# Grid used when none is given: 5 x 4 x 5 = 100 configurations
+DEFAULT_GRID = {
+    "SIGMA_MULTIPLIER": [2.0, 2.5, 3.0, 3.5, 4.0],
+    "WINDOW_SIZE": [50, 100, 200, 400],
+    "STALE_TICKER_MS": [2000, 5000, 10000, 20000, 60000],
+}
+# Parameters that change which events reach the model; configs sharing them share one engine pass
+STREAM_PARAMS = ("TIMESTAMP_TOLERANCE_MS", "FAT_FINGER_PRICE", "STALE_TICKER_MS")
+MAX_DISAGREEMENTS = 50
+
+NORMAL, QUARANTINE, CROSSED, STALE = range(4)
+BOOTSTRAP, NORMAL_STATE, UNSTABLE, HALTED = (STATE_CODES[s] for s in (SystemState.BOOTSTRAP, SystemState.NORMAL, SystemState.UNSTABLE, SystemState.HALTED))
+ALLOWED, HALT, RESTRICTED, IGNORED = (ACTION_CODES[a] for a in ("ALLOWED", "HALT", "RESTRICTED", "IGNORED"))
+STATE_ACTIONS = {BOOTSTRAP: HALT, NORMAL_STATE: ALLOWED, UNSTABLE: RESTRICTED, HALTED: HALT}
+
+def parse_grid(args):
+    # ["SIGMA_MULTIPLIER=2,3", "WINDOW_SIZE=100"] -> {"SIGMA_MULTIPLIER": [2.0, 3.0], "WINDOW_SIZE": [100]}
+    grid = {}
+    for arg in args:
+        name, _, values = arg.partition("=")
+        if not hasattr(Config, name): raise ValueError(f"unknown Config parameter: {name}")
+        grid[name] = [int(v) if v.lstrip('-').isdigit() else float(v) for v in values.split(",")]
+    return grid or DEFAULT_GRID
+
+def grid_configs(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def sweep_engine(params, config_path):
+    # Engine on its own Config copy; params are re-applied after load() so the file cannot override them
+    config = Config.derive(**params)
+    engine = DecisionEngine(config_path=config_path, config=config)
+    for name, value in params.items(): setattr(config, name, value)
+    return engine
+
+class Trajectory:
+    # The config-independent half of a replay for one group of configs: for every event, whether it was
+    # quarantined, crossed or stale, the ts of the stale-feed watchdog HALT before it (0 if none), and the distance
+    # detect_shock computed (and appended) if it ran.
+    # The regime state never feeds back into these, so one engine pass serves every config in the group.
+    def __init__(self, engine):
+        self.engine = engine
+        self.parts = []
+        self.calls = []
+        detect_shock = engine.model.detect_shock
+        def recording():
+            dist, shock, info = detect_shock()
+            self.calls.append((dist, info != ""))
+            return dist, shock, info
+        engine.model.detect_shock = recording
+
+    def feed(self, columns):
+        batch = self.engine.process_batch(columns)
+        reasons = batch['reason']
+        kinds = np.array([QUARANTINE if r.startswith("QUARANTINE") else CROSSED if r == "CROSSED_MARKET" else STALE if r == "DATA_STALE" else NORMAL for r in reasons], np.int8)
+        dists = np.zeros(len(kinds))
+        appended = np.zeros(len(kinds), bool)
+        normal = np.flatnonzero(kinds == NORMAL)
+        if len(self.calls):
+            dists[normal] = [d for d, _ in self.calls]
+            appended[normal] = [a for _, a in self.calls]
+        self.calls = []
+        self.parts.append((batch['ts'], kinds, dists, appended, batch['watchdog_ts']))
+
+    def finish(self):
+        self.ts, self.kinds, self.dists, self.appended, self.watchdog_ts = (np.concatenate([p[i] for p in self.parts]) for i in range(5))
+        self.parts = []
+        return self
+
+def window_stats(traj, window):
+    # Distance-history length, mean and std after each event, computed by the engine's own RollingStats
+    from engine import RollingStats
+    stats = RollingStats(window)
+    n = len(traj.ts)
+    lengths, means, stds = np.zeros(n, np.int64), np.zeros(n), np.zeros(n)
+    for i, (kind, dist, appended) in enumerate(zip(traj.kinds.tolist(), traj.dists.tolist(), traj.appended.tolist())):
+        if appended: stats.append(dist)
+        lengths[i] = len(stats)
+        if kind == NORMAL: means[i], stds[i] = stats.mean, stats.std()
+    return lengths, means, stds
+
+def replay_states(traj, stats, sigma):
+    # DecisionEngine's state machine (process_batch + _advance) over a precomputed trajectory.
+    # Quarantined/stale events and watchdog HALTs (-> HALTED) and shocks (-> UNSTABLE) reset the state whatever it was;
+    # between two such anchors it only moves forward: HALTED until the next normal event, UNSTABLE
+    # until the next calm one (dist < mean + std), NORMAL otherwise. Crossed events leave it alone.
+    # So the loop runs over anchors and fills the stretches in between.
+    lengths, means, stds = stats
+    kinds, dists = traj.kinds, traj.dists
+    n = len(kinds)
+    is_normal = kinds == NORMAL
+    shock = is_normal & traj.appended & (lengths >= 20) & (dists > means + sigma * stds)
+    calm = np.flatnonzero(is_normal & ~shock & (dists < means + stds))
+    normal = np.flatnonzero(is_normal)
+    anchors = np.flatnonzero((kinds == QUARANTINE) | (kinds == STALE) | (traj.watchdog_ts != 0) | shock).tolist()
+
+    states = np.empty(n, np.int8)
+    first = anchors[0] if anchors else n
+    ready = normal[(lengths[normal] > 20)]
+    boot_end = min(int(ready[0]) if len(ready) else n, first)
+    states[:boot_end] = BOOTSTRAP
+    states[boot_end:first] = NORMAL_STATE
+    for a, nxt in zip(anchors, anchors[1:] + [n]):
+        if shock[a]: state, exits = UNSTABLE, calm
+        else: state, exits = HALTED, normal
+        j = np.searchsorted(exits, a, 'right')
+        r = min(int(exits[j]) if j < len(exits) else n, nxt)
+        states[a:r] = state
+        states[r:nxt] = NORMAL_STATE
+
+    actions = np.array([STATE_ACTIONS[s] for s in range(len(STATES))], np.int8)[states]
+    actions[kinds == QUARANTINE] = HALT
+    actions[kinds == CROSSED] = IGNORED
+    return actions, states
+
+def halt_runs(actions):
+    # First and last row of every run of HALT actions
+    halted = actions == HALT
+    starts = np.flatnonzero(halted & ~np.concatenate(([False], halted[:-1])))
+    ends = np.flatnonzero(halted & ~np.concatenate((halted[1:], [False])))
+    return starts, ends
+
+def summarize(ts, actions, states, watchdog_ts):
+    n = len(ts)
+    # Halt episodes as the engine measures them (duration_ms): up to the last HALT of a run, from its first HALT or,
+    # when the watchdog opened it, from the watchdog HALT's ts (the last event before the gap)
+    starts, ends = halt_runs(actions)
+    opened = np.where(watchdog_ts[starts] != 0, watchdog_ts[starts], ts[starts])
+    changes = np.count_nonzero(states != np.concatenate(([BOOTSTRAP], states[:-1])))
+    return {"events": n, "blocked": int(np.count_nonzero(actions != ALLOWED)), "blocked_ratio": round(float(np.mean(actions != ALLOWED)), 6) if n else 0.0,
+            "halt_time_sec": round(float((ts[ends] - opened).sum()) / 1e6, 3), "halt_episodes": len(starts), "transitions": int(changes),
+            "final_state": STATES[states[-1]] if n else SystemState.BOOTSTRAP}
+
+def run_sweep(grid=None, verify=0, output_dir=None):
+    grid = grid or DEFAULT_GRID
+    configs = grid_configs(grid)
+    output_dir = output_dir or os.path.join(historical.BASE_OUTPUT, "sweep")
+    os.makedirs(output_dir, exist_ok=True)
+    config_path = historical.default_config_path()
+    print(f">>> Parameter Sweep: {len(configs)} configs over {', '.join(grid)}")
+    print(f"    Data Dir: {historical.DATA_DIR}")
+    print(f"    Output Dir: {output_dir}")
+    started = time.perf_counter()
+
+    # One parse/merge of the stream feeds one engine per stream-affecting parameter combination
+    group_of = lambda cfg: tuple((k, cfg[k]) for k in STREAM_PARAMS if k in cfg)
+    groups = {key: Trajectory(sweep_engine(dict(key), config_path)) for key in dict.fromkeys(group_of(c) for c in configs)}
+    # Full engine runs for `verify` configs spread over the grid, to check the shared-pass results
+    check_ids = sorted(set(np.linspace(0, len(configs) - 1, min(verify, len(configs))).round().astype(int).tolist())) if verify else []
+    checks = {i: sweep_engine(configs[i], config_path) for i in check_ids}
+    check_out = {i: [] for i in checks}
+    for columns in historical.CsvStreamer(historical.source_files(historical.DATA_DIR)).iter_batches():
+        for traj in groups.values(): traj.feed(columns)
+        for i, engine in checks.items():
+            batch = engine.process_batch(columns)
+            check_out[i].append((batch['action'], batch['state'], batch['duration_ms']))
+    for traj in groups.values(): traj.finish()
+    replay_sec = time.perf_counter() - started
+
+    rows, all_actions, window_cache = [], [], {}
+    for i, cfg in enumerate(configs):
+        key = group_of(cfg)
+        traj = groups[key]
+        window = cfg.get("WINDOW_SIZE", Config.WINDOW_SIZE)
+        if (key, window) not in window_cache: window_cache[(key, window)] = window_stats(traj, window)
+        actions, states = replay_states(traj, window_cache[(key, window)], cfg.get("SIGMA_MULTIPLIER", Config.SIGMA_MULTIPLIER))
+        row = {"config": i, **cfg, **summarize(traj.ts, actions, states, traj.watchdog_ts)}
+        if i in checks:
+            exp_actions, exp_states, exp_durations = (np.concatenate([out[k] for out in check_out[i]]) for k in range(3))
+            mismatch = np.flatnonzero((exp_actions != actions) | (exp_states != states))
+            # Total halt time from the engine's own duration_ms: the duration logged at the last HALT of each run
+            exp_halt = round(float(exp_durations[halt_runs(exp_actions)[1]].sum()) / 1e6, 3)
+            halt_ok = exp_halt == row["halt_time_sec"]
+            cfg_check = {"verified": len(mismatch) == 0 and halt_ok, "mismatches": len(mismatch), "engine_halt_time_sec": exp_halt}
+        else: cfg_check = {}
+        all_actions.append(actions)
+        rows.append({**row, **cfg_check})
+
+    # Disagreement: events where not every config took the same action (all groups share the event order)
+    ts = next(iter(groups.values())).ts if groups else np.zeros(0, np.int64)
+    stacked = np.vstack(all_actions) if all_actions else np.zeros((0, 0), np.int8)
+    split = np.flatnonzero((stacked != stacked[0]).any(axis=0)) if len(stacked) else np.zeros(0, np.int64)
+    for row, actions in zip(rows, all_actions):
+        row["disagree_vs_config0"] = int(np.count_nonzero(actions != all_actions[0]))
+
+    table = pd.DataFrame(rows)
+    table.to_csv(os.path.join(output_dir, 'sweep_table.csv'), index=False)
+    result = {
+        "configs": len(configs), "groups": len(groups), "window_passes": len(window_cache),
+        "replay_sec": round(replay_sec, 3), "total_sec": round(time.perf_counter() - started, 3),
+        "disagreement": {"events": len(split), "first_ts": [int(t) for t in ts[split[:MAX_DISAGREEMENTS]]]},
+        "table": rows,
+    }
+    with open(os.path.join(output_dir, 'sweep.json'), 'w') as f:
+        json.dump(result, f, indent=4)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(table.drop(columns=[c for c in ("final_state",) if c in table]).to_string(index=False))
+    print(f"Events where configs disagree: {len(split)}")
+    if checks: print(f"Verified against full engine runs: {sum(r.get('verified', False) for r in rows)}/{len(checks)}")
+    print(f"Done in {result['total_sec']}s (stream pass {result['replay_sec']}s). Saved to {output_dir}")
+    return result
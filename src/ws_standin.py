@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import websockets
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+DEFAULT_PORT = 8765
+
+def synthetic_messages(symbols, n, seed=0):
+    # (stream, data) pairs shaped like the Binance combined stream; E/T are stamped when a frame is sent
+    rng = random.Random(seed)
+    mids = {sym: 100.0 + 10 * i for i, sym in enumerate(symbols)}
+    messages = []
+    for i in range(n):
+        sym = symbols[i % len(symbols)]
+        mids[sym] *= 1 + rng.gauss(0, 2e-4)
+        if i % 2:
+            messages.append((f"{sym}@aggTrade", {"e": "aggTrade", "a": i, "p": f"{mids[sym]:.2f}", "q": "0.010"}))
+        else:
+            half = mids[sym] * 1e-4
+            messages.append((f"{sym}@bookTicker", {"e": "bookTicker", "b": f"{mids[sym] - half:.2f}", "a": f"{mids[sym] + half:.2f}", "B": "1", "A": "1"}))
+    return messages
+
+def make_handler(messages, rate=0):
+    # Every client gets the whole sequence at `rate` frames/s (0 = as fast as the socket drains), then a close
+    async def handler(ws, *args):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for sent, (stream, data) in enumerate(messages, 1):
+            now = int(time.time() * 1000)
+            data = dict(data, E=now)
+            if data.get("e") == "aggTrade": data["T"] = now
+            await ws.send(json.dumps({"stream": stream, "data": data}, separators=(",", ":")))
+            if rate:
+                ahead = sent / rate - (loop.time() - start)
+                if ahead > 0: await asyncio.sleep(ahead)
+            elif sent % 256 == 0: await asyncio.sleep(0)
+        await ws.close()
+    return handler
+
+async def serve(messages, host="127.0.0.1", port=DEFAULT_PORT, rate=0, ready=None):
+    async with websockets.serve(make_handler(messages, rate), host, port, max_size=None):
+        if ready is not None: ready.set()
+        await asyncio.Future()
+
+def run_standin(n=100000, rate=0, port=DEFAULT_PORT, symbols=("btcusdt",), ready=None):
+    try: asyncio.run(serve(synthetic_messages(list(symbols), n), port=port, rate=rate, ready=ready))
+    except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    # python src/ws_standin.py [frames] [frames_per_sec] [port]
+    args = [int(v) for v in sys.argv[1:4]]
+    n, rate, port = (args + [100000, 0, DEFAULT_PORT][len(args):])[:3]
+    print(f"Stand-in stream on ws://127.0.0.1:{port}/stream ({n} frames, rate {rate or 'unbounded'})")
+    run_standin(n, rate, port)